@@ -0,0 +1,12 @@
+"""Benchmarks for islpy, in the format of `airspeed velocity
+<https://asv.readthedocs.io>`__.
+
+To run them against the islpy installed in the current environment
+and view the results in a browser::
+
+    asv run --python=same
+    asv publish
+    asv preview
+
+Results and HTML end up in :file:`.asv/`.
+"""
@@ -0,0 +1,120 @@
+"""Generators for families of scalable problem instances used by the
+benchmarks. Everything is returned as isl syntax, so that parsing cost can be
+kept out of (or deliberately put into) the timed region.
+"""
+
+__copyright__ = "Copyright (C) 2021 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+
+def var_names(ndim, prefix="i"):
+    return ["%s%d" % (prefix, i) for i in range(ndim)]
+
+
+def box_set(ndim):
+    """A parametric box with *ndim* dimensions and a few coupling
+    constraints, so that it is not a plain product of intervals.
+    """
+    names = var_names(ndim)
+    constraints = ["0 <= %s < n" % name for name in names]
+    constraints.extend(
+            "%s + %s <= 2n - 2" % (a, b) for a, b in zip(names, names[1:]))
+    return "[n] -> { [%s] : %s }" % (", ".join(names), " and ".join(constraints))
+
+
+def box_map(ndim):
+    names = var_names(ndim)
+    out_names = var_names(ndim, "o")
+    constraints = ["0 <= %s < n" % name for name in names]
+    constraints.extend(
+            "%s = %s + %s" % (o, i, j)
+            for o, i, j in zip(out_names, names, names[1:] + names[:1]))
+    return "[n] -> { [%s] -> [%s] : %s }" % (
+            ", ".join(names), ", ".join(out_names), " and ".join(constraints))
+
+
+def tiled_set(ntiles):
+    """A union of *ntiles* adjacent rectangles that coalesces into a single
+    basic set.
+    """
+    return "{ %s }" % "; ".join(
+            "[i, j] : %d <= i < %d and 0 <= j < 10" % (10*k, 10*(k+1))
+            for k in range(ntiles))
+
+
+def stencil(nstmts, ndim):
+    """A time-iterated chain of *nstmts* statements, each a 3-point stencil
+    in the first of *ndim* spatial dimensions reading the previous statement.
+
+    :return: a tuple *(params, domain, dependences)* of strings, where
+        *params* is suitable for a parameter-only set.
+    """
+    names = var_names(ndim)
+    idx = ", ".join(names)
+    bounds = " and ".join(["0 <= t < T"] + [
+        "1 <= %s < N - 1" % name for name in names])
+
+    domain = "[T, N] -> { %s }" % "; ".join(
+            "S%d[t, %s] : %s" % (k, idx, bounds) for k in range(nstmts))
+
+    shifted = [
+            ", ".join([names[0] + shift] + names[1:])
+            for shift in ["", " + 1", " - 1"]]
+
+    deps = []
+    for k in range(nstmts):
+        if k + 1 < nstmts:
+            src, dst_t = "S%d" % k, "S%d[t, %%s]" % (k+1)
+        else:
+            src, dst_t = "S%d" % k, "S0[t + 1, %s]"
+        for dst_idx in shifted:
+            deps.append("%s[t, %s] -> %s : %s" % (
+                src, idx, dst_t % dst_idx, bounds))
+
+    return "[T, N] -> { : }", domain, "[T, N] -> { %s }" % "; ".join(deps)
+
+
+def matmul(nmats):
+    """A chain of *nmats* matrix products ``C_k = C_{k-1} * B_k`` of
+    parametric size, each with an initialization and an update statement.
+
+    :return: a tuple *(params, domain, dependences)* of strings.
+    """
+    params = "[N]"
+    domain = []
+    deps = []
+    for k in range(nmats):
+        domain.append("I%d[i, j] : 0 <= i, j < N" % k)
+        domain.append("U%d[i, j, l] : 0 <= i, j, l < N" % k)
+
+        deps.append("I%d[i, j] -> U%d[i, j, 0] : 0 <= i, j < N" % (k, k))
+        deps.append(
+                "U%d[i, j, l] -> U%d[i, j, l + 1] : 0 <= i, j < N and 0 <= l < N - 1"
+                % (k, k))
+        if k:
+            deps.append(
+                    "U%d[i, l, N - 1] -> U%d[i, j, l] : 0 <= i, j, l < N"
+                    % (k-1, k))
+
+    return ("%s -> { : }" % params,
+            "%s -> { %s }" % (params, "; ".join(domain)),
+            "%s -> { %s }" % (params, "; ".join(deps)))
@@ -0,0 +1,200 @@
+__copyright__ = "Copyright (C) 2021 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import islpy as isl
+
+from ._problems import var_names
+
+
+class MakeZeroAndVars:
+    params = [[4, 16, 64]]
+    param_names = ["nvars"]
+
+    def setup(self, nvars):
+        self.ctx = isl.Context()
+        self.names = var_names(nvars)
+        self.vars = isl.make_zero_and_vars(self.names, ["n"], ctx=self.ctx)
+        if hasattr(isl, "DeferredAff"):
+            self.deferred_vars = isl.make_zero_and_vars(
+                    self.names, ["n"], ctx=self.ctx, deferred=True)
+
+    def time_make_zero_and_vars(self, nvars):
+        isl.make_zero_and_vars(self.names, ["n"], ctx=self.ctx)
+
+    def time_use_two_vars(self, nvars):
+        v = isl.make_zero_and_vars(self.names, ["n"], ctx=self.ctx)
+        v[self.names[0]].le_set(v["n"])
+
+    def time_build_set(self, nvars):
+        v = self.vars
+        result = v[0].le_set(v[0])
+        for name in self.names:
+            result = result & v[0].le_set(v[name]) & v[name].lt_set(v["n"] + 1)
+        result.coalesce()
+
+    def time_build_set_deferred(self, nvars):
+        if not hasattr(isl, "DeferredAff"):
+            raise NotImplementedError
+        v = self.deferred_vars
+        result = v[0].le_set(v[0])
+        for name in self.names:
+            result = result & v[0].le_set(v[name]) & v[name].lt_set(v["n"] + 1)
+        result.to_set().coalesce()
+
+
+class CreateSpaceFromNames:
+    params = [[16, 256]]
+    param_names = ["nparams"]
+
+    def setup(self, nparams):
+        self.ctx = isl.Context()
+        self.params = var_names(nparams, "p")
+
+    def time_create_from_names(self, nparams):
+        isl.Space.create_from_names(self.ctx, set=["i", "j"], params=self.params)
+
+    def time_create_from_names_cached(self, nparams):
+        if hasattr(self.ctx, "enable_space_cache"):
+            self.ctx.enable_space_cache()
+        isl.Space.create_from_names(self.ctx, set=["i", "j"], params=self.params)
+
+
+class VarDict:
+    params = [[16, 256]]
+    param_names = ["nparams"]
+
+    def setup(self, nparams):
+        self.ctx = isl.Context()
+        self.aff = isl.Aff("[%s] -> { [i, j] -> [(i + j)] }"
+                % ", ".join(var_names(nparams, "p")), context=self.ctx)
+        self.coeffs = {"i": 2, "j": -1, 1: 3}
+
+    def time_get_var_dict(self, nparams):
+        self.aff.get_var_dict()
+
+    def time_get_var_names(self, nparams):
+        self.aff.get_var_names(isl.dim_type.param)
+
+    def time_set_coefficients_by_name(self, nparams):
+        self.aff.set_coefficients_by_name(self.coeffs)
+
+
+class ScalarArithmetic:
+    params = [[1, 50]]
+    param_names = ["npieces"]
+
+    def setup(self, npieces):
+        pw_aff = isl.PwAff("{ [i] -> [(0)] }")
+        for k in range(1, npieces):
+            pw_aff = pw_aff.union_max(
+                    isl.PwAff("{ [i] -> [(%d)] : i = %d }" % (k, k)))
+        self.pw_aff = pw_aff
+        self.pwq = isl.PwQPolynomial.from_pw_aff(pw_aff)
+
+    def time_pw_aff_add(self, npieces):
+        self.pw_aff + 1
+
+    def time_pw_aff_rsub(self, npieces):
+        1 - self.pw_aff
+
+    def time_pw_aff_mul(self, npieces):
+        2 * self.pw_aff
+
+    def time_pw_qpolynomial_add(self, npieces):
+        self.pwq + 1
+
+
+class EvalWithDict:
+    params = [[2, 8]]
+    param_names = ["nparams"]
+
+    def setup(self, nparams):
+        names = var_names(nparams, "n")
+        self.pw_aff_q = isl.PwQPolynomial.from_pw_aff(isl.PwAff(
+            "[%s] -> { [(%s)] : %s }" % (
+                ", ".join(names), " + ".join(names),
+                " and ".join("%s >= 0" % name for name in names))))
+        self.pwq = isl.PwQPolynomial("[%s] -> { %s : %s }" % (
+            ", ".join(names), " * ".join(names),
+            " and ".join("%s >= 0" % name for name in names)))
+        self.values = {name: i + 1 for i, name in enumerate(names)}
+
+    def time_eval_affine(self, nparams):
+        self.pw_aff_q.eval_with_dict(self.values)
+
+    def time_eval_pw_qpolynomial(self, nparams):
+        self.pwq.eval_with_dict(self.values)
+
+
+class Align:
+    params = [[4, 16]]
+    param_names = ["nnames"]
+
+    def setup(self, nnames):
+        params = var_names(nnames, "p")
+        names = var_names(nnames)
+
+        self.a = isl.BasicSet("[%s] -> { [%s] : }" % (
+            ", ".join(params[::2]), ", ".join(names)))
+        self.b = isl.BasicSet("[%s] -> { [%s] : }" % (
+            ", ".join(params[::-1]), ", ".join(names[::-1])))
+
+        self.aff_a = isl.Aff("[%s] -> { [(%s)] }" % (
+            ", ".join(params[::2]), " + ".join(params[::2])))
+        self.aff_b = isl.Aff("[%s] -> { [(0)] }" % ", ".join(params[::-1]))
+
+        half = nnames // 2
+        self.map_a = isl.BasicMap("{ [%s] -> [%s] : }" % (
+            ", ".join(names[:half]), ", ".join(names[half:])))
+        self.map_b = isl.BasicMap("{ [%s] -> [%s] : }" % (
+            ", ".join(names[::-2]), ", ".join(names[-2::-2])))
+
+    def time_align_spaces_set(self, nnames):
+        isl.align_spaces(self.a, self.b, obj_bigger_ok=True)
+
+    def time_align_spaces_aff(self, nnames):
+        isl.align_spaces(self.aff_a, self.aff_b)
+
+    def time_align_spaces_map(self, nnames):
+        isl.align_spaces(self.map_a, self.map_b, obj_bigger_ok=True)
+
+    def time_align_two(self, nnames):
+        isl.align_two(self.a, self.b)
+
+
+class AlignMany:
+    params = [[10, 100]]
+    param_names = ["ndomains"]
+
+    def setup(self, ndomains):
+        params = var_names(7, "p")
+        names = var_names(5)
+
+        # statement domains sharing some of their names
+        self.domains = [
+                isl.BasicSet("[%s, %s] -> { S%d[%s, %s, %s] : }" % (
+                    params[k % 7], params[(k+3) % 7], k,
+                    names[k % 5], names[(k+1) % 5], names[(k+2) % 5]))
+                for k in range(ndomains)]
+
+    def time_align_many(self, ndomains):
+        isl.align_many(self.domains)
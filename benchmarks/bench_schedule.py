@@ -0,0 +1,97 @@
+__copyright__ = "Copyright (C) 2021 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import tempfile
+
+import islpy as isl
+
+from ._problems import stencil, matmul
+
+
+class _ScheduleBenchmark:
+    def setup_problem(self, problem):
+        params, domain, deps = problem
+        self.ctx = isl.Context()
+        self.params = isl.Set.read_from_str(self.ctx, params)
+        self.domain = isl.UnionSet.read_from_str(self.ctx, domain)
+        self.deps = isl.UnionMap.read_from_str(self.ctx, deps)
+        self.schedule = self.compute_schedule()
+        self.schedule_str = str(self.schedule)
+
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = isl.ScheduleCache(self.cache_dir.name)
+        self.cache.compute_schedule(self.schedule_constraints())
+
+    def teardown(self, *args):
+        self.cache_dir.cleanup()
+
+    def schedule_constraints(self):
+        sc = isl.ScheduleConstraints.on_domain(self.domain)
+        sc = sc.set_validity(self.deps)
+        sc = sc.set_proximity(self.deps)
+        sc = sc.set_coincidence(self.deps)
+        return sc
+
+    def compute_schedule(self):
+        return self.schedule_constraints().compute_schedule()
+
+    def generate_ast(self):
+        build = isl.AstBuild.from_context(self.params)
+        return build.node_from_schedule(self.schedule)
+
+    def time_compute_schedule(self, *args):
+        self.compute_schedule()
+
+    def time_compute_schedule_cached(self, *args):
+        self.cache.compute_schedule(self.schedule_constraints())
+
+    def time_generate_ast(self, *args):
+        self.generate_ast()
+
+    def time_ast_to_python(self, *args):
+        self.generate_ast().to_python()
+
+    def time_print_ast(self, *args):
+        self.generate_ast().to_C_str()
+
+    def time_schedule_to_str(self, *args):
+        # a copy, the printed form of self.schedule is cached
+        str(self.schedule.copy())
+
+    def time_parse_schedule(self, *args):
+        isl.Schedule.read_from_str(self.ctx, self.schedule_str)
+
+
+class Stencil(_ScheduleBenchmark):
+    params = [[1, 2, 4], [1, 2]]
+    param_names = ["nstmts", "ndim"]
+
+    def setup(self, nstmts, ndim):
+        self.setup_problem(stencil(nstmts, ndim))
+
+
+class Matmul(_ScheduleBenchmark):
+    params = [[1, 2, 3]]
+    param_names = ["nmats"]
+
+    def setup(self, nmats):
+        self.setup_problem(matmul(nmats))
@@ -0,0 +1,232 @@
+__copyright__ = "Copyright (C) 2021 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import pickle
+
+import islpy as isl
+
+from ._problems import box_set, box_map, tiled_set
+
+
+class ParsePrint:
+    params = [[2, 4, 8, 16]]
+    param_names = ["ndim"]
+
+    def setup(self, ndim):
+        self.ctx = isl.Context()
+        self.set_str = box_set(ndim)
+        self.map_str = box_map(ndim)
+        self.set = isl.Set.read_from_str(self.ctx, self.set_str)
+        self.map = isl.Map.read_from_str(self.ctx, self.map_str)
+
+    def time_parse_set(self, ndim):
+        isl.Set.read_from_str(self.ctx, self.set_str)
+
+    def time_parse_map(self, ndim):
+        isl.Map.read_from_str(self.ctx, self.map_str)
+
+    # Printed forms are cached per object, the copies are printed afresh.
+
+    def time_print_set(self, ndim):
+        str(self.set.copy())
+
+    def time_print_map(self, ndim):
+        str(self.map.copy())
+
+    def time_print_set_cached(self, ndim):
+        str(self.set)
+
+    def time_to_strs(self, ndim):
+        isl.to_strs([self.set.copy(), self.map.copy()])
+
+
+class ParseMany:
+    params = [[1, 4]]
+    param_names = ["nthreads"]
+
+    def setup(self, nthreads):
+        self.ctx = isl.Context()
+        self.strings = [box_set(4) for i in range(200)]
+
+    def time_parse_loop(self, nthreads):
+        for s in self.strings:
+            isl.Set.read_from_str(self.ctx, s)
+
+    def time_parse_many(self, nthreads):
+        isl.parse_many(isl.Set, self.strings, self.ctx, nthreads=nthreads)
+
+
+class SetAlgebra:
+    params = [[2, 4, 8]]
+    param_names = ["ndim"]
+
+    def setup(self, ndim):
+        ctx = isl.Context()
+        self.a = isl.Set.read_from_str(ctx, box_set(ndim))
+        self.b = isl.Set.read_from_str(
+                ctx, box_set(ndim).replace("0 <=", "1 <="))
+        self.map = isl.Map.read_from_str(ctx, box_map(ndim))
+
+    def time_union(self, ndim):
+        self.a.union(self.b)
+
+    def time_intersect(self, ndim):
+        self.a.intersect(self.b)
+
+    def time_subtract(self, ndim):
+        self.a.subtract(self.b)
+
+    def time_is_subset(self, ndim):
+        self.a.is_subset(self.b)
+
+    def time_apply(self, ndim):
+        self.a.apply(self.map)
+
+    def time_lexmin(self, ndim):
+        self.a.lexmin()
+
+
+class ProjectOut:
+    params = [[4, 16]]
+    param_names = ["ndim"]
+
+    def setup(self, ndim):
+        self.set = isl.Set(box_set(ndim))
+        # every other dimension, so that there are many runs to project out
+        self.names = self.set.get_var_names(isl.dim_type.set)[::2]
+
+    def time_project_out_except(self, ndim):
+        self.set.project_out_except(self.names, [isl.dim_type.set])
+
+    def time_eliminate_except(self, ndim):
+        self.set.eliminate_except(self.names, [isl.dim_type.set])
+
+
+class AddConstraints:
+    params = [[4, 16]]
+    param_names = ["ndim"]
+
+    def setup(self, ndim):
+        box = isl.BasicSet(box_set(ndim))
+        self.universe = isl.BasicSet.universe(box.space)
+        self.constraints = box.get_constraints()
+
+    def time_add_constraints(self, ndim):
+        self.universe.add_constraints(self.constraints)
+
+    def time_add_constraint_loop(self, ndim):
+        bset = self.universe
+        for constraint in self.constraints:
+            bset = bset.add_constraint(constraint)
+
+
+class Coalesce:
+    params = [[4, 16, 64]]
+    param_names = ["ntiles"]
+
+    def setup(self, ntiles):
+        self.set = isl.Set.read_from_str(isl.Context(), tiled_set(ntiles))
+
+    def time_coalesce(self, ntiles):
+        self.set.coalesce()
+
+
+class Pickle:
+    params = [[2, 8]]
+    param_names = ["ndim"]
+
+    def setup(self, ndim):
+        self.set = isl.Set(box_set(ndim))
+        self.map = isl.Map(box_map(ndim))
+        self.pickled_set = pickle.dumps(self.set)
+
+    def time_dumps_set(self, ndim):
+        # a copy, the printed form of self.set is cached
+        pickle.dumps(self.set.copy())
+
+    def time_loads_set(self, ndim):
+        pickle.loads(self.pickled_set)
+
+    def time_round_trip_map(self, ndim):
+        pickle.loads(pickle.dumps(self.map.copy()))
+
+
+class ForeachPoint:
+    params = [[10, 30, 100]]
+    param_names = ["n"]
+
+    def setup(self, n):
+        self.set = isl.Set(
+                "{ [i, j] : 0 <= i < %d and 0 <= j < %d and i + j < %d }"
+                % (n, n, n))
+
+    def time_foreach_point(self, n):
+        points = []
+        self.set.foreach_point(points.append)
+
+
+class SelfUpcast:
+    """Methods called on basic objects that only the upcast type implements,
+    either at all or for the given argument types. The objects are small, so
+    that call overhead dominates.
+    """
+
+    def setup(self):
+        self.bset = isl.BasicSet("{ [i] : 0 <= i < 10 }")
+        self.set = isl.Set("{ [i] : 5 <= i < 15 }")
+        self.aff = isl.Aff("{ [i] -> [(i + 1)] }")
+        self.pw_aff = isl.PwAff("{ [i] -> [(2i)] : i >= 0 }")
+
+    def time_basic_set_subtract(self):
+        self.bset.subtract(self.set)
+
+    def time_basic_set_union_set(self):
+        self.bset.union(self.set)
+
+    def time_aff_add_pw_aff(self):
+        self.aff.add(self.pw_aff)
+
+    def time_aff_union_max(self):
+        self.aff.union_max(self.pw_aff)
+
+
+class ArgumentUpcast:
+    """Arguments that need an implicit conversion to the parameter type."""
+
+    def setup(self):
+        self.bset = isl.BasicSet("{ [i] : 0 <= i < 10 }")
+        self.set = isl.Set("{ [i] : 5 <= i < 15 }")
+        self.uset = isl.UnionSet("{ A[i] : 0 <= i < 10 }")
+        self.aff = isl.Aff("{ [i] -> [(i + 1)] }")
+        self.pw_aff = isl.PwAff("{ [i] -> [(2i)] : i >= 0 }")
+
+    def time_set_union_basic_set(self):
+        self.set.union(self.bset)
+
+    def time_union_set_union_set(self):
+        self.uset.union(self.set)
+
+    def time_union_set_union_basic_set(self):
+        self.uset.union(self.bset)
+
+    def time_pw_aff_add_aff(self):
+        self.pw_aff.add(self.aff)
@@ -129,6 +129,7 @@ class Method:
         self.mutator_veto = False
         self.is_exported = is_exported
         self.is_constructor = is_constructor
+        self.is_collector = False
 
         if not self.is_static:
             self.args[0].name = "self"
@@ -147,6 +148,24 @@ class Method:
                 and not self.mutator_veto
                 and self.args[0].base_type in NON_COPYABLE_WITH_ISL_PREFIX)
 
+    def make_collector(self):
+        """For a ``foreach*`` method, return a variant that collects the
+        arguments of each callback invocation into a list (in C++, without
+        calling back into Python), or *None* if not applicable.
+        """
+        if not self.name.startswith("foreach"):
+            return None
+
+        cb_args = [arg for arg in self.args if isinstance(arg, CallbackArgument)]
+        if len(cb_args) != 1:
+            return None
+
+        from copy import copy
+        result = copy(self)
+        result.name = "_collect" + self.name[len("foreach"):]
+        result.is_collector = True
+        return result
+
     def __repr__(self):
         return "<method %s>" % self.c_name
 
@@ -157,7 +176,9 @@ class Method:
 
 PART_TO_CLASSES = {
         # If you change this, change:
-        # - src/wrapper/wrap_isl.hpp to add WRAP_CLASS(...)
+        # - src/wrapper/wrap_isl.hpp to add WRAP_CLASS(...), or
+        #   WRAP_PART3_CLASS(...) for part 3, which is exposed lazily
+        # - part3_class_names in src/wrapper/wrap_isl.cpp
         # - src/wrapper/wrap_isl_partN.hpp to add MAKE_WRAP(...)
         # - doc/reference.rst
 
@@ -225,6 +246,19 @@ CLASS_MAP = {
         "options": "ctx",
         }
 
+# Methods of each class on the left are also exposed on the classes on the
+# right, with 'self' upcast on the C++ side. Each basic class must be in the
+# same part as, and listed before, the class it is upcast to, so that its own
+# methods come first among overloads of the same name.
+UPCASTS = {
+        "set": ["basic_set"],
+        "map": ["basic_map"],
+        "union_set": ["set", "basic_set"],
+        "union_map": ["map", "basic_map"],
+        "pw_aff": ["aff"],
+        "local_space": ["space"],
+        }
+
 # }}}
 
 
@@ -840,6 +874,76 @@ def get_callback(cb_name, cb):
                 error_return=error_return,
                 )
 
+
+def get_collector_callback(cb_name, cb):
+    pre_call = []
+    items = []
+
+    assert cb.args[-1].name == "user"
+
+    if cb.return_base_type != "isl_stat" or cb.return_ptr:
+        raise SignatureNotSupported("collector for non-isl_stat callback")
+
+    for arg in cb.args[:-1]:
+        if not arg.base_type.startswith("isl_") or arg.ptr != "*":
+            raise SignatureNotSupported("unsupported callback arg: %s %s" % (
+                arg.base_type, arg.ptr))
+
+        arg_cls = arg.base_type[4:]
+
+        if arg.semantics is SEM_TAKE:
+            pre_call.append("""
+                std::unique_ptr<%(arg_cls)s> wrapped_arg_%(name)s(
+                    new %(arg_cls)s(c_arg_%(name)s));
+                """ % dict(arg_cls=arg_cls, name=arg.name))
+        elif arg.semantics is SEM_KEEP and arg_cls not in NON_COPYABLE:
+            pre_call.append("""
+                std::unique_ptr<%(arg_cls)s> wrapped_arg_%(name)s(
+                    new %(arg_cls)s(isl_%(arg_cls)s_copy(c_arg_%(name)s)));
+                if (!wrapped_arg_%(name)s->is_valid())
+                    return isl_stat_error;
+                """ % dict(arg_cls=arg_cls, name=arg.name))
+        else:
+            raise SignatureNotSupported("unsupported callback arg semantics")
+
+        items.append("arg_%s" % arg.name)
+
+    for arg in cb.args[:-1]:
+        pre_call.append("""
+            py::object arg_%(name)s(
+                handle_from_new_ptr(wrapped_arg_%(name)s.get()));
+            wrapped_arg_%(name)s.release();
+            """ % dict(name=arg.name))
+
+    if len(items) == 1:
+        item, = items
+    else:
+        item = "py::make_tuple(%s)" % ", ".join(items)
+
+    return """
+        static isl_stat %(cb_name)s(%(input_args)s)
+        {
+            try
+            {
+              %(pre_call)s
+              py::reinterpret_borrow<py::list>(
+                  (PyObject *) c_arg_user).append(%(item)s);
+              return isl_stat_ok;
+            }
+            catch (...)
+            {
+              return isl_stat_error;
+            }
+        }
+        """ % dict(
+                cb_name=cb_name,
+                input_args=(
+                    ", ".join("%s %sc_arg_%s" % (arg.base_type, arg.ptr, arg.name)
+                        for arg in cb.args)),
+                pre_call="\n".join(pre_call),
+                item=item,
+                )
+
 # }}}
 
 
@@ -879,6 +983,27 @@ def write_wrapper(outf, meth):
 
             cb_name = "cb_%s_%s_%s" % (meth.cls, meth.name, arg.name)
 
+            if meth.is_collector:
+                body.append("py::list collected;")
+                passed_args.append(cb_name)
+                passed_args.append("collected.ptr()")
+                extra_ret_vals.append("collected")
+
+                elements = [to_py_class(sub_arg.base_type)
+                        for sub_arg in arg.args
+                        if sub_arg.name != "user"]
+                if len(elements) == 1:
+                    extra_ret_descrs.append("list of :class:`%s`" % elements[0])
+                else:
+                    extra_ret_descrs.append("list of tuples (%s)" % ", ".join(
+                        ":class:`%s`" % element for element in elements))
+
+                preamble.append(get_collector_callback(cb_name, arg))
+                arg_names.pop()
+
+                arg_idx += 1
+                continue
+
             if (meth.cls in ["ast_build", "ast_print_options"]
                     and meth.name.startswith("set_")):
                 extra_ret_vals.append("py_%s" % arg.name)
@@ -979,9 +1104,9 @@ def write_wrapper(outf, meth):
                 raise Undocumented(meth)
 
             if arg.semantics is SEM_TAKE:
-                post_call.append("unique_arg_%s.release();" % arg.name)
-
-            passed_args.append("unique_arg_%s->m_data" % arg.name)
+                passed_args.append("unique_arg_%s->take_data()" % arg.name)
+            else:
+                passed_args.append("unique_arg_%s->m_data" % arg.name)
             docs.append(arg_descr)
 
             # }}}
@@ -1026,8 +1151,14 @@ def write_wrapper(outf, meth):
                         checks.append("""
                             std::unique_ptr<%(cls)s> auto_arg_%(name)s;
                             {
-                                isl_%(cls)s *tmp_ptr =
-                                    isl_%(cls)s_copy(arg_%(name)s.m_data);
+                                isl_%(cls)s *tmp_ptr;
+                                if (arg_%(name)s.m_is_temporary)
+                                    // no one else can see it, no need to copy
+                                    tmp_ptr = const_cast<%(cls)s &>(
+                                        arg_%(name)s).take_data();
+                                else
+                                    tmp_ptr = isl_%(cls)s_copy(
+                                        arg_%(name)s.m_data);
                                 if (!tmp_ptr)
                                     throw isl::error("failed to copy arg "
                                         "%(name)s on entry to %(meth)s");
@@ -1039,8 +1170,7 @@ def write_wrapper(outf, meth):
                                 meth="%s_%s" % (meth.cls, meth.name),
                                 cls=arg_cls))
 
-                        post_call.append("auto_arg_%s.release();" % arg.name)
-                        passed_args.append("auto_arg_%s->m_data" % arg.name)
+                        passed_args.append("auto_arg_%s->take_data()" % arg.name)
 
                     else:
                         input_args.append("%s &%s" % (arg_cls, "arg_"+arg.name))
@@ -1118,8 +1248,10 @@ def write_wrapper(outf, meth):
 
     body = checks + body
 
+    body.append('call_profiler profiler("%s");' % meth.c_name)
     body.append("%s%s(%s);" % (
         result_capture, meth.c_name, ", ".join(passed_args)))
+    body.append("profiler.done();")
 
     body += post_call
 
@@ -1332,7 +1464,7 @@ def write_wrapper(outf, meth):
 
 # {{{ exposer generator
 
-def write_exposer(outf, meth, arg_names, doc_str):
+def write_exposer(outf, meth, arg_names, doc_str, static_names=frozenset()):
     func_name = "isl::%s_%s" % (meth.cls, meth.name)
     py_name = meth.name
 
@@ -1364,12 +1496,31 @@ def write_exposer(outf, meth, arg_names, doc_str):
             wrap_class, "_static" if meth.is_static else "",
             exp_py_name, func_name, args_str+doc_str_arg))
 
+        if meth.is_static or exp_py_name.startswith("_"):
+            continue
+
+        for basic_class in UPCASTS.get(wrap_class, []):
+            if (basic_class, exp_py_name) in static_names:
+                # pybind11 cannot overload static and instance methods
+                continue
+
+            outf.write(
+                    'wrap_%s.def("%s", '
+                    "isl::make_upcast_method<isl::%s, isl::%s>(%s)%s);\n" % (
+                        basic_class, exp_py_name, wrap_class, basic_class,
+                        func_name, args_str+doc_str_arg))
+
 # }}}
 
 
 def write_wrappers(expf, wrapf, methods):
     undoc = []
 
+    static_names = {
+            (CLASS_MAP.get(meth.cls, meth.cls), meth.name)
+            for meth in methods
+            if meth.is_static}
+
     for meth in methods:
         #print "TRY_WRAP:", meth
         if meth.name.endswith("_si") or meth.name.endswith("_ui"):
@@ -1389,14 +1540,23 @@ def write_wrappers(expf, wrapf, methods):
                         % (meth, ", ".join(str(s) for s in val_versions)))
                 continue
 
+        collector = meth.make_collector()
+        if collector is not None:
+            try:
+                arg_names, doc_str = write_wrapper(wrapf, collector)
+                write_exposer(expf, collector, arg_names, doc_str)
+            except (Undocumented, SignatureNotSupported):
+                _, e, _ = sys.exc_info()
+                print("SKIP (no collector: %s): %s" % (e, meth))
+
         try:
             arg_names, doc_str = write_wrapper(wrapf, meth)
-            write_exposer(expf, meth, arg_names, doc_str)
+            write_exposer(expf, meth, arg_names, doc_str, static_names)
         except Undocumented:
             undoc.append(str(meth))
         except Retry:
             arg_names, doc_str = write_wrapper(wrapf, meth)
-            write_exposer(expf, meth, arg_names, doc_str)
+            write_exposer(expf, meth, arg_names, doc_str, static_names)
         except SignatureNotSupported:
             _, e, _ = sys.exc_info()
             print("SKIP (sig not supported: %s): %s" % (e, meth))
@@ -20,6 +20,14 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import hashlib
+import os
+import sys
+import zlib
+from collections import namedtuple
+from collections.abc import MutableMapping
+from numbers import Integral
+
 import islpy._isl as _isl
 from islpy.version import VERSION, VERSION_TEXT  # noqa
 import six
@@ -85,25 +93,10 @@ Vertex = _isl.Vertex
 Cell = _isl.Cell
 Vertices = _isl.Vertices
 StrideInfo = _isl.StrideInfo
-QPolynomialFold = _isl.QPolynomialFold
-PwQPolynomialFold = _isl.PwQPolynomialFold
-UnionPwQPolynomialFold = _isl.UnionPwQPolynomialFold
-UnionPwQPolynomial = _isl.UnionPwQPolynomial
-QPolynomial = _isl.QPolynomial
-PwQPolynomial = _isl.PwQPolynomial
-Term = _isl.Term
-ScheduleConstraints = _isl.ScheduleConstraints
-ScheduleNode = _isl.ScheduleNode
-Schedule = _isl.Schedule
-AccessInfo = _isl.AccessInfo
-Flow = _isl.Flow
-Restriction = _isl.Restriction
-UnionAccessInfo = _isl.UnionAccessInfo
-UnionFlow = _isl.UnionFlow
-AstExpr = _isl.AstExpr
-AstNode = _isl.AstNode
-AstPrintOptions = _isl.AstPrintOptions
-AstBuild = _isl.AstBuild
+
+# Part 3 of the wrapper is only exposed once one of its classes is first
+# needed, see __getattr__ below.
+_PART3_CLASS_NAMES = _isl._PART3_CLASS_NAMES
 
 error = _isl.error
 stat = _isl.stat
@@ -123,30 +116,30 @@ schedule_algorithm = _isl.schedule_algorithm
 # backward compatibility
 ast_op_type = _isl.ast_expr_op_type
 
-ALL_CLASSES = [Context, IdList, ValList, BasicSetList, BasicMapList, SetList,
-        MapList, UnionSetList, ConstraintList, AffList, PwAffList, AstExprList,
-        AstNodeList, IdToAstExpr, Printer, Val, MultiVal, Vec, Mat, Aff, PwAff,
-        UnionPwAff, MultiAff, MultiPwAff, PwMultiAff, UnionPwMultiAff,
-        UnionPwAffList, MultiUnionPwAff, Id, Constraint, Space, LocalSpace,
-        BasicSet, BasicMap, Set, Map, UnionMap, UnionSet, Point, Vertex, Cell,
-        Vertices, StrideInfo, QPolynomialFold, PwQPolynomialFold,
-        UnionPwQPolynomialFold, UnionPwQPolynomial, QPolynomial, PwQPolynomial,
-        Term, ScheduleConstraints, ScheduleNode, Schedule, AccessInfo,
-        Flow, Restriction, UnionAccessInfo, UnionFlow, AstExpr, AstNode,
-        AstPrintOptions, AstBuild]
-
 # }}}
 
 
 _CHECK_DIM_TYPES = [
         dim_type.in_, dim_type.param, dim_type.set]
 
-ALL_CLASSES = tuple(getattr(_isl, cls) for cls in dir(_isl) if cls[0].isupper())
-EXPR_CLASSES = tuple(cls for cls in ALL_CLASSES
-        if "Aff" in cls.__name__ or "Polynomial" in cls.__name__)
+
+def _is_expr_class(cls):
+    return "Aff" in cls.__name__ or "Polynomial" in cls.__name__
+
+
+# Both extended once part 3 is exposed. The public ALL_CLASSES and
+# EXPR_CLASSES are only bound at that point, see __getattr__ below, so that
+# they are never seen incomplete.
+_ALL_CLASSES = tuple(
+        getattr(_isl, cls) for cls in dir(_isl) if cls[0].isupper())
+_EXPR_CLASSES = tuple(cls for cls in _ALL_CLASSES if _is_expr_class(cls))
 
 DEFAULT_CONTEXT = Context()
 
+# options affecting ScheduleConstraints.compute_schedule, see ScheduleCache
+_SCHEDULER_OPTIONS = sorted(
+        name[4:] for name in dir(Context) if name.startswith("get_schedule_"))
+
 
 def _get_default_context():
     """A callable to get the default context for the benefit of Python's
@@ -165,6 +158,16 @@ def _read_from_str_wrapper(cls, context, s):
 def _add_functionality():
     import islpy._isl as _isl  # noqa
 
+    # Functions registered here add functionality to a single class. They are
+    # applied to the classes of part 3 as well, once these are exposed.
+    per_class_adders = []
+
+    def for_each_class(adder):
+        per_class_adders.append(adder)
+        for cls in _ALL_CLASSES:
+            adder(cls)
+        return adder
+
     # {{{ Context
 
     def context_reduce(self):
@@ -179,9 +182,40 @@ def _add_functionality():
     def context_ne(self, other):
         return not self.__eq__(other)
 
+    def context_live_object_counts_by_class(self):
+        """Return a :class:`dict` mapping class names (such as ``"BasicSet"``)
+        to the number of live instances referring to this context.
+
+        .. versionadded:: 2021.1
+        """
+        names = base_name_to_class_name()
+        return {
+                names.get(base_name, base_name): count
+                for base_name, count in self._get_live_object_counts().items()}
+
+    def context_live_object_tracebacks(self):
+        """Return a list of tuples ``(class_name, traceback)`` for live objects
+        referring to this context that were created while
+        :func:`track_object_creation` was enabled. *traceback* is a
+        :class:`traceback.StackSummary`.
+
+        .. versionadded:: 2021.1
+        """
+        names = base_name_to_class_name()
+        return [
+                (names.get(base_name, base_name), tb)
+                for base_name, tb in self._get_creation_tracebacks()]
+
+    def base_name_to_class_name():
+        return {
+                cls._base_name: cls.__name__
+                for cls in _ALL_CLASSES if hasattr(cls, "_base_name")}
+
     Context.__reduce__ = context_reduce
     Context.__eq__ = context_eq
     Context.__ne__ = context_ne
+    Context.live_object_counts_by_class = context_live_object_counts_by_class
+    Context.live_object_tracebacks = context_live_object_tracebacks
 
     # }}}
 
@@ -207,12 +241,10 @@ def _add_functionality():
             self._prev_init(s)
 
     def generic_reduce(self):
-        ctx = self.get_ctx()
-        prn = Printer.to_str(ctx)
-        prn = getattr(prn, "print_"+self._base_name)(self)
-        return (_read_from_str_wrapper, (type(self), ctx, prn.get_str()))
+        return (_read_from_str_wrapper, (type(self), self.get_ctx(), str(self)))
 
-    for cls in ALL_CLASSES:
+    @for_each_class
+    def add_generic_init(cls):
         if hasattr(cls, "read_from_str"):
             cls._prev_new = cls.__new__
             cls.__new__ = obj_new
@@ -224,16 +256,10 @@ def _add_functionality():
 
     # {{{ printing
 
-    def generic_str(self):
-        prn = Printer.to_str(self.get_ctx())
-        getattr(prn, "print_"+self._base_name)(self)
-        return prn.get_str()
+    # __str__ is defined on the C++ side, and cached on the wrapper.
 
     def generic_repr(self):
-        prn = Printer.to_str(self.get_ctx())
-        getattr(prn, "print_"+self._base_name)(self)
-        return '%s("%s")' % (
-                type(self).__name__, prn.get_str())
+        return '%s("%s")' % (type(self).__name__, str(self))
 
     def generic_hash(self):
         return hash((type(self), str(self)))
@@ -241,9 +267,9 @@ def _add_functionality():
     def generic_isl_hash(self):
         return self.get_hash()
 
-    for cls in ALL_CLASSES:
+    @for_each_class
+    def add_printing(cls):
         if hasattr(cls, "_base_name") and hasattr(Printer, "print_"+cls._base_name):
-            cls.__str__ = generic_str
             cls.__repr__ = generic_repr
 
             if not hasattr(cls, "get_hash"):
@@ -292,25 +318,7 @@ def _add_functionality():
         :param dimtype: None to get all variables, otherwise
             one of :class:`dim_type`.
         """
-        result = {}
-
-        def set_dim_id(name, tp, idx):
-            if name in result:
-                raise RuntimeError("non-unique var id '%s' encountered" % name)
-            result[name] = tp, idx
-
-        if dimtype is None:
-            types = _CHECK_DIM_TYPES
-        else:
-            types = [dimtype]
-
-        for tp in types:
-            for i in range(self.dim(tp)):
-                name = self.get_dim_id(tp, i)
-                if name is not None:
-                    set_dim_id(name, tp, i)
-
-        return result
+        return self._get_id_dict(dimtype)
 
     def space_get_var_dict(self, dimtype=None, ignore_out=False):
         """Return a dictionary mapping variable names to tuples of
@@ -318,29 +326,13 @@ def _add_functionality():
 
         :param dimtype: None to get all variables, otherwise
             one of :class:`dim_type`.
-        """
-        result = {}
-
-        def set_dim_name(name, tp, idx):
-            if name in result:
-                raise RuntimeError("non-unique var name '%s' encountered" % name)
-            result[name] = tp, idx
-
-        if dimtype is None:
-            types = _CHECK_DIM_TYPES
-            if ignore_out:
-                types = types[:]
-                types.remove(dim_type.out)
-        else:
-            types = [dimtype]
 
-        for tp in types:
-            for i in range(self.dim(tp)):
-                name = self.get_dim_name(tp, i)
-                if name is not None:
-                    set_dim_name(name, tp, i)
+        .. versionchanged:: 2021.1
 
-        return result
+            The names are looked up once per underlying isl space and cached,
+            shared by all objects with that space.
+        """
+        return self._get_var_dict(dimtype, ignore_out)
 
     def space_create_from_names(ctx, set=None, in_=None, out=None, params=[]):
         """Create a :class:`Space` from lists of variable names.
@@ -349,38 +341,26 @@ def _add_functionality():
         :param in_: names of `in`-type variables.
         :param out: names of `out`-type variables.
         :param params: names of parameter-type variables.
+
+        .. versionchanged:: 2021.1
+
+            Names may also be given as :class:`Id` instances. The space is
+            built in a single call. See also
+            :meth:`Context.enable_space_cache`.
         """
-        dt = dim_type
 
         if set is not None:
             if in_ is not None or out is not None:
                 raise RuntimeError("must pass only one of set / (in_,out)")
 
-            result = Space.set_alloc(ctx, nparam=len(params),
-                    dim=len(set))
-
-            for i, name in enumerate(set):
-                result = result.set_dim_name(dt.set, i, name)
-
         elif in_ is not None and out is not None:
             if set is not None:
                 raise RuntimeError("must pass only one of set / (in_,out)")
 
-            result = Space.alloc(ctx, nparam=len(params),
-                    n_in=len(in_), n_out=len(out))
-
-            for i, name in enumerate(in_):
-                result = result.set_dim_name(dt.in_, i, name)
-
-            for i, name in enumerate(out):
-                result = result.set_dim_name(dt.out, i, name)
         else:
             raise RuntimeError("invalid parameter combination")
 
-        for i, name in enumerate(params):
-            result = result.set_dim_name(dt.param, i, name)
-
-        return result
+        return Space._create_from_names(ctx, params, set, in_, out)
 
     Space.create_from_names = staticmethod(space_create_from_names)
     Space.get_var_dict = space_get_var_dict
@@ -444,13 +424,17 @@ def _add_functionality():
         else:
             types = [dimtype]
 
+        space = self.get_space()
+
         result = {}
         for tp in types:
-            for i in range(self.get_space().dim(tp)):
+            if dim_to_name is None:
+                names = space._get_dim_names(tp)
+            for i in range(space.dim(tp)):
                 coeff = self.get_coefficient_val(tp, i)
                 if coeff:
                     if dim_to_name is None:
-                        name = self.get_dim_name(tp, i)
+                        name = names[i]
                     else:
                         name = dim_to_name[(tp, i)]
 
@@ -527,9 +511,7 @@ def _add_functionality():
 
     def basic_obj_get_constraints(self):
         """Get a list of constraints."""
-        result = []
-        self.foreach_constraint(result.append)
-        return result
+        return self._collect_constraint()
 
     # {{{ BasicSet
 
@@ -547,9 +529,7 @@ def _add_functionality():
 
     def set_get_basic_sets(self):
         """Get the list of :class:`BasicSet` instances in this :class:`Set`."""
-        result = []
-        self.foreach_basic_set(result.append)
-        return result
+        return self._collect_basic_set()
 
     Set.get_basic_sets = set_get_basic_sets
 
@@ -559,9 +539,7 @@ def _add_functionality():
 
     def map_get_basic_maps(self):
         """Get the list of :class:`BasicMap` instances in this :class:`Map`."""
-        result = []
-        self.foreach_basic_map(result.append)
-        return result
+        return self._collect_basic_map()
 
     Map.get_basic_maps = map_get_basic_maps
 
@@ -586,7 +564,7 @@ def _add_functionality():
             one of :class:`dim_type`.
         """
         return self.get_space().get_var_dict(
-                dimtype, ignore_out=isinstance(self, EXPR_CLASSES))
+                dimtype, ignore_out=isinstance(self, _EXPR_CLASSES))
 
     def obj_get_var_ids(self, dimtype):
         """Return a list of :class:`Id` instances for :class:`dim_type` *dimtype*."""
@@ -594,9 +572,15 @@ def _add_functionality():
 
     def obj_get_var_names(self, dimtype):
         """Return a list of dim names (in order) for :class:`dim_type` *dimtype*."""
-        return [self.get_dim_name(dimtype, i) for i in range(self.dim(dimtype))]
-
-    for cls in ALL_CLASSES:
+        names = self.get_space()._get_dim_names(dimtype)
+        if names is None:
+            # not part of the space, e.g. dim_type.div
+            names = [self.get_dim_name(dimtype, i)
+                    for i in range(self.dim(dimtype))]
+        return names
+
+    @for_each_class
+    def add_common_functionality(cls):
         if hasattr(cls, "get_space") and cls is not Space:
             cls.get_id_dict = obj_get_id_dict
             cls.get_var_dict = obj_get_var_dict
@@ -612,27 +596,13 @@ def _add_functionality():
         """
         :return: list of (:class:`Set`, :class:`Aff`)
         """
-
-        result = []
-
-        def append_tuple(*args):
-            result.append(args)
-
-        self.foreach_piece(append_tuple)
-        return result
+        return self._collect_piece()
 
     def pwqpolynomial_get_pieces(self):
         """
         :return: list of (:class:`Set`, :class:`QPolynomial`)
         """
-
-        result = []
-
-        def append_tuple(*args):
-            result.append(args)
-
-        self.foreach_piece(append_tuple)
-        return result
+        return self._collect_piece()
 
     def pw_get_aggregate_domain(self):
         """
@@ -648,20 +618,13 @@ def _add_functionality():
     PwAff.get_pieces = pwaff_get_pieces
     PwAff.get_aggregate_domain = pw_get_aggregate_domain
 
-    PwQPolynomial.get_pieces = pwqpolynomial_get_pieces
-    PwQPolynomial.get_aggregate_domain = pw_get_aggregate_domain
-
     # }}}
 
     # {{{ QPolynomial
 
     def qpolynomial_get_terms(self):
         """Get the list of :class:`Term` instances in this :class:`QPolynomial`."""
-        result = []
-        self.foreach_term(result.append)
-        return result
-
-    QPolynomial.get_terms = qpolynomial_get_terms
+        return self._collect_term()
 
     # }}}
 
@@ -681,47 +644,21 @@ def _add_functionality():
 
         return self.eval(pt).to_python()
 
-    PwQPolynomial.eval_with_dict = pwqpolynomial_eval_with_dict
-
     # }}}
 
     # {{{ arithmetic
 
-    def _number_to_expr_like(template, num):
-        number_aff = Aff.zero_on_domain(template.get_domain_space())
-        number_aff = number_aff.set_constant_val(num)
+    # Numbers (and Vals) are applied directly through add_constant_val and
+    # scale_val, rather than being turned into an expression first.
+    # DeferredAff handles arithmetic with Aff and PwAff itself.
 
-        if isinstance(template, Aff):
-            return number_aff
-        if isinstance(template, QPolynomial):
-            return QPolynomial.from_aff(number_aff)
-
-        # everything else is piecewise
-
-        if template.get_pieces():
-            number_pw_aff = PwAff.empty(template.get_space())
-            for set, _ in template.get_pieces():
-                number_pw_aff = set.indicator_function().cond(
-                        number_aff, number_pw_aff)
-        else:
-            number_pw_aff = PwAff.alloc(
-                    Set.universe(template.domain().space),
-                    number_aff)
-
-        if isinstance(template, PwAff):
-            return number_pw_aff
-
-        elif isinstance(template, PwQPolynomial):
-            return PwQPolynomial.from_pw_aff(number_pw_aff)
-
-        else:
-            raise TypeError("unexpected template type")
-
-    ARITH_CLASSES = (Aff, PwAff, QPolynomial, PwQPolynomial)  # noqa
+    ARITH_CLASSES = (Aff, PwAff)  # extended once part 3 is exposed
 
     def expr_like_add(self, other):
         if not isinstance(other, ARITH_CLASSES):
-            other = _number_to_expr_like(self, other)
+            if isinstance(other, DeferredAff):
+                return NotImplemented
+            return self.add_constant_val(other)
 
         try:
             return self.add(other)
@@ -730,7 +667,9 @@ def _add_functionality():
 
     def expr_like_sub(self, other):
         if not isinstance(other, ARITH_CLASSES):
-            other = _number_to_expr_like(self, other)
+            if isinstance(other, DeferredAff):
+                return NotImplemented
+            return self.add_constant_val(-other)
 
         try:
             return self.sub(other)
@@ -739,13 +678,17 @@ def _add_functionality():
 
     def expr_like_rsub(self, other):
         if not isinstance(other, ARITH_CLASSES):
-            other = _number_to_expr_like(self, other)
+            if isinstance(other, DeferredAff):
+                return NotImplemented
+            return self.neg().add_constant_val(other)
 
         return -self + other
 
     def expr_like_mul(self, other):
         if not isinstance(other, ARITH_CLASSES):
-            other = _number_to_expr_like(self, other)
+            if isinstance(other, DeferredAff):
+                return NotImplemented
+            return self.scale_val(other)
 
         try:
             return self.mul(other)
@@ -755,7 +698,7 @@ def _add_functionality():
     def expr_like_floordiv(self, other):
         return self.scale_down_val(other).floor()
 
-    for expr_like_class in ARITH_CLASSES:
+    def add_arithmetic(expr_like_class):
         expr_like_class.__add__ = expr_like_add
         expr_like_class.__radd__ = expr_like_add
         expr_like_class.__sub__ = expr_like_sub
@@ -764,8 +707,8 @@ def _add_functionality():
         expr_like_class.__rmul__ = expr_like_mul
         expr_like_class.__neg__ = expr_like_class.neg
 
-    for qpoly_class in [QPolynomial, PwQPolynomial]:
-        expr_like_class.__pow__ = expr_like_class.pow
+    for expr_like_class in ARITH_CLASSES:
+        add_arithmetic(expr_like_class)
 
     for aff_class in [Aff, PwAff]:
         aff_class.__mod__ = aff_class.mod_val
@@ -832,7 +775,6 @@ def _add_functionality():
     Val.__ne__ = Val.ne
 
     Val.__repr__ = val_repr
-    Val.__str__ = Val.to_str
     Val.to_python = val_to_python
 
     # }}}
@@ -840,7 +782,10 @@ def _add_functionality():
     # {{{ add automatic 'self' upcasts
 
     # note: automatic upcasts for method arguments are provided through
-    # 'implicitly_convertible' on the C++ side of the wrapper.
+    # 'implicitly_convertible' on the C++ side of the wrapper. Wrapped methods
+    # are also exposed there on the classes 'self' may be upcast from (see
+    # UPCASTS in gen_wrap.py), so only methods defined in Python remain to be
+    # taken care of here.
 
     def make_new_upcast_wrapper(method, upcast):
         # This function provides a scope in which method and upcast
@@ -871,6 +816,7 @@ def _add_functionality():
 
     def add_upcasts(basic_class, special_class, upcast_method):
         from functools import update_wrapper
+        from types import FunctionType
 
         def my_ismethod(class_, method_name):
             if method_name.startswith("_"):
@@ -889,17 +835,20 @@ def _add_functionality():
 
             return True
 
-        for method_name in dir(special_class):
-            special_method = getattr(special_class, method_name)
-
-            if not my_ismethod(special_class, method_name):
+        # Only look at the class's own namespace, rather than dir(), which
+        # would include the thousands of wrapped methods.
+        for method_name, special_method in list(vars(special_class).items()):
+            if (method_name.startswith("_")
+                    or not isinstance(special_method, FunctionType)):
                 continue
 
             if hasattr(basic_class, method_name):
                 # method already exists in basic class
                 basic_method = getattr(basic_class, method_name)
 
-                if not my_ismethod(basic_class, method_name):
+                if (basic_method is special_method
+                        or not my_ismethod(basic_class, method_name)):
+                    # e.g. get_var_dict, which is shared by all classes
                     continue
 
                 wrapper = make_existing_upcast_wrapper(
@@ -949,7 +898,8 @@ def _add_functionality():
     def obj_ne(self, other):
         return not self.__eq__(other)
 
-    for cls in ALL_CLASSES:
+    @for_each_class
+    def add_rich_comparisons(cls):
         if hasattr(cls, "is_equal"):
             cls.__eq__ = obj_eq
             cls.__ne__ = obj_ne
@@ -984,28 +934,13 @@ def _add_functionality():
             should be left alone by the projection
 
         .. versionadded:: 2011.3
-        """
 
-        for tp in types:
-            while True:
-                space = obj.get_space()
-                var_dict = space.get_var_dict(tp)
-
-                all_indices = set(range(space.dim(tp)))
-                leftover_indices = set(var_dict[name][1] for name in names
-                        if name in var_dict)
-                project_indices = all_indices-leftover_indices
-                if not project_indices:
-                    break
+        .. versionchanged:: 2021.1
 
-                min_index = min(project_indices)
-                count = 1
-                while min_index+count in project_indices:
-                    count += 1
-
-                obj = obj.project_out(tp, min_index, count)
+            Implemented using :meth:`Set.project_out_names`.
+        """
 
-        return obj
+        return obj.project_out_names(names, keep=True, types=types)
 
     # }}}
 
@@ -1019,53 +954,133 @@ def _add_functionality():
             should be left alone by the eliminate
 
         .. versionadded:: 2011.3
+
+        .. versionchanged:: 2021.1
+
+            Implemented using :meth:`Set.eliminate_names`.
         """
 
-        for tp in types:
-            space = obj.get_space()
-            var_dict = space.get_var_dict(tp)
-            to_eliminate = (
-                    set(range(space.dim(tp)))
-                    - set(var_dict[name][1] for name in names
-                        if name in var_dict))
+        return obj.eliminate_names(names, keep=True, types=types)
+
+    # }}}
+
+    for c in [BasicSet, BasicMap, Set, Map]:
+        c.project_out_except = obj_project_out_except
 
-            while to_eliminate:
-                min_index = min(to_eliminate)
-                count = 1
-                while min_index+count in to_eliminate:
-                    count += 1
+    for c in [BasicSet, Set]:
+        c.eliminate_except = obj_eliminate_except
 
-                obj = obj.eliminate(tp, min_index, count)
+    # {{{ ASTs as Python objects
 
-                to_eliminate -= set(range(min_index, min_index+count))
+    def ast_node_to_python(self):
+        """Return the tree rooted at *self* as (nested) named tuples,
+        converted in a single pass in C++:
 
-        return obj
+        .. code-block:: text
 
-    # }}}
+            AstForNode(iterator, init, cond, inc, body)
+            AstIfNode(cond, then_node, else_node)   # else_node may be None
+            AstBlockNode(children)                  # a tuple of nodes
+            AstMarkNode(id, node)                   # id is the name
+            AstUserNode(expr)
 
-    # {{{ add_constraints
+        with expressions (see :meth:`AstExpr.to_python`) in place of
+        :class:`AstExpr` and nodes in place of :class:`AstNode`.
 
-    def obj_add_constraints(obj, constraints):
+        .. versionadded:: 2021.1
         """
-        .. versionadded:: 2011.3
+        return self._to_python(_AST_TUPLE_TYPES)
+
+    def ast_expr_to_python(self):
+        """Return *self* as (nested) named tuples, converted in a single pass
+        in C++:
+
+        .. code-block:: text
+
+            AstOpExpr(op_type, args)    # op_type is an ast_expr_op_type,
+                                        # args a tuple of expressions
+            AstIdExpr(name)
+
+        with integer constants as :class:`int`.
+
+        .. versionadded:: 2021.1
         """
+        return self._to_python(_AST_TUPLE_TYPES)
+
+    # }}}
+
+    # {{{ part 3
+
+    def add_part3_functionality(new_classes):
+        nonlocal ARITH_CLASSES
+
+        for cls in new_classes:
+            for adder in per_class_adders:
+                adder(cls)
+
+        QPolynomial = _isl.QPolynomial  # noqa: N806
+        PwQPolynomial = _isl.PwQPolynomial  # noqa: N806
+
+        PwQPolynomial.get_pieces = pwqpolynomial_get_pieces
+        PwQPolynomial.get_aggregate_domain = pw_get_aggregate_domain
+        PwQPolynomial.eval_with_dict = pwqpolynomial_eval_with_dict
+        QPolynomial.get_terms = qpolynomial_get_terms
 
-        for cns in constraints:
-            obj = obj.add_constraint(cns)
+        ARITH_CLASSES += (QPolynomial, PwQPolynomial)
 
-        return obj
+        _isl.AstNode.to_python = ast_node_to_python
+        _isl.AstExpr.to_python = ast_expr_to_python
+
+        for qpoly_class in [QPolynomial, PwQPolynomial]:
+            add_arithmetic(qpoly_class)
+            qpoly_class.__pow__ = qpoly_class.pow
 
     # }}}
 
-    for c in [BasicSet, BasicMap, Set, Map]:
-        c.project_out_except = obj_project_out_except
-        c.add_constraints = obj_add_constraints
+    return add_part3_functionality
 
-    for c in [BasicSet, Set]:
-        c.eliminate_except = obj_eliminate_except
 
+_add_part3_functionality = _add_functionality()
+
+
+# {{{ lazy exposure of part 3
+
+_LAZY_NAMES = _PART3_CLASS_NAMES + ("ALL_CLASSES", "EXPR_CLASSES")
 
-_add_functionality()
+
+def _on_part3_exposed():
+    global _ALL_CLASSES, _EXPR_CLASSES
+
+    new_classes = tuple(getattr(_isl, name) for name in _PART3_CLASS_NAMES)
+    globals().update((cls.__name__, cls) for cls in new_classes)
+    _ALL_CLASSES += new_classes
+    _EXPR_CLASSES += tuple(cls for cls in new_classes if _is_expr_class(cls))
+    globals().update(ALL_CLASSES=_ALL_CLASSES, EXPR_CLASSES=_EXPR_CLASSES)
+
+    _add_part3_functionality(new_classes)
+
+
+_isl._set_part3_exposed_hook(_on_part3_exposed)
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        # exposes part 3, binding *name* in this module via _on_part3_exposed
+        _isl.Schedule
+        return globals()[name]
+
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
+
+
+if sys.version_info < (3, 7):
+    # no module-level __getattr__ (PEP 562), expose everything right away
+    _isl.Schedule
+
+# }}}
 
 
 def _back_to_basic(new_obj, old_obj):
@@ -1178,32 +1193,8 @@ def _align_dim_type(template_dt, obj, template, obj_bigger_ok, obj_names,
     return obj
 
 
-def align_spaces(obj, template, obj_bigger_ok=False, across_dim_types=None):
-    """
-    Try to make the space in which *obj* lives the same as that of *template* by
-    adding/matching named dimensions.
-
-    :param obj_bigger_ok: If *True*, no error is raised if the resulting *obj*
-        has more dimensions than *template*.
-    """
-
-    if across_dim_types is not None:
-        from warnings import warn
-        warn("across_dim_types is deprecated and should no longer be used. "
-                "It never had any effect anyway.",
-                DeprecationWarning, stacklevel=2)
-
-    have_any_param_domains = (
-            isinstance(obj, (Set, BasicSet))
-            and isinstance(template, (Set, BasicSet))
-            and (obj.is_params() or template.is_params()))
-    if have_any_param_domains:
-        if obj.is_params():
-            obj = type(obj).from_params(obj)
-        if template.is_params():
-            template = type(template).from_params(template)
-
-    if isinstance(template, EXPR_CLASSES):
+def _align_dim_types(obj, template, obj_bigger_ok):
+    if isinstance(template, _EXPR_CLASSES):
         dim_types = _CHECK_DIM_TYPES[:]
         dim_types.remove(dim_type.out)
     else:
@@ -1227,128 +1218,1591 @@ def align_spaces(obj, template, obj_bigger_ok=False, across_dim_types=None):
     return obj
 
 
-def align_two(obj1, obj2, across_dim_types=None):
-    """Align the spaces of two objects, potentially modifying both of them.
+# {{{ alignment plans
+
+# An alignment plan captures what _align_dim_type does to an object in a
+# given space when aligning it to a given template space. It is applied in
+# at most two isl operations: align_params to reorder and insert parameters,
+# and one preimage/pullback under a MultiAff that reorders, inserts and
+# moves the remaining dimensions.
+#
+# kind: "set", "map" or "expr", see _get_alignment_kind
+# param_model: a parameter :class:`Space` for align_params, or *None*
+# reordering: a :class:`MultiAff` from the aligned to the original space,
+#     or *None*
+
+_AlignmentPlan = namedtuple("_AlignmentPlan",
+        ["kind", "param_model", "reordering"])
+
+_ALIGNMENT_TUPLE_DIM_TYPES = {
+        "set": [dim_type.set],
+        "map": [dim_type.in_, dim_type.out],
+        "expr": [dim_type.in_],
+        }
+
+_ALIGNMENT_PLAN_CACHE = {}
+_ALIGNMENT_PLAN_CACHE_MAX_SIZE = 512
+
+
+def _get_alignment_kind(obj, template, template_space):
+    if (isinstance(obj, (BasicSet, Set))
+            and isinstance(template, (BasicSet, Set, Space))
+            and template_space.is_set()):
+        return "set"
+    elif (isinstance(obj, (BasicMap, Map))
+            and isinstance(template, (BasicMap, Map, Space))
+            and template_space.is_map()):
+        return "map"
+    elif isinstance(obj, (Aff, PwAff)) and isinstance(template, (Aff, PwAff)):
+        return "expr"
+    else:
+        return None
 
-    See also :func:`align_spaces`.
-    """
 
-    if across_dim_types is not None:
-        from warnings import warn
-        warn("across_dim_types is deprecated and should no longer be used. "
-                "It never had any effect anyway.",
-                DeprecationWarning, stacklevel=2)
+def _get_aligned_space(kind, obj_space, template_space, obj_bigger_ok):
+    """Return the space :func:`_align_dim_type` turns *obj_space* into, by
+    aligning a universe (or zero) object in that space. Raises the same
+    errors as aligning an actual object would.
+    """
+    if kind == "set":
+        obj = Set.universe(obj_space)
+        template = template_space
+    elif kind == "map":
+        obj = Map.universe(obj_space)
+        template = template_space
+    else:
+        obj = Aff.zero_on_domain(LocalSpace.from_space(obj_space.domain()))
+        template = Aff.zero_on_domain(
+                LocalSpace.from_space(template_space.domain()))
 
-    obj1 = align_spaces(obj1, obj2, obj_bigger_ok=True)
-    obj2 = align_spaces(obj2, obj1, obj_bigger_ok=True)
-    return (obj1, obj2)
+    return _align_dim_types(obj, template, obj_bigger_ok).get_space()
 
 
-def make_zero_and_vars(set_vars, params=[], ctx=None):
+def _make_alignment_plan(kind, obj_space, template_space, obj_bigger_ok):
+    """Return an :class:`_AlignmentPlan`, or *None* if the alignment is
+    better left to :func:`_align_dim_type`, including all cases in which
+    it raises an error.
     """
-    :arg set_vars: an iterable of variable names, or a comma-separated string
-    :arg params: an iterable of variable names, or a comma-separated string
 
-    :return: a dictionary from variable names (in *set_vars* and *params*)
-        to :class:`PwAff` instances that represent each of the
-        variables. They key '0' is also include and represents
-        a :class:`PwAff` zero constant.
+    # Dimension types are referred to by their index in all_dts below,
+    # comparing and hashing dim_type values is comparatively slow.
+    all_dts = [dim_type.param] + _ALIGNMENT_TUPLE_DIM_TYPES[kind]
+    param = 0
+
+    template_names = set()
+    for dt in all_dts:
+        for i in range(template_space.dim(dt)):
+            name = template_space.get_dim_name(dt, i)
+            if name is None or name in template_names:
+                return None
+            template_names.add(name)
+
+    obj_names = []
+    for dt in all_dts:
+        obj_names.append([
+            obj_space.get_dim_name(dt, i) for i in range(obj_space.dim(dt))])
+
+    named = [name for names in obj_names for name in names if name is not None]
+    if None in obj_names[param] or len(set(named)) != len(named):
+        return None
+
+    try:
+        aligned_space = _get_aligned_space(
+                kind, obj_space, template_space, obj_bigger_ok)
+    except Error:
+        return None
+
+    # {{{ find where each dimension of obj ends up
+
+    aligned_name_to_pos = {}
+    for k, dt in enumerate(all_dts):
+        for i in range(aligned_space.dim(dt)):
+            name = aligned_space.get_dim_name(dt, i)
+            if name is None:
+                continue
+            if name in aligned_name_to_pos:
+                # e.g. an Aff domain dimension named like a parameter
+                return None
+            aligned_name_to_pos[name] = (k, i)
+
+    # Dimensions not named in the template stay in their dim_type, after
+    # those of the template, in their original order.
+    obj_pos_to_target_pos = []
+    for k, dt in enumerate(all_dts):
+        nleftovers = 0
+        for i, name in enumerate(obj_names[k]):
+            if name in template_names:
+                tgt_k, tgt_idx = aligned_name_to_pos[name]
+                if (k == param and (tgt_k != param
+                            or aligned_space.find_dim_by_id(
+                                dt, obj_space.get_dim_id(dt, i)) != tgt_idx)
+                        or kind == "expr" and tgt_k != k):
+                    # Parameters cannot become tuple dimensions, and are
+                    # aligned by Id.
+                    # _align_dim_type never moves dimensions of an Aff or
+                    # PwAff between parameters and the domain.
+                    return None
+            else:
+                tgt_k = k
+                tgt_idx = template_space.dim(dt) + nleftovers
+                nleftovers += 1
 
-    .. versionadded:: 2016.1.1
+            obj_pos_to_target_pos.append((k, tgt_k, tgt_idx))
 
-    This function is intended to make it relatively easy to construct sets
-    programmatically without resorting to string manipulation.
+    # }}}
 
-    Usage example::
+    def is_unchanged(k):
+        dt = all_dts[k]
+        return (
+                aligned_space.dim(dt) == obj_space.dim(dt)
+                and all(
+                    aligned_space.get_dim_name(dt, i) == name
+                    and (name is None or aligned_space.find_dim_by_id(
+                        dt, obj_space.get_dim_id(dt, i)) == i)
+                    for i, name in enumerate(obj_names[k])))
+
+    param_model = None
+    if not is_unchanged(param):
+        param_model = aligned_space.params()
+
+    if kind == "expr":
+        tuples_unchanged = obj_space.domain().has_equal_tuples(
+                aligned_space.domain())
+    else:
+        tuples_unchanged = obj_space.has_equal_tuples(aligned_space)
+
+    if (tuples_unchanged
+            and all(is_unchanged(k) for k in range(1, len(all_dts)))):
+        return _AlignmentPlan(kind, param_model, None)
+
+    # {{{ build reordering
+
+    obj_aligned_space = obj_space
+    if param_model is not None:
+        obj_aligned_space = obj_space.align_params(param_model)
+        if obj_aligned_space.params() != param_model:
+            return None
+
+    if kind == "set":
+        domain_space = aligned_space
+        range_space = obj_aligned_space
+    elif kind == "map":
+        domain_space = aligned_space.wrap()
+        range_space = obj_aligned_space.wrap()
+    else:
+        domain_space = aligned_space.domain()
+        range_space = obj_aligned_space.domain()
+
+    # position of each tuple of the aligned space in the (wrapped) domain
+    offsets = [0]
+    offset = 0
+    for k in range(1, len(all_dts)):
+        offsets.append(offset)
+        offset += aligned_space.dim(all_dts[k])
+
+    affs = [
+            Aff.var_on_domain(
+                domain_space,
+                dim_type.param if tgt_k == param else dim_type.set,
+                offsets[tgt_k] + tgt_idx)
+            for k, tgt_k, tgt_idx in obj_pos_to_target_pos
+            if k != param]
+
+    reordering = MultiAff.from_aff_list(
+            domain_space.map_from_domain_and_range(range_space),
+            AffList.from_py(obj_space.get_ctx(), affs))
 
-        v = isl.make_zero_and_vars("i,j,k", "n")
+    # }}}
 
-        myset = (
-                v[0].le_set(v["i"] + v["j"])
-                &
-                (v["i"] + v["j"]).lt_set(v["n"])
-                &
-                (v[0].le_set(v["i"]))
-                &
-                (v["i"].le_set(13 + v["n"]))
-                )
-    """
-    if ctx is None:
-        ctx = DEFAULT_CONTEXT
+    return _AlignmentPlan(kind, param_model, reordering)
 
-    if isinstance(set_vars, str):
-        set_vars = [s.strip() for s in set_vars.split(",")]
-    if isinstance(params, str):
-        params = [s.strip() for s in params.split(",")]
 
-    space = Space.create_from_names(ctx, set=set_vars, params=params)
-    return affs_from_space(space)
+class _AlignmentPlanKey:
+    """Key of :data:`_ALIGNMENT_PLAN_CACHE`. Spaces only match spaces of the
+    same :class:`Context` with the same printed form, so that dimension
+    names count, unlike for :meth:`Space.is_equal`.
+    """
 
+    __slots__ = ["kind", "obj_space", "template_space", "obj_bigger_ok",
+            "strs", "hash"]
+
+    def __init__(self, kind, obj_space, template_space, obj_bigger_ok):
+        self.kind = kind
+        self.obj_space = obj_space
+        self.template_space = template_space
+        self.obj_bigger_ok = obj_bigger_ok
+        self.strs = (str(obj_space), str(template_space))
+        self.hash = hash((kind, self.strs, obj_bigger_ok))
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return (self.hash == other.hash
+                and self.kind == other.kind
+                and self.obj_bigger_ok == other.obj_bigger_ok
+                and self.strs == other.strs
+                and self.obj_space.get_ctx() == other.obj_space.get_ctx()
+                and self.template_space.get_ctx()
+                == other.template_space.get_ctx()
+                and self.obj_space.is_equal(other.obj_space)
+                and self.template_space.is_equal(other.template_space))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
-def affs_from_space(space):
-    """
-    :return: a dictionary from variable names (in *set_vars* and *params*)
-        to :class:`PwAff` instances that represent each of the
-        variables *in*space*. They key '0' is also include and represents
-        a :class:`PwAff` zero constant.
 
-    .. versionadded:: 2016.2
+def _get_alignment_plan(obj, template, obj_bigger_ok):
+    obj_space = obj.get_space()
+    if isinstance(template, Space):
+        template_space = template
+    else:
+        template_space = template.get_space()
 
-    This function is intended to make it relatively easy to construct sets
-    programmatically without resorting to string manipulation.
+    kind = _get_alignment_kind(obj, template, template_space)
+    if kind is None:
+        return None
 
-    Usage example::
+    key = _AlignmentPlanKey(kind, obj_space, template_space, obj_bigger_ok)
+    try:
+        return _ALIGNMENT_PLAN_CACHE[key]
+    except KeyError:
+        pass
 
-        s = isl.Set("[n] -> {[i,j,k]: 0<=i,j,k<n}")
-        v = isl.affs_from_space(s.space)
+    plan = _make_alignment_plan(kind, obj_space, template_space, obj_bigger_ok)
 
-        myset = (
-                v[0].le_set(v["i"] + v["j"])
-                &
-                (v["i"] + v["j"]).lt_set(v["n"])
-                &
-                (v[0].le_set(v["i"]))
-                &
-                (v["i"].le_set(13 + v["n"]))
-                )
-    """
+    if len(_ALIGNMENT_PLAN_CACHE) >= _ALIGNMENT_PLAN_CACHE_MAX_SIZE:
+        _ALIGNMENT_PLAN_CACHE.clear()
+    _ALIGNMENT_PLAN_CACHE[key] = plan
 
-    result = {}
+    return plan
 
-    zero = Aff.zero_on_domain(LocalSpace.from_space(space))
-    result[0] = PwAff.from_aff(zero)
 
-    var_dict = zero.get_var_dict()
-    for name, (dt, idx) in var_dict.items():
-        result[name] = PwAff.from_aff(zero.set_coefficient_val(dt, idx, 1))
+def _apply_alignment_plan(plan, obj):
+    if plan.param_model is not None:
+        obj = obj.align_params(plan.param_model)
 
-    return result
+    if plan.reordering is not None:
+        if plan.kind == "set":
+            obj = obj.preimage_multi_aff(plan.reordering)
+        elif plan.kind == "map":
+            obj = obj.wrap().preimage_multi_aff(plan.reordering).unwrap()
+        else:
+            obj = obj.pullback_multi_aff(plan.reordering)
 
+    return obj
 
-class SuppressedWarnings:
-    def __init__(self, ctx):
-        self.ctx = ctx
 
-    def __enter__(self):
-        self.prev_on_error = self.ctx.get_on_error()
-        self.ctx.set_on_error(on_error.CONTINUE)
+def clear_alignment_cache():
+    """Forget the alignment plans cached by :func:`align_spaces`. The cache
+    holds references to spaces, which keep their :class:`Context` alive.
 
-    def __exit__(self, type, value, traceback):
-        self.ctx.set_on_error(self.prev_on_error)
+    .. versionadded:: 2021.1
+    """
+    _ALIGNMENT_PLAN_CACHE.clear()
 
+# }}}
 
-# {{{ give sphinx something to import so we can produce docs
 
-def _define_doc_link_names():
-    class Div:
-        pass
+def align_spaces(obj, template, obj_bigger_ok=False, across_dim_types=None):
+    """
+    Try to make the space in which *obj* lives the same as that of *template* by
+    adding/matching named dimensions.
 
-    _isl.Div = Div
+    :param obj_bigger_ok: If *True*, no error is raised if the resulting *obj*
+        has more dimensions than *template*.
 
+    .. versionchanged:: 2021.1
 
-_define_doc_link_names()
+        How to align a given space to a given template space is worked out
+        once and cached, see :func:`clear_alignment_cache`. The alignment
+        itself is then done in at most two operations on *obj*.
+    """
 
-# }}}
+    if across_dim_types is not None:
+        from warnings import warn
+        warn("across_dim_types is deprecated and should no longer be used. "
+                "It never had any effect anyway.",
+                DeprecationWarning, stacklevel=2)
+
+    have_any_param_domains = (
+            isinstance(obj, (Set, BasicSet))
+            and isinstance(template, (Set, BasicSet))
+            and (obj.is_params() or template.is_params()))
+    if have_any_param_domains:
+        if obj.is_params():
+            obj = type(obj).from_params(obj)
+        if template.is_params():
+            template = type(template).from_params(template)
+
+    plan = _get_alignment_plan(obj, template, obj_bigger_ok)
+    if plan is not None:
+        return _apply_alignment_plan(plan, obj)
+
+    return _align_dim_types(obj, template, obj_bigger_ok)
+
+
+def align_two(obj1, obj2, across_dim_types=None):
+    """Align the spaces of two objects, potentially modifying both of them.
+
+    See also :func:`align_spaces`.
+    """
+
+    if across_dim_types is not None:
+        from warnings import warn
+        warn("across_dim_types is deprecated and should no longer be used. "
+                "It never had any effect anyway.",
+                DeprecationWarning, stacklevel=2)
+
+    obj1 = align_spaces(obj1, obj2, obj_bigger_ok=True)
+    obj2 = align_spaces(obj2, obj1, obj_bigger_ok=True)
+    return (obj1, obj2)
+
+
+def align_many(objs):
+    """Align the spaces of all of *objs* to a common space that has all the
+    named dimensions found in any of them.
+
+    A name that is a parameter of any of *objs* becomes a parameter of the
+    common space. Other dimensions keep the :class:`dim_type` they have in the
+    first object in which they occur. Within each :class:`dim_type`,
+    dimensions are ordered by first occurrence.
+
+    :arg objs: an iterable of :class:`BasicSet` and :class:`Set`, of
+        :class:`BasicMap` and :class:`Map`, or of :class:`Aff` and
+        :class:`PwAff` instances. All their dimensions must be named.
+    :return: a tuple ``(aligned_objs, space)``. *aligned_objs* is a list of
+        the aligned objects, in the order of *objs*. They keep their tuple
+        names. *space* is the common :class:`Space`, or for
+        :class:`Aff` and :class:`PwAff`, the common domain space.
+
+    See also :func:`align_spaces`.
+
+    .. versionadded:: 2021.1
+    """
+    objs = list(objs)
+    if not objs:
+        raise ValueError("objs may not be empty")
+
+    spaces = [obj.get_space() for obj in objs]
+    kind = _get_alignment_kind(objs[0], objs[0], spaces[0])
+    if kind is None or any(
+            _get_alignment_kind(obj, objs[0], spaces[0]) != kind
+            for obj in objs):
+        raise TypeError("objs must all be sets, all be maps or all be "
+                "Aff/PwAff, and not parameter domains")
+
+    tuple_dts = _ALIGNMENT_TUPLE_DIM_TYPES[kind]
+
+    # {{{ collect names
+
+    names = []
+    name_to_id = {}
+    name_to_dim_type = {}
+    for space in spaces:
+        for dt in [dim_type.param] + tuple_dts:
+            for i in range(space.dim(dt)):
+                name = space.get_dim_name(dt, i)
+                if name is None:
+                    raise Error("align_many requires all dimensions to be named")
+
+                if name not in name_to_id:
+                    names.append(name)
+                    name_to_id[name] = space.get_dim_id(dt, i)
+                    name_to_dim_type[name] = dt
+                elif dt == dim_type.param:
+                    name_to_dim_type[name] = dt
+
+    target = {dt: [] for dt in [dim_type.param] + tuple_dts}
+    for name in names:
+        target[name_to_dim_type[name]].append(name)
+
+    # }}}
+
+    ctx = spaces[0].get_ctx()
+    nparam = len(target[dim_type.param])
+    if kind == "map":
+        space = Space.alloc(ctx, nparam,
+                len(target[dim_type.in_]), len(target[dim_type.out]))
+    else:
+        space = Space.set_alloc(ctx, nparam, len(target[tuple_dts[0]]))
+
+    for dt, dt_names in six.iteritems(target):
+        if kind == "expr" and dt == dim_type.in_:
+            # an Aff's domain dimensions are set dimensions of its domain
+            dt = dim_type.set
+        for i, name in enumerate(dt_names):
+            space = space.set_dim_id(dt, i, name_to_id[name])
+
+    if kind == "expr":
+        template = Aff.zero_on_domain(space)
+    else:
+        template = space
+
+    aligned_objs = []
+    for obj, obj_space in zip(objs, spaces):
+        aligned = align_spaces(obj, template)
+
+        # align_spaces drops tuple ids when it inserts dimensions
+        for dt in tuple_dts:
+            if not obj_space.has_tuple_id(dt):
+                continue
+            if kind == "set":
+                aligned = aligned.set_tuple_id(obj_space.get_tuple_id(dt))
+            else:
+                aligned = aligned.set_tuple_id(dt, obj_space.get_tuple_id(dt))
+
+        aligned_objs.append(aligned)
+
+    return aligned_objs, space
+
+
+# {{{ deferred affine expressions
+
+_FloorTerm = namedtuple("_FloorTerm", ["numerator", "denominator"])
+
+
+def _format_deferred_terms(constant, coefficients):
+    result = ""
+    for key, coeff in list(coefficients.items()) + [(1, constant)]:
+        if key == 1 and (coeff == 0 and result):
+            continue
+        if isinstance(key, _FloorTerm):
+            var = "floor((%s)/%d)" % (key.numerator, key.denominator)
+        else:
+            var = "" if key == 1 else key
+
+        if result:
+            result += " - " if coeff < 0 else " + "
+        elif coeff < 0:
+            result = "-"
+
+        if abs(coeff) != 1 or not var:
+            result += str(abs(coeff)) + ("*" if var else "")
+        result += var
+    return result
+
+
+class DeferredAff:
+    """A quasi-affine expression in the variables of a set :class:`Space`,
+    kept in Python until it is turned into isl objects in a single call.
+    Obtained from :func:`make_zero_and_vars` or :func:`affs_from_space`
+    with *deferred=True*.
+
+    Supports ``+``, ``-``, multiplication by integers, and ``//`` and ``%``
+    by positive integers. Combining it with an :class:`Aff` or
+    :class:`PwAff` turns it into a :class:`PwAff` first.
+
+    .. attribute:: space
+    .. attribute:: constant
+    .. attribute:: coefficients
+
+        A :class:`dict` mapping variable names (and floor divisions) to
+        their nonzero integer coefficients.
+
+    .. automethod:: to_aff
+    .. automethod:: to_pw_aff
+    .. automethod:: le_set
+    .. automethod:: lt_set
+    .. automethod:: ge_set
+    .. automethod:: gt_set
+    .. automethod:: eq_set
+
+    .. versionadded:: 2021.1
+    """
+
+    def __init__(self, space, coefficients=None, constant=0):
+        self.space = space
+        self.coefficients = coefficients if coefficients is not None else {}
+        self.constant = constant
+
+    # {{{ conversion
+
+    def _encode(self):
+        return (self.constant, [
+            ((key.numerator._encode(), key.denominator)
+                if isinstance(key, _FloorTerm) else key, coeff)
+            for key, coeff in self.coefficients.items()])
+
+    def to_aff(self):
+        """:return: an :class:`Aff` on :attr:`space`"""
+        return self.space._build_deferred_aff(self._encode())
+
+    def to_pw_aff(self):
+        """:return: a :class:`PwAff` on :attr:`space`"""
+        return PwAff.from_aff(self.to_aff())
+
+    def _coerce(self, other):
+        if isinstance(other, DeferredAff):
+            if other.space is not self.space and other.space != self.space:
+                raise Error("deferred expressions have different spaces")
+            return other
+        if isinstance(other, Integral):
+            return DeferredAff(self.space, constant=int(other))
+        return None
+
+    # }}}
+
+    # {{{ arithmetic
+
+    def _add(self, other, sign):
+        coefficients = self.coefficients.copy()
+        for key, coeff in other.coefficients.items():
+            coeff = coefficients.get(key, 0) + sign*coeff
+            if coeff:
+                coefficients[key] = coeff
+            else:
+                coefficients.pop(key, None)
+        return DeferredAff(self.space, coefficients,
+                self.constant + sign*other.constant)
+
+    def _scale(self, factor):
+        if not factor:
+            return DeferredAff(self.space)
+        return DeferredAff(self.space,
+                {key: factor*coeff for key, coeff in self.coefficients.items()},
+                factor*self.constant)
+
+    def __add__(self, other):
+        coerced = self._coerce(other)
+        if coerced is None:
+            if isinstance(other, (Aff, PwAff)):
+                return self.to_pw_aff() + other
+            return NotImplemented
+        return self._add(coerced, 1)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        coerced = self._coerce(other)
+        if coerced is None:
+            if isinstance(other, (Aff, PwAff)):
+                return self.to_pw_aff() - other
+            return NotImplemented
+        return self._add(coerced, -1)
+
+    def __rsub__(self, other):
+        coerced = self._coerce(other)
+        if coerced is None:
+            if isinstance(other, (Aff, PwAff)):
+                return other - self.to_pw_aff()
+            return NotImplemented
+        return coerced._add(self, -1)
+
+    def __neg__(self):
+        return self._scale(-1)
+
+    def __mul__(self, other):
+        coerced = self._coerce(other)
+        if coerced is None:
+            if isinstance(other, (Aff, PwAff)):
+                return self.to_pw_aff() * other
+            return NotImplemented
+        if not coerced.coefficients:
+            return self._scale(coerced.constant)
+        if not self.coefficients:
+            return coerced._scale(self.constant)
+        raise TypeError("product of deferred expressions is not affine")
+
+    __rmul__ = __mul__
+
+    def __floordiv__(self, other):
+        if not isinstance(other, Integral) or other <= 0:
+            return NotImplemented
+        other = int(other)
+        if other == 1:
+            return self
+        if not self.coefficients:
+            return DeferredAff(self.space, constant=self.constant // other)
+        return DeferredAff(self.space, {_FloorTerm(self, other): 1})
+
+    def __mod__(self, other):
+        if not isinstance(other, Integral) or other <= 0:
+            return NotImplemented
+        other = int(other)
+        return self - other*(self // other)
+
+    # }}}
+
+    # {{{ comparisons
+
+    def _constraint(self, other, equality, sign, offset, pw_aff_method):
+        coerced = self._coerce(other)
+        if coerced is None:
+            if isinstance(other, (Aff, PwAff)):
+                return getattr(self.to_pw_aff(), pw_aff_method)(other)
+            raise TypeError("cannot compare deferred expression with '%s'"
+                    % type(other).__name__)
+
+        expr = self._add(coerced, -1)._scale(sign)._add(
+                DeferredAff(self.space, constant=offset), 1)
+        if equality:
+            return DeferredBasicSet(self.space, [expr], [])
+        else:
+            return DeferredBasicSet(self.space, [], [expr])
+
+    def le_set(self, other):
+        """:return: a :class:`DeferredBasicSet` where *self* <= *other*"""
+        return self._constraint(other, False, -1, 0, "le_set")
+
+    def lt_set(self, other):
+        """:return: a :class:`DeferredBasicSet` where *self* < *other*"""
+        return self._constraint(other, False, -1, -1, "lt_set")
+
+    def ge_set(self, other):
+        """:return: a :class:`DeferredBasicSet` where *self* >= *other*"""
+        return self._constraint(other, False, 1, 0, "ge_set")
+
+    def gt_set(self, other):
+        """:return: a :class:`DeferredBasicSet` where *self* > *other*"""
+        return self._constraint(other, False, 1, -1, "gt_set")
+
+    def eq_set(self, other):
+        """:return: a :class:`DeferredBasicSet` where *self* == *other*"""
+        return self._constraint(other, True, 1, 0, "eq_set")
+
+    # }}}
+
+    # floor divisions are keys of coefficients, so these are structural
+
+    def __eq__(self, other):
+        return (isinstance(other, DeferredAff)
+                and self.constant == other.constant
+                and self.coefficients == other.coefficients)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.constant, frozenset(self.coefficients.items())))
+
+    def __str__(self):
+        return _format_deferred_terms(self.constant, self.coefficients)
+
+    def __repr__(self):
+        return "DeferredAff(%r)" % str(self)
+
+
+class DeferredBasicSet:
+    """A conjunction of constraints on :class:`DeferredAff` expressions,
+    as returned by :meth:`DeferredAff.le_set` and friends. Combine these with
+    ``&``, then use :meth:`to_basic_set` or :meth:`to_set`, which build all
+    constraints in one call. Combining with a :class:`BasicSet` or
+    :class:`Set` builds the constraints first.
+
+    .. attribute:: space
+    .. attribute:: equalities
+
+        A :class:`list` of :class:`DeferredAff` that are zero.
+
+    .. attribute:: inequalities
+
+        A :class:`list` of :class:`DeferredAff` that are non-negative.
+
+    .. automethod:: to_basic_set
+    .. automethod:: to_set
+
+    .. versionadded:: 2021.1
+    """
+
+    def __init__(self, space, equalities, inequalities):
+        self.space = space
+        self.equalities = equalities
+        self.inequalities = inequalities
+
+    def to_basic_set(self):
+        """:return: a :class:`BasicSet` on :attr:`space`"""
+        return self.space._build_deferred_basic_set(
+                [eq._encode() for eq in self.equalities],
+                [ineq._encode() for ineq in self.inequalities])
+
+    def to_set(self):
+        """:return: a :class:`Set` on :attr:`space`"""
+        return Set.from_basic_set(self.to_basic_set())
+
+    def __and__(self, other):
+        if isinstance(other, DeferredBasicSet):
+            if other.space is not self.space and other.space != self.space:
+                raise Error("deferred sets have different spaces")
+            return DeferredBasicSet(self.space,
+                    self.equalities + other.equalities,
+                    self.inequalities + other.inequalities)
+        if isinstance(other, (BasicSet, Set)):
+            return self.to_basic_set() & other
+        return NotImplemented
+
+    __rand__ = __and__
+
+    def __str__(self):
+        return " and ".join(
+                ["%s = 0" % eq for eq in self.equalities]
+                + ["%s >= 0" % ineq for ineq in self.inequalities]) or "true"
+
+    def __repr__(self):
+        return "DeferredBasicSet(%r)" % str(self)
+
+# }}}
+
+
+def make_zero_and_vars(set_vars, params=[], ctx=None, deferred=False):
+    """
+    :arg set_vars: an iterable of variable names, or a comma-separated string
+    :arg params: an iterable of variable names, or a comma-separated string
+    :arg deferred: see :func:`affs_from_space`
+
+    :return: a dictionary from variable names (in *set_vars* and *params*)
+        to :class:`PwAff` instances that represent each of the
+        variables. They key '0' is also include and represents
+        a :class:`PwAff` zero constant.
+
+    .. versionadded:: 2016.1.1
+
+    .. versionchanged:: 2021.1
+
+        See :func:`affs_from_space` for the type of the result. With
+        :meth:`Context.enable_space_cache`, repeated calls with the same names
+        share the already built :class:`PwAff` instances. Added *deferred*.
+
+    This function is intended to make it relatively easy to construct sets
+    programmatically without resorting to string manipulation.
+
+    Usage example::
+
+        v = isl.make_zero_and_vars("i,j,k", "n")
+
+        myset = (
+                v[0].le_set(v["i"] + v["j"])
+                &
+                (v["i"] + v["j"]).lt_set(v["n"])
+                &
+                (v[0].le_set(v["i"]))
+                &
+                (v["i"].le_set(13 + v["n"]))
+                )
+    """
+    if ctx is None:
+        ctx = DEFAULT_CONTEXT
+
+    if isinstance(set_vars, str):
+        set_vars = [s.strip() for s in set_vars.split(",")]
+    if isinstance(params, str):
+        params = [s.strip() for s in params.split(",")]
+
+    space = Space.create_from_names(ctx, set=set_vars, params=params)
+    return affs_from_space(space, deferred=deferred)
+
+
+class _VarAffDict(MutableMapping):
+    """A mapping from variable names (and 0) to :class:`PwAff` instances, as
+    returned by :func:`affs_from_space`. Each :class:`PwAff` is built on
+    first access. Indexing with a tuple of keys returns a tuple of
+    :class:`PwAff` instances, built in a single call.
+    """
+
+    def __init__(self, space):
+        self._space = space
+
+        # also checks that *space* is a set space with unique names
+        zero, = space._get_var_pw_affs([0])
+        self._affs = {0: zero}
+
+        self._keys = {0: None}
+        for names in [
+                space._get_dim_names(dim_type.set),
+                space._get_dim_names(dim_type.param)]:
+            for name in names:
+                if name is not None:
+                    self._keys[name] = None
+
+    def _materialize(self, keys):
+        missing = [key for key in keys if key not in self._affs]
+        if missing:
+            for key in missing:
+                if key not in self._keys:
+                    raise KeyError(key)
+            for key, aff in zip(missing, self._space._get_var_pw_affs(missing)):
+                self._affs[key] = aff
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            self._materialize(key)
+            return tuple(self._affs[k] for k in key)
+
+        try:
+            return self._affs[key]
+        except KeyError:
+            self._materialize([key])
+            return self._affs[key]
+
+    def __setitem__(self, key, value):
+        self._keys[key] = None
+        self._affs[key] = value
+
+    def __delitem__(self, key):
+        del self._keys[key]
+        self._affs.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        result = _VarAffDict.__new__(_VarAffDict)
+        result._space = self._space
+        result._affs = self._affs.copy()
+        result._keys = self._keys.copy()
+        return result
+
+
+def affs_from_space(space, deferred=False):
+    """
+    :arg deferred: if *True*, return a :class:`dict` of :class:`DeferredAff`
+        instances instead, whose arithmetic and comparisons stay in Python
+        until the result is turned into an :class:`Aff` or a
+        :class:`BasicSet`.
+
+    :return: a dictionary from variable names (in *set_vars* and *params*)
+        to :class:`PwAff` instances that represent each of the
+        variables *in*space*. They key '0' is also include and represents
+        a :class:`PwAff` zero constant.
+
+    .. versionadded:: 2016.2
+
+    .. versionchanged:: 2021.1
+
+        The result is a mutable mapping rather than a :class:`dict`. Each
+        :class:`PwAff` is built on first access and cached along with
+        *space*, and ``v["i", "j"]`` returns a tuple of several of them.
+        Added *deferred*.
+
+    This function is intended to make it relatively easy to construct sets
+    programmatically without resorting to string manipulation.
+
+    Usage example::
+
+        s = isl.Set("[n] -> {[i,j,k]: 0<=i,j,k<n}")
+        v = isl.affs_from_space(s.space)
+
+        myset = (
+                v[0].le_set(v["i"] + v["j"])
+                &
+                (v["i"] + v["j"]).lt_set(v["n"])
+                &
+                (v[0].le_set(v["i"]))
+                &
+                (v["i"].le_set(13 + v["n"]))
+                )
+    """
+
+    if deferred:
+        if space.is_map():
+            raise Error("expecting (parameter) set space")
+        # checks that the names are unique
+        space.get_var_dict()
+
+        result = {0: DeferredAff(space)}
+        for names in [
+                space._get_dim_names(dim_type.set),
+                space._get_dim_names(dim_type.param)]:
+            for name in names:
+                if name is not None:
+                    result[name] = DeferredAff(space, {name: 1})
+        return result
+
+    return _VarAffDict(space)
+
+
+class SuppressedWarnings:
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def __enter__(self):
+        self.prev_on_error = self.ctx.get_on_error()
+        self.ctx.set_on_error(on_error.CONTINUE)
+
+    def __exit__(self, type, value, traceback):
+        self.ctx.set_on_error(self.prev_on_error)
+
+
+# {{{ batch parsing
+
+def parse_many(cls, strings, ctx=None, return_errors=False, nthreads=1):
+    """Parse each of *strings* into an instance of *cls*, in a single loop
+    in C++.
+
+    :arg cls: a class with a ``read_from_str`` method, such as :class:`Set`,
+        :class:`Map`, :class:`UnionMap`, :class:`PwAff` or :class:`Schedule`.
+    :arg strings: a sequence of :class:`str`, :class:`bytes` or other
+        (contiguous) buffers such as :class:`memoryview`. These are
+        parsed in place, except for buffers not ending in a NUL byte,
+        which are copied once.
+    :arg ctx: the :class:`Context` to parse into. Defaults to
+        :data:`DEFAULT_CONTEXT`.
+    :arg return_errors: if *False*, raise :exc:`Error` for the first item
+        that fails to parse. If *True*, put an :exc:`Error` instance into
+        the result in place of each such item.
+    :arg nthreads: if greater than one, split *strings* into up to this
+        many contiguous chunks, and parse each of them in a thread of its
+        own, with the GIL released. Each thread parses into a new
+        :class:`Context`, so that the objects parsed by different threads
+        belong to different contexts and cannot be combined with each other
+        (nor with objects in *ctx*). Only the error reporting settings
+        of *ctx* carry over to these contexts. With a single thread, the
+        GIL stays held, as *ctx* may be in use by other threads.
+    :return: a :class:`list` with one object (or :exc:`Error`) per string.
+
+    .. versionadded:: 2021.1
+    """
+    if ctx is None:
+        ctx = DEFAULT_CONTEXT
+
+    return _isl._parse_many(cls, strings, ctx, return_errors, nthreads)
+
+# }}}
+
+
+# {{{ printing
+
+def to_strs(objs):
+    """Return a :class:`list` of the :class:`str` of each of *objs*, in a
+    single loop in C++.
+
+    Like :func:`str`, this caches the printed form on each object.
+
+    .. versionadded:: 2021.1
+    """
+    return _isl._to_strs(objs)
+
+# }}}
+
+
+# {{{ schedule cache
+
+class _FileLock:
+    """An exclusive lock on *path*, held between processes while in a
+    :keyword:`with` block. The file is created if needed and left in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # closing the file releases the lock
+        os.close(self.fd)
+
+
+def _get_default_schedule_cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "islpy", "schedules")
+
+
+class ScheduleCache:
+    """A persistent cache of the results of
+    :meth:`ScheduleConstraints.compute_schedule`, kept in a directory that
+    may be shared between processes.
+
+    Schedule constraints are identified by a fingerprint of their printed
+    form (which includes the domain, the context and all kinds of
+    dependences), the scheduler options of their :class:`Context` (those
+    accessed by ``get_schedule_*``) and the version of :mod:`islpy`, which
+    determines that of isl. Each schedule
+    is stored compressed in a file of its own, which is replaced
+    atomically. While a schedule is computed, a lock file keeps other
+    processes from computing the same one.
+
+    Schedules are stored in their printed form, so that :class:`Id`
+    instances in them do not retain their user data.
+
+    .. attribute:: directory
+
+    .. attribute:: hits
+
+        The number of schedules returned from the cache by this instance.
+
+    .. attribute:: misses
+
+        The number of schedules computed by this instance.
+
+    .. automethod:: fingerprint
+    .. automethod:: compute_schedule
+    .. automethod:: get
+    .. automethod:: clear
+
+    .. versionadded:: 2021.1
+    """
+
+    def __init__(self, directory=None):
+        """
+        :arg directory: where to store the schedules, created if needed.
+            Defaults to ``islpy/schedules`` in the user's cache directory
+            (``$XDG_CACHE_HOME`` or ``~/.cache``).
+        """
+        if directory is None:
+            directory = _get_default_schedule_cache_dir()
+
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, sched_constraints):
+        """
+        :returns: a hexadecimal :class:`str` identifying
+            *sched_constraints* (along with the relevant options of its
+            context) in the cache.
+        """
+        ctx = sched_constraints.get_ctx()
+
+        h = hashlib.sha256()
+        h.update(("islpy %s" % VERSION_TEXT).encode())
+        for opt in _SCHEDULER_OPTIONS:
+            h.update(("\n%s=%r" % (opt, getattr(ctx, "get_"+opt)())).encode())
+        h.update(b"\n")
+        h.update(str(sched_constraints).encode())
+        return h.hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + ".isl.z")
+
+    def _read(self, ctx, key):
+        try:
+            with open(self._get_path(key), "rb") as inf:
+                data = inf.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            return _isl.Schedule.read_from_str(
+                    ctx, zlib.decompress(data).decode())
+        except (zlib.error, UnicodeDecodeError, Error):
+            # damaged, e.g. by a full disk, compute it again
+            return None
+
+    def _write(self, key, schedule):
+        tmp_path = "%s.%d.tmp" % (self._get_path(key), os.getpid())
+        with open(tmp_path, "wb") as outf:
+            outf.write(zlib.compress(str(schedule).encode()))
+        os.replace(tmp_path, self._get_path(key))
+
+    def get(self, sched_constraints):
+        """
+        :returns: the cached :class:`Schedule` for *sched_constraints*,
+            or *None* if there is none.
+        """
+        schedule = self._read(sched_constraints.get_ctx(),
+                self.fingerprint(sched_constraints))
+        if schedule is not None:
+            self.hits += 1
+        return schedule
+
+    def compute_schedule(self, sched_constraints):
+        """Return the cached :class:`Schedule` for *sched_constraints* if
+        there is one, otherwise compute it (using
+        :meth:`ScheduleConstraints.compute_schedule`) and store it in the
+        cache.
+        """
+        ctx = sched_constraints.get_ctx()
+        key = self.fingerprint(sched_constraints)
+
+        schedule = self._read(ctx, key)
+        if schedule is None:
+            with _FileLock(self._get_path(key) + ".lock"):
+                # another process may have computed it while we waited
+                schedule = self._read(ctx, key)
+                if schedule is None:
+                    schedule = sched_constraints.compute_schedule()
+                    self._write(key, schedule)
+                    self.misses += 1
+                    return schedule
+
+        self.hits += 1
+        return schedule
+
+    def clear(self):
+        """Remove all schedules from the cache."""
+        for name in os.listdir(self.directory):
+            if name.endswith(".isl.z"):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+# }}}
+
+
+# {{{ incremental dataflow analysis
+
+_FLOW_GETTERS = [
+        "get_must_dependence", "get_may_dependence",
+        "get_full_must_dependence", "get_full_may_dependence",
+        "get_must_no_source", "get_may_no_source"]
+
+
+def _get_tuple_key(space):
+    if space.has_tuple_name(dim_type.set):
+        name = space.get_tuple_name(dim_type.set)
+    else:
+        name = None
+
+    if space.is_wrapping():
+        unwrapped = space.unwrap()
+        return (name,
+                _get_tuple_key(unwrapped.domain()),
+                _get_tuple_key(unwrapped.range()))
+    else:
+        return (name, space.dim(dim_type.set))
+
+
+def _get_array_key(access):
+    """Two access relations refer to the same array if they have the same
+    key, without regard to names of array dimensions.
+    """
+    return _get_tuple_key(access.get_space().range())
+
+
+def _group_by_array(umap):
+    result = {}
+    if umap is not None:
+        for access in umap.get_map_list():
+            result.setdefault(_get_array_key(access), []).append(access)
+    return result
+
+
+def _union_of(ctx, maps):
+    result = UnionMap.empty_ctx(ctx)
+    for m in maps:
+        result = result.add_map(m) if isinstance(m, Map) else result.union(m)
+    return result
+
+
+class CombinedUnionFlow:
+    """The combined result of the analyses performed by
+    :meth:`IncrementalFlow.compute_flow`, with the same methods for
+    retrieving results as :class:`UnionFlow`. Each of them returns the
+    union of the corresponding results of the parts, computed on first
+    use.
+
+    .. method:: get_must_dependence()
+    .. method:: get_may_dependence()
+    .. method:: get_full_must_dependence()
+    .. method:: get_full_may_dependence()
+    .. method:: get_must_no_source()
+    .. method:: get_may_no_source()
+
+    .. versionadded:: 2021.1
+    """
+
+    def __init__(self, ctx, parts):
+        self._ctx = ctx
+        self._parts = parts
+        self._results = {}
+
+    def _get(self, i):
+        try:
+            return self._results[i]
+        except KeyError:
+            result = _union_of(self._ctx, [part[i] for part in self._parts])
+            self._results[i] = result
+            return result
+
+    def get_ctx(self):
+        return self._ctx
+
+
+def _add_flow_getter(i, name):
+    def getter(self):
+        return self._get(i)
+
+    getter.__name__ = name
+    setattr(CombinedUnionFlow, name, getter)
+
+
+for _i, _name in enumerate(_FLOW_GETTERS):
+    _add_flow_getter(_i, _name)
+
+del _i, _name
+
+
+class IncrementalFlow:
+    """Dataflow analysis as by :meth:`UnionAccessInfo.compute_flow`,
+    reusing the results of earlier calls to :meth:`compute_flow` for the
+    parts of the access relations that have not changed since.
+
+    Dependences only relate accesses to the same array, so the analysis
+    is carried out separately for each array, and, given the sources and
+    kills of the array, for each sink access (i.e. each pair of statement
+    and array). The result for a sink access is reused as long as neither
+    it, nor the sources and kills of its array, nor the schedule have
+    changed, as judged by comparing their printed forms.
+
+    .. attribute:: ncomputed
+
+        The number of sink accesses analyzed by the last call to
+        :meth:`compute_flow`.
+
+    .. attribute:: nreused
+
+        The number of sink accesses for which the last call to
+        :meth:`compute_flow` reused an earlier result.
+
+    .. automethod:: set_schedule
+    .. automethod:: compute_flow
+
+    .. versionadded:: 2021.1
+    """
+
+    def __init__(self, schedule):
+        """
+        :arg schedule: a :class:`Schedule`, or a :class:`UnionMap` to
+            be passed to :meth:`UnionAccessInfo.set_schedule_map`.
+        """
+        self._results = {}
+        self.ncomputed = 0
+        self.nreused = 0
+        self.set_schedule(schedule)
+
+    def set_schedule(self, schedule):
+        """Use *schedule* from now on. Unless it prints the same as the
+        previous one, this discards all earlier results.
+        """
+        if str(schedule) != str(getattr(self, "_schedule", None)):
+            self._results = {}
+        self._schedule = schedule
+
+    def _compute_one(self, sink, must_source, may_source, kill):
+        info = _isl.UnionAccessInfo.from_sink(UnionMap.from_map(sink))
+        info = info.set_must_source(must_source)
+        info = info.set_may_source(may_source)
+        info = info.set_kill(kill)
+        if isinstance(self._schedule, UnionMap):
+            info = info.set_schedule_map(self._schedule)
+        else:
+            info = info.set_schedule(self._schedule)
+
+        flow = info.compute_flow()
+        return tuple(getattr(flow, name)() for name in _FLOW_GETTERS)
+
+    def compute_flow(self, sink, must_source=None, may_source=None,
+            kill=None):
+        """
+        :arg sink: a :class:`UnionMap` of sink accesses.
+        :arg must_source: a :class:`UnionMap` of must-source accesses,
+            or *None*.
+        :arg may_source: a :class:`UnionMap` of may-source accesses,
+            or *None*.
+        :arg kill: a :class:`UnionMap` of kills, or *None*.
+        :returns: a :class:`CombinedUnionFlow`.
+        """
+        ctx = sink.get_ctx()
+        array_to_sinks = _group_by_array(sink)
+        array_to_must_sources = _group_by_array(must_source)
+        array_to_may_sources = _group_by_array(may_source)
+        array_to_kills = _group_by_array(kill)
+
+        results = {}
+        parts = []
+        self.ncomputed = 0
+        self.nreused = 0
+
+        for array, sinks in array_to_sinks.items():
+            sources = [
+                    _union_of(ctx, array_to_sources.get(array, []))
+                    for array_to_sources in [
+                        array_to_must_sources, array_to_may_sources,
+                        array_to_kills]]
+            sources_key = tuple(str(umap) for umap in sources)
+
+            prev_array_results = self._results.get(array)
+            if (prev_array_results is not None
+                    and prev_array_results[0] != sources_key):
+                prev_array_results = None
+
+            sink_results = {}
+            for sink_access in sinks:
+                sink_key = str(sink_access)
+                part = None
+                if prev_array_results is not None:
+                    part = prev_array_results[1].get(sink_key)
+
+                if part is None:
+                    part = self._compute_one(sink_access, *sources)
+                    self.ncomputed += 1
+                else:
+                    self.nreused += 1
+
+                sink_results[sink_key] = part
+                parts.append(part)
+
+            results[array] = (sources_key, sink_results)
+
+        # only keep what is still in use
+        self._results = results
+
+        return CombinedUnionFlow(ctx, parts)
+
+# }}}
+
+
+# {{{ ASTs as Python objects
+
+AstForNode = namedtuple("AstForNode", ["iterator", "init", "cond", "inc", "body"])
+AstIfNode = namedtuple("AstIfNode", ["cond", "then_node", "else_node"])
+AstBlockNode = namedtuple("AstBlockNode", ["children"])
+AstMarkNode = namedtuple("AstMarkNode", ["id", "node"])
+AstUserNode = namedtuple("AstUserNode", ["expr"])
+AstOpExpr = namedtuple("AstOpExpr", ["op_type", "args"])
+AstIdExpr = namedtuple("AstIdExpr", ["name"])
+
+_AST_TUPLE_TYPES = (
+        AstForNode, AstIfNode, AstBlockNode, AstMarkNode, AstUserNode,
+        AstOpExpr, AstIdExpr)
+
+# }}}
+
+
+# {{{ object tracking
+
+def _get_creation_traceback():
+    import traceback
+    return traceback.extract_stack(sys._getframe(1))
+
+
+def track_object_creation(enable=True):
+    """Record the Python traceback at which each subsequently created
+    object was created, for as long as the object is alive. The recorded
+    tracebacks are available through :meth:`Context.live_object_tracebacks`.
+    This is intended for finding the origin of leaked objects and slows
+    down object creation considerably.
+
+    See also :meth:`Context.live_object_count`,
+    :meth:`Context.peak_live_object_count` and
+    :meth:`Context.live_object_counts_by_class`.
+
+    .. versionadded:: 2021.1
+    """
+    _isl._set_creation_traceback_factory(
+            _get_creation_traceback if enable else None)
+
+# }}}
+
+
+# {{{ profiling
+
+_ACTIVE_PROFILES = []
+
+
+def _is_islpy_frame(frame):
+    name = frame.f_globals.get("__name__", "")
+    return name == "islpy" or name.startswith("islpy.")
+
+
+class Profile:
+    """Operation counts and wall time spent in isl, attributed to the
+    Python source lines that (directly or through helpers in :mod:`islpy`)
+    called into isl. Returned by :func:`profile`.
+
+    .. attribute:: entries
+
+        A :class:`dict` mapping ``(filename, lineno, function_name)`` to
+        a list ``[ncalls, operations, time]``. Time and operations are
+        exclusive, i.e. work done in isl calls made from Python callbacks
+        is only counted towards the line making the nested call.
+        *operations* is *None* if operation counts are not available.
+
+    .. attribute:: have_operations
+
+        Whether operation counts are available
+        (see :meth:`Context.get_operations`).
+
+    .. automethod:: sort_stats
+    .. automethod:: print_stats
+
+    .. versionadded:: 2021.1
+    """
+
+    _sort_keys = {
+            "calls": 0, "ncalls": 0,
+            "operations": 1, "ops": 1,
+            "time": 2, "tottime": 2,
+            }
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.entries = {}
+        self._sort_key = "operations"
+
+        try:
+            ctx.get_operations()
+        except Error:
+            self.have_operations = False
+        else:
+            self.have_operations = True
+
+    # {{{ collection
+
+    def _record_call(self, c_name, operations, time):
+        frame = sys._getframe(1)
+        while frame is not None and _is_islpy_frame(frame):
+            frame = frame.f_back
+
+        if frame is None:
+            key = ("~", 0, "<islpy>")
+        else:
+            code = frame.f_code
+            key = (code.co_filename, frame.f_lineno, code.co_name)
+
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [
+                    0, 0 if self.have_operations else None, 0]
+        entry[0] += 1
+        if self.have_operations:
+            entry[1] += operations
+        entry[2] += time
+
+    def __enter__(self):
+        _ACTIVE_PROFILES.append(self)
+        _isl._set_call_profiler(self.ctx, self._record_call)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        _ACTIVE_PROFILES.remove(self)
+        if _ACTIVE_PROFILES:
+            outer = _ACTIVE_PROFILES[-1]
+            _isl._set_call_profiler(outer.ctx, outer._record_call)
+        else:
+            _isl._set_call_profiler(None, None)
+
+    # }}}
+
+    # {{{ reporting
+
+    def sort_stats(self, key):
+        """
+        :arg key: one of ``"operations"``, ``"time"`` or ``"calls"``
+        :return: *self*, for chaining with :meth:`print_stats`
+        """
+        if key not in self._sort_keys:
+            raise ValueError("unknown sort key: '%s'" % key)
+        self._sort_key = key
+        return self
+
+    def get_stats(self):
+        """
+        :return: a list of tuples ``(filename, lineno, function_name, ncalls,
+            operations, time)``, in the order given by :meth:`sort_stats`.
+        """
+        idx = self._sort_keys[self._sort_key]
+        if idx == 1 and not self.have_operations:
+            idx = 2
+
+        return [
+                key + tuple(entry)
+                for key, entry in sorted(
+                    self.entries.items(),
+                    key=lambda key_entry: key_entry[1][idx],
+                    reverse=True)]
+
+    def print_stats(self, amount=None, file=None):
+        """
+        :arg amount: if not *None*, the maximum number of lines to print
+        :arg file: a file-like object, defaulting to :data:`sys.stdout`
+        """
+        if file is None:
+            file = sys.stdout
+
+        stats = self.get_stats()
+        total_ops = sum(s[4] or 0 for s in stats)
+        total_time = sum(s[5] for s in stats)
+
+        print("%d isl calls, %s operations, %.6f seconds in isl" % (
+                sum(s[3] for s in stats),
+                total_ops if self.have_operations else "(unknown)",
+                total_time), file=file)
+        print(file=file)
+        print("%10s %14s %12s  %s" % (
+            "ncalls", "operations", "tottime", "filename:lineno(function)"),
+            file=file)
+
+        if amount is not None:
+            stats = stats[:amount]
+
+        for filename, lineno, func_name, ncalls, ops, time in stats:
+            print("%10d %14s %12.6f  %s:%d(%s)" % (
+                ncalls, "-" if ops is None else ops, time,
+                filename, lineno, func_name), file=file)
+
+    # }}}
+
+
+def profile(ctx=None):
+    """Return a context manager that, while active, records the wall time
+    and the number of isl operations (see :meth:`Context.get_operations`)
+    spent in each call into isl, attributed to the calling line of Python
+    source outside of :mod:`islpy`::
+
+        with isl.profile(ctx) as prof:
+            run_scheduler()
+
+        prof.sort_stats("operations").print_stats(10)
+
+    Only operations performed within *ctx* (default: :data:`DEFAULT_CONTEXT`)
+    are counted. Profiles may be nested, in which case only the innermost
+    one records calls.
+
+    :return: a :class:`Profile`
+
+    .. versionadded:: 2021.1
+    """
+    if ctx is None:
+        ctx = DEFAULT_CONTEXT
+
+    return Profile(ctx)
+
+# }}}
+
+
+# {{{ give sphinx something to import so we can produce docs
+
+def _define_doc_link_names():
+    class Div:
+        pass
+
+    _isl.Div = Div
+
+
+_define_doc_link_names()
+
+# }}}
+
+
+# Without __all__, "from islpy import *" would miss the names that are only
+# bound once part 3 is exposed.
+__all__ = sorted(
+        {name for name in globals() if not name.startswith("_")}
+        | set(_LAZY_NAMES))
 
 
 # vim: foldmethod=marker
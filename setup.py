@@ -224,6 +224,10 @@ def main():
         else:
             EXTRA_DEFINES["USE_GMP_FOR_MP"] = 1
 
+        # reads isl's private operation counter, see Context.get_operations
+        EXTRA_OBJECTS.append("src/wrapper/isl_ctx_operations.c")
+        EXTRA_DEFINES["ISLPY_HAVE_CTX_OPERATIONS"] = 1
+
     else:
         LIBRARY_DIRS.extend(conf["ISL_LIB_DIR"])
         LIBRARIES.extend(conf["ISL_LIBNAME"])
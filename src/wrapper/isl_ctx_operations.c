@@ -0,0 +1,12 @@
+/* isl counts the operations performed within each context, but only offers
+ * public accessors for the limit, not for the counter itself. This file is
+ * compiled along with the shipped copy of isl, where the private context
+ * layout is known.
+ */
+
+#include <isl_ctx_private.h>
+
+unsigned long islpy_ctx_get_operations(isl_ctx *ctx)
+{
+	return ctx ? ctx->operations : 0;
+}
@@ -1,4 +1,14 @@
 #include "wrap_isl.hpp"
+#include <cstring>
+#include <memory>
+#include <thread>
+
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
 
 void islpy_expose_part1(py::module &m);
 void islpy_expose_part2(py::module &m);
@@ -7,13 +17,475 @@ void islpy_expose_part3(py::module &m);
 namespace isl
 {
   ctx_use_map_t ctx_use_map;
+  PyObject *creation_traceback_factory = nullptr;
+  call_profiler_state profiler_state = { nullptr, nullptr, nullptr, nullptr };
+  bool part3_exposed = false;
+  std::unordered_map<PyObject *, parser> parsers;
+  std::unordered_map<PyObject *, py::str (*)(py::handle)> str_converters;
+
+  void *read_from_path(isl_ctx *ctx, py::object py_path, const char *c_name,
+      void *(*read_from_str)(isl_ctx *ctx, const char *str),
+      void *(*read_from_file)(isl_ctx *ctx, FILE *file))
+  {
+    std::string path = py::module::import("os").attr("fsencode")(py_path)
+      .cast<std::string>();
+    void *result = nullptr;
+    bool done = false;
+
+#ifndef _WIN32
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0)
+    {
+      PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, py_path.ptr());
+      throw py::error_already_set();
+    }
+
+    // The string is terminated by a zero written just past the end of the
+    // file, into the last page of the mapping. Being a private mapping,
+    // that page is copied on writing, so that data appended to the file
+    // afterwards cannot overwrite the terminator. Files of a size that is a
+    // multiple of the page size are read through a FILE instead.
+    struct stat st;
+    if (fstat(fd, &st) == 0 && S_ISREG(st.st_mode) && st.st_size > 0
+        && st.st_size % sysconf(_SC_PAGESIZE) != 0)
+    {
+      size_t size = (size_t) st.st_size;
+      void *data = mmap(nullptr, size, PROT_READ | PROT_WRITE, MAP_PRIVATE,
+          fd, 0);
+      if (data != MAP_FAILED)
+      {
+        ((char *) data)[size] = '\0';
+        madvise(data, size, MADV_SEQUENTIAL);
+
+        call_profiler profiler(c_name);
+        result = read_from_str(ctx, (const char *) data);
+        profiler.done();
+
+        munmap(data, size);
+        done = true;
+      }
+    }
+    close(fd);
+#endif
+
+    if (!done)
+    {
+      FILE *file = fopen(path.c_str(), "r");
+      if (!file)
+      {
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, py_path.ptr());
+        throw py::error_already_set();
+      }
+      setvbuf(file, nullptr, _IOFBF, 1 << 20);
+
+      call_profiler profiler(c_name);
+      result = read_from_file(ctx, file);
+      profiler.done();
+
+      fclose(file);
+    }
+
+    if (!result)
+      throw error(std::string("call to ") + c_name + " failed");
+    return result;
+  }
+}
+
+
+namespace islpy
+{
+  void set_options(py::options &options)
+  {
+    options.disable_function_signatures();
+
+    // The generated docstrings make up a good part of the time needed to
+    // import the module, allow skipping them where nobody reads them.
+    const char *no_docstrings = getenv("ISLPY_NO_DOCSTRINGS");
+    if (no_docstrings && *no_docstrings && strcmp(no_docstrings, "0") != 0)
+      options.disable_user_defined_docstrings();
+  }
+
+  // {{{ lazy exposure
+
+  // borrowed, the extension module lives until the interpreter exits
+  PyObject *isl_module = nullptr;
+
+  PyObject *part3_exposed_hook = nullptr;
+
+  // Python names of the classes declared with WRAP_PART3_CLASS, see
+  // PART_TO_CLASSES in gen_wrap.py.
+  const char *part3_class_names[] = {
+    "QPolynomial", "PwQPolynomial",
+    "QPolynomialFold", "PwQPolynomialFold",
+    "UnionPwQPolynomialFold", "UnionPwQPolynomial",
+    "Term",
+    "Schedule", "ScheduleConstraints", "ScheduleNode",
+    "AccessInfo", "Flow", "Restriction", "UnionAccessInfo", "UnionFlow",
+    "AstExpr", "AstNode", "AstPrintOptions", "AstBuild",
+  };
+
+  bool is_part3_class_name(const std::string &name)
+  {
+    for (const char *cls_name: part3_class_names)
+      if (name == cls_name)
+        return true;
+    return false;
+  }
+
+  void set_part3_exposed_hook(py::object hook)
+  {
+    Py_XDECREF(part3_exposed_hook);
+    part3_exposed_hook = nullptr;
+
+    if (!hook.is_none())
+    {
+      part3_exposed_hook = hook.inc_ref().ptr();
+      if (isl::part3_exposed)
+        hook();
+    }
+  }
+
+  py::object module_getattr(std::string name)
+  {
+    // PEP 562: only called for names not found in the module.
+    if (!isl::part3_exposed && is_part3_class_name(name))
+    {
+      isl::ensure_part3_exposed();
+
+      py::dict module_dict(py::handle(isl_module).attr("__dict__"));
+      if (module_dict.contains(name))
+        return module_dict[name.c_str()];
+    }
+
+    throw py::attribute_error(
+        "module 'islpy._isl' has no attribute '" + name + "'");
+  }
+
+  // }}}
+
+  void set_call_profiler(py::object py_ctx, py::object callback)
+  {
+    isl::call_profiler_state &state = isl::profiler_state;
+
+    Py_XDECREF(state.py_ctx);
+    Py_XDECREF(state.callback);
+    state.ctx = nullptr;
+    state.py_ctx = nullptr;
+    state.callback = nullptr;
+    state.innermost = nullptr;
+
+    if (!callback.is_none())
+    {
+      state.ctx = py_ctx.cast<isl::ctx &>().m_data;
+      state.py_ctx = py_ctx.inc_ref().ptr();
+      state.callback = callback.inc_ref().ptr();
+    }
+  }
+
+  // Like py::implicitly_convertible, but constructs To directly instead of
+  // calling its Python constructor, and marks the result as a temporary, so
+  // that it is passed to isl without another copy.
+  template <class From, class To>
+  void implicitly_upcastable()
+  {
+    auto upcaster = [](PyObject *obj, PyTypeObject *type) -> PyObject *
+    {
+      py::detail::make_caster<From> from_caster;
+      if (!from_caster.load(obj, false))
+        return nullptr;
+
+      From &from = py::detail::cast_op<From &>(from_caster);
+      if (!from.is_valid())
+        return nullptr;
+
+      try
+      {
+        std::unique_ptr<To> result(new To(from));
+        result->m_is_temporary = true;
+        return isl::handle_from_new_ptr(result.release()).release().ptr();
+      }
+      catch (std::exception &)
+      {
+        PyErr_Clear();
+        return nullptr;
+      }
+    };
+
+    py::detail::get_type_info(typeid(To))->implicit_conversions.push_back(
+        upcaster);
+  }
+
+  void set_creation_traceback_factory(py::object factory)
+  {
+    Py_XDECREF(isl::creation_traceback_factory);
+    if (factory.is_none())
+      isl::creation_traceback_factory = nullptr;
+    else
+      isl::creation_traceback_factory = factory.inc_ref().ptr();
+  }
+
+  py::list to_strs(py::object py_objs)
+  {
+    PyObject *objs_fast = PySequence_Fast(py_objs.ptr(),
+        "objs must be iterable");
+    if (!objs_fast)
+      throw py::error_already_set();
+    py::object objs = py::reinterpret_steal<py::object>(objs_fast);
+    size_t n = PySequence_Fast_GET_SIZE(objs.ptr());
+    PyObject **items = PySequence_Fast_ITEMS(objs.ptr());
+
+    py::list result(n);
+    for (size_t i = 0; i < n; ++i)
+    {
+      auto it = isl::str_converters.find((PyObject *) Py_TYPE(items[i]));
+      if (it != isl::str_converters.end())
+        result[i] = it->second(items[i]);
+      else
+        result[i] = py::str(items[i]);
+    }
+
+    return result;
+  }
+
+  // {{{ batch parsing
+
+  // The text of one item. The UTF-8 form of a str is cached on the object
+  // and NUL-terminated, as are bytes and buffers ending in a NUL byte, all
+  // of those are parsed in place. Other buffers are copied once.
+  struct parse_source
+  {
+    Py_buffer view;
+    bool has_view = false;
+    std::string copy;
+    const char *str = nullptr;
+
+    ~parse_source()
+    {
+      if (has_view)
+        PyBuffer_Release(&view);
+    }
+
+    void load(py::handle obj)
+    {
+      const char *data;
+      Py_ssize_t size;
+
+      if (PyUnicode_Check(obj.ptr()))
+      {
+        data = PyUnicode_AsUTF8AndSize(obj.ptr(), &size);
+        if (!data)
+          throw py::error_already_set();
+      }
+      else if (PyBytes_Check(obj.ptr()))
+      {
+        data = PyBytes_AS_STRING(obj.ptr());
+        size = PyBytes_GET_SIZE(obj.ptr());
+      }
+      else
+      {
+        if (PyObject_GetBuffer(obj.ptr(), &view, PyBUF_SIMPLE) != 0)
+        {
+          PyErr_Clear();
+          throw py::type_error(
+              std::string("expected str, bytes or a contiguous buffer, got ")
+              + Py_TYPE(obj.ptr())->tp_name);
+        }
+        has_view = true;
+
+        data = (const char *) view.buf;
+        size = view.len;
+        if (size && data[size-1] == '\0')
+          size -= 1;
+        else
+        {
+          copy.assign(data, size);
+          str = copy.c_str();
+          PyBuffer_Release(&view);
+          has_view = false;
+        }
+      }
+
+      if (memchr(str ? str : data, '\0', size))
+        throw py::value_error("embedded null byte");
+      if (!str)
+        str = data;
+    }
+  };
+
+  struct parse_batch
+  {
+    isl::parser const &parser;
+    size_t size;
+    std::unique_ptr<parse_source[]> sources;
+    std::unique_ptr<void *[]> results;
+    std::unique_ptr<std::string[]> errors;
+
+    parse_batch(isl::parser const &p, size_t n)
+      : parser(p), size(n), sources(new parse_source[n]),
+      results(new void *[n]()), errors(new std::string[n])
+    { }
+
+    ~parse_batch()
+    {
+      for (size_t i = 0; i < size; ++i)
+        if (results[i])
+          parser.free(results[i]);
+    }
+
+    // Does not touch Python objects, may run without the GIL held if ctx
+    // is not used anywhere else.
+    void parse(isl_ctx *ctx, size_t begin, size_t end, bool stop_at_error,
+        bool profile)
+    {
+      for (size_t i = begin; i < end; ++i)
+      {
+        isl_ctx_reset_error(ctx);
+
+        std::unique_ptr<isl::call_profiler> profiler;
+        if (profile)
+          profiler.reset(new isl::call_profiler(parser.c_name));
+        results[i] = parser.read_from_str(ctx, sources[i].str);
+        if (profiler)
+          profiler->done();
+
+        if (!results[i])
+        {
+          errors[i] = std::string("call to ") + parser.c_name + " failed";
+          const char *msg = isl_ctx_last_error_msg(ctx);
+          if (msg)
+            errors[i] += std::string(": ") + msg;
+
+          if (stop_at_error)
+            return;
+        }
+      }
+    }
+  };
+
+  py::list parse_many(py::object cls, py::object py_strings,
+      py::object py_ctx, bool return_errors, unsigned nthreads)
+  {
+    auto parser_it = isl::parsers.find(cls.ptr());
+    if (parser_it == isl::parsers.end())
+      throw py::type_error(
+          "cannot parse objects of type "
+          + py::str(cls).cast<std::string>());
+
+    PyObject *strings_fast = PySequence_Fast(py_strings.ptr(),
+        "strings must be iterable");
+    if (!strings_fast)
+      throw py::error_already_set();
+    py::object strings = py::reinterpret_steal<py::object>(strings_fast);
+    size_t n = PySequence_Fast_GET_SIZE(strings.ptr());
+    PyObject **items = PySequence_Fast_ITEMS(strings.ptr());
+
+    isl_ctx *ctx = py_ctx.cast<isl::ctx &>().m_data;
+
+    // Each thread parses a contiguous chunk into a context of its own,
+    // which is never seen by other threads, so the GIL can be released.
+    // (Declared before the batch, whose leftover results need them.)
+    std::vector<std::unique_ptr<isl::ctx> > thread_ctxs;
+    std::vector<size_t> chunk_starts;
+
+    parse_batch batch(parser_it->second, n);
+    for (size_t i = 0; i < n; ++i)
+      batch.sources[i].load(items[i]);
+
+    if (nthreads == 0)
+      throw py::value_error("nthreads must be positive");
+    if (nthreads > n)
+      nthreads = n ? n : 1;
+
+    if (nthreads == 1)
+    {
+      chunk_starts = { 0, n };
+      batch.parse(ctx, 0, n, !return_errors, true);
+    }
+    else
+    {
+      int on_error = isl_options_get_on_error(ctx);
+
+      for (unsigned i_thread = 0; i_thread < nthreads; ++i_thread)
+      {
+        chunk_starts.push_back(n * i_thread / nthreads);
+
+        isl_ctx *thread_ctx = isl_ctx_alloc();
+        if (!thread_ctx)
+          throw isl::error("failed to allocate context for parse_many");
+        thread_ctxs.emplace_back(new isl::ctx(thread_ctx));
+        isl_options_set_on_error(thread_ctx, on_error);
+      }
+      chunk_starts.push_back(n);
+
+      {
+        py::gil_scoped_release release;
+
+        std::vector<std::thread> threads;
+        for (unsigned i_thread = 0; i_thread < nthreads; ++i_thread)
+          threads.emplace_back(
+              [&batch, &thread_ctxs, &chunk_starts, i_thread, return_errors]()
+              {
+                batch.parse(thread_ctxs[i_thread]->m_data,
+                    chunk_starts[i_thread], chunk_starts[i_thread+1],
+                    !return_errors, false);
+              });
+        for (std::thread &thread: threads)
+          thread.join();
+      }
+    }
+
+    py::object error_type = py::handle(isl_module).attr("Error");
+    py::list result(n);
+    for (size_t i = 0; i < n; ++i)
+    {
+      if (batch.results[i])
+      {
+        void *obj = batch.results[i];
+        batch.results[i] = nullptr;
+        result[i] = batch.parser.wrap(obj);
+      }
+      else if (!batch.errors[i].empty())
+      {
+        if (!return_errors)
+          throw isl::error("parsing item " + std::to_string(i)
+              + " failed: " + batch.errors[i]);
+        result[i] = error_type(batch.errors[i]);
+      }
+      else
+        // not reached because of an earlier error in the same chunk, which
+        // is raised above
+        throw isl::error("parse_many: item " + std::to_string(i)
+            + " was not parsed");
+    }
+
+    return result;
+  }
+
+  // }}}
+}
+
+
+void isl::expose_part3()
+{
+  // set first, the exposing code must not come back here
+  part3_exposed = true;
+
+  // py::options only lasts for its scope, repeat what the module init did
+  py::options options;
+  islpy::set_options(options);
+
+  py::module m(py::reinterpret_borrow<py::module>(islpy::isl_module));
+  islpy_expose_part3(m);
+
+  if (islpy::part3_exposed_hook)
+    py::handle(islpy::part3_exposed_hook)();
 }
 
 
 PYBIND11_MODULE(_isl, m)
 {
   py::options options;
-  options.disable_function_signatures();
+  islpy::set_options(options);
 
   static py::exception<isl::error> ISLError(m, "Error", NULL);
   py::register_exception_translator(
@@ -141,6 +613,7 @@ PYBIND11_MODULE(_isl, m)
     .value("for_", isl_ast_node_for)
     .value("if_", isl_ast_node_if)
     .ENUM_VALUE(isl_ast_node_, block)
+    .ENUM_VALUE(isl_ast_node_, mark)
     .ENUM_VALUE(isl_ast_node_, user)
     ;
 
@@ -180,16 +653,55 @@ PYBIND11_MODULE(_isl, m)
   ADD_MACRO_ATTR(cls_schedule_algorithm, ISL_SCHEDULE_ALGORITHM_, ISL);
   ADD_MACRO_ATTR(cls_schedule_algorithm, ISL_SCHEDULE_ALGORITHM_, FEAUTRIER);
 
+  islpy::isl_module = m.ptr();
+
   islpy_expose_part1(m);
   islpy_expose_part2(m);
-  islpy_expose_part3(m);
+  // part 3 is exposed on demand, see isl::expose_part3
+
+  m.def("__getattr__", islpy::module_getattr, py::arg("name"));
+  {
+    py::list part3_class_names;
+    for (const char *cls_name: islpy::part3_class_names)
+      part3_class_names.append(cls_name);
+    m.attr("_PART3_CLASS_NAMES") = py::tuple(part3_class_names);
+  }
+  m.def("_set_part3_exposed_hook", islpy::set_part3_exposed_hook,
+      py::arg("hook"),
+      "_set_part3_exposed_hook(hook)\n\n"
+      "Call *hook* without arguments once the classes of part 3 of the "
+      "wrapper (polynomials, schedules, flow and AST) have been exposed, "
+      "right away if that has already happened.");
+
+  m.def("_set_call_profiler", islpy::set_call_profiler,
+      py::arg("ctx"), py::arg("callback"),
+      "_set_call_profiler(ctx, callback)\n\n"
+      "Install *callback* to be called as ``callback(c_name, operations, "
+      "seconds)`` after each call into isl, with *operations* counted "
+      "on *ctx*. Pass *None* for both to uninstall.");
+  m.def("_set_creation_traceback_factory",
+      islpy::set_creation_traceback_factory,
+      py::arg("factory"),
+      "_set_creation_traceback_factory(factory)\n\n"
+      "If *factory* is not *None*, call it upon creation of each wrapper "
+      "and keep the result around for as long as the wrapper is alive, "
+      "see :meth:`Context.live_object_tracebacks`.");
+
+  m.def("_to_strs", islpy::to_strs, py::arg("objs"),
+      "_to_strs(objs)\n\n"
+      "See :func:`islpy.to_strs`.");
+  m.def("_parse_many", islpy::parse_many,
+      py::arg("cls"), py::arg("strings"), py::arg("ctx"),
+      py::arg("return_errors"), py::arg("nthreads"),
+      "_parse_many(cls, strings, ctx, return_errors, nthreads)\n\n"
+      "See :func:`islpy.parse_many`.");
 
-  py::implicitly_convertible<isl::basic_set, isl::set>();
-  py::implicitly_convertible<isl::basic_map, isl::map>();
-  py::implicitly_convertible<isl::basic_set, isl::union_set>();
-  py::implicitly_convertible<isl::basic_map, isl::union_map>();
-  py::implicitly_convertible<isl::set, isl::union_set>();
-  py::implicitly_convertible<isl::map, isl::union_map>();
-  py::implicitly_convertible<isl::space, isl::local_space>();
-  py::implicitly_convertible<isl::aff, isl::pw_aff>();
+  islpy::implicitly_upcastable<isl::basic_set, isl::set>();
+  islpy::implicitly_upcastable<isl::basic_map, isl::map>();
+  islpy::implicitly_upcastable<isl::basic_set, isl::union_set>();
+  islpy::implicitly_upcastable<isl::basic_map, isl::union_map>();
+  islpy::implicitly_upcastable<isl::set, isl::union_set>();
+  islpy::implicitly_upcastable<isl::map, isl::union_map>();
+  islpy::implicitly_upcastable<isl::space, isl::local_space>();
+  islpy::implicitly_upcastable<isl::aff, isl::pw_aff>();
 }
@@ -27,8 +27,15 @@
 #include <barvinok/isl.h>
 #endif
 
+#ifdef ISLPY_HAVE_CTX_OPERATIONS
+extern "C" unsigned long islpy_ctx_get_operations(isl_ctx *ctx);
+#endif
+
 #include <iostream>
 #include <stdexcept>
+#include <chrono>
+#include <string>
+#include <vector>
 #include <pybind11/pybind11.h>
 
 
@@ -49,28 +56,329 @@ namespace isl
 
   struct ctx;
 
-  typedef std::unordered_map<isl_ctx *, unsigned> ctx_use_map_t;
+  // {{{ context use and live object accounting
+
+  struct ctx_use_info
+  {
+    // number of wrappers (including Context instances) referring to the
+    // context, which is freed once this drops to zero
+    unsigned use_count = 0;
+
+    unsigned long live_objects = 0;
+    unsigned long peak_live_objects = 0;
+
+    // keyed by class name, but these are string literals and may therefore
+    // occur more than once (with different addresses)
+    std::unordered_map<const char *, long> live_objects_by_class;
+
+    // only populated while creation_traceback_factory is set
+    std::unordered_map<const void *, std::pair<const char *, PyObject *> >
+      creation_tracebacks;
+
+    // Spaces built from names, keyed by the names, see
+    // islpy::space_create_from_names. The cached spaces are not wrapped and
+    // not counted in use_count, they are freed along with the context.
+    bool space_cache_enabled = false;
+    std::unordered_map<std::string, isl_space *> space_cache;
+
+    void clear_space_cache()
+    {
+      for (auto const &key_and_space: space_cache)
+        isl_space_free(key_and_space.second);
+      space_cache.clear();
+    }
+
+    // Dimension names of spaces and dictionaries derived from them, keyed
+    // by the dimension names, see islpy::space_get_dim_index. Entries hold
+    // no reference to the spaces they describe: a space that is referenced
+    // more than once is copied by isl before being modified in place.
+    struct space_dim_index
+    {
+      // tuples of names (or None) for isl_dim_param, isl_dim_in, isl_dim_out
+      PyObject *names[3] = {nullptr, nullptr, nullptr};
+
+      // dicts from names to (dim_type, index), built on first use, see
+      // islpy::space_get_var_dict
+      PyObject *var_dicts[5] = {nullptr, nullptr, nullptr, nullptr, nullptr};
+
+      // zero, then one variable per parameter and set dimension, built on
+      // first use, see islpy::space_get_var_pw_affs. They live on
+      // var_pw_aff_space, a private copy of the last space they were
+      // requested for.
+      isl_space *var_pw_aff_space = nullptr;
+      std::vector<isl_pw_aff *> var_pw_affs;
+
+      void clear_var_pw_affs()
+      {
+        isl_space_free(var_pw_aff_space);
+        var_pw_aff_space = nullptr;
+        for (isl_pw_aff *pwaff: var_pw_affs)
+          isl_pw_aff_free(pwaff);
+        var_pw_affs.clear();
+      }
+    };
+
+    std::unordered_map<std::string, space_dim_index> dim_index_cache;
+
+    void clear_dim_index_cache()
+    {
+      for (auto &key_and_index: dim_index_cache)
+      {
+        for (PyObject *names: key_and_index.second.names)
+          Py_XDECREF(names);
+        for (PyObject *var_dict: key_and_index.second.var_dicts)
+          Py_XDECREF(var_dict);
+        key_and_index.second.clear_var_pw_affs();
+      }
+      dim_index_cache.clear();
+    }
+
+    // Idle string printers, emptied with isl_printer_flush and reused to
+    // avoid allocating a printer (and growing its buffer) for each str(),
+    // see get_str_printer.
+    std::vector<isl_printer *> str_printers;
+
+    void clear_str_printers()
+    {
+      for (isl_printer *p: str_printers)
+        isl_printer_free(p);
+      str_printers.clear();
+    }
+  };
+
+  typedef std::unordered_map<isl_ctx *, ctx_use_info> ctx_use_map_t;
   extern ctx_use_map_t ctx_use_map;
 
-  inline void ref_ctx(isl_ctx *data)
+  // If not null, called to obtain a Python traceback for each new wrapper.
+  extern PyObject *creation_traceback_factory;
+
+  inline ctx_use_info &ref_ctx(isl_ctx *data)
   {
-    ctx_use_map_t::iterator it(ctx_use_map.find(data));
-    if (it == ctx_use_map.end())
-      ctx_use_map[data] = 1;
-    else
-      (it->second)++;
+    ctx_use_info &info = ctx_use_map[data];
+    info.use_count++;
+    return info;
   }
 
   inline void unref_ctx(isl_ctx *ctx)
   {
-    ctx_use_map[ctx] -= 1;
-    if (ctx_use_map[ctx] == 0)
+    ctx_use_map_t::iterator it(ctx_use_map.find(ctx));
+    it->second.use_count -= 1;
+    if (it->second.use_count == 0)
+    {
+      it->second.clear_space_cache();
+      it->second.clear_dim_index_cache();
+      it->second.clear_str_printers();
+      ctx_use_map.erase(it);
       isl_ctx_free(ctx);
+    }
   }
 
+  inline void ref_ctx_for_object(isl_ctx *ctx, const char *cls, const void *obj)
+  {
+    ctx_use_info &info = ref_ctx(ctx);
+    info.live_objects_by_class[cls]++;
+    if (++info.live_objects > info.peak_live_objects)
+      info.peak_live_objects = info.live_objects;
+
+    if (creation_traceback_factory)
+    {
+      PyObject *tb = PyObject_CallObject(creation_traceback_factory, nullptr);
+      if (tb)
+        info.creation_tracebacks[obj] = std::make_pair(cls, tb);
+      else
+        PyErr_WriteUnraisable(creation_traceback_factory);
+    }
+  }
+
+  inline void unref_ctx_for_object(isl_ctx *ctx, const char *cls, const void *obj)
+  {
+    ctx_use_info &info = ctx_use_map[ctx];
+    info.live_objects_by_class[cls]--;
+    info.live_objects--;
+
+    if (!info.creation_tracebacks.empty())
+    {
+      auto it = info.creation_tracebacks.find(obj);
+      if (it != info.creation_tracebacks.end())
+      {
+        PyObject *tb = it->second.second;
+        info.creation_tracebacks.erase(it);
+        Py_DECREF(tb);
+      }
+    }
+
+    unref_ctx(ctx);
+  }
+
+  // }}}
+
+  // {{{ call profiling
+
+  inline unsigned long get_ctx_operations(isl_ctx *ctx)
+  {
+#ifdef ISLPY_HAVE_CTX_OPERATIONS
+    return islpy_ctx_get_operations(ctx);
+#else
+    return 0;
+#endif
+  }
+
+  class call_profiler;
+
+  // Installed by islpy.profile() through _isl._set_call_profiler.
+  struct call_profiler_state
+  {
+    isl_ctx *ctx;
+    PyObject *py_ctx;
+    PyObject *callback;
+    call_profiler *innermost;
+  };
+
+  extern call_profiler_state profiler_state;
+
+  // Each generated wrapper creates one of these just before calling into
+  // isl and calls done() right afterwards. If a profiler is installed,
+  // the wall time and the operations counted on the profiled context
+  // (excluding those of nested calls made from callbacks) are reported to
+  // the Python callback as (c_name, operations, seconds).
+  class call_profiler
+  {
+    private:
+      typedef std::chrono::steady_clock clock;
+
+      const char *m_name;
+      bool m_active;
+      call_profiler *m_parent;
+      clock::time_point m_start;
+      unsigned long m_start_ops;
+      double m_child_time;
+      unsigned long m_child_ops;
+
+    public:
+      call_profiler(const char *name)
+        : m_name(name), m_active(profiler_state.callback != nullptr)
+      {
+        if (m_active)
+        {
+          m_parent = profiler_state.innermost;
+          profiler_state.innermost = this;
+          m_child_time = 0;
+          m_child_ops = 0;
+          m_start_ops = get_ctx_operations(profiler_state.ctx);
+          m_start = clock::now();
+        }
+      }
+
+      ~call_profiler()
+      {
+        if (m_active && profiler_state.innermost == this)
+          profiler_state.innermost = m_parent;
+      }
+
+      void done()
+      {
+        if (!m_active)
+          return;
+        m_active = false;
+
+        double time = std::chrono::duration<double>(
+            clock::now() - m_start).count();
+
+        if (profiler_state.innermost != this)
+          // profiler was replaced while the call was running
+          return;
+
+        unsigned long ops = get_ctx_operations(profiler_state.ctx) - m_start_ops;
+
+        profiler_state.innermost = m_parent;
+        if (m_parent)
+        {
+          m_parent->m_child_time += time;
+          m_parent->m_child_ops += ops;
+        }
+
+        PyObject *result = PyObject_CallFunction(profiler_state.callback,
+            "skd", m_name, ops - m_child_ops, time - m_child_time);
+        if (result)
+          Py_DECREF(result);
+        else
+          PyErr_WriteUnraisable(profiler_state.callback);
+      }
+  };
+
+  // }}}
+
+  // {{{ printing
+
+  inline isl_printer *get_str_printer(isl_ctx *ctx)
+  {
+    std::vector<isl_printer *> &idle = ctx_use_map[ctx].str_printers;
+    if (idle.empty())
+      return isl_printer_to_str(ctx);
+
+    isl_printer *result = idle.back();
+    idle.pop_back();
+    return result;
+  }
+
+  inline void put_str_printer(isl_ctx *ctx, isl_printer *p)
+  {
+    std::vector<isl_printer *> &idle = ctx_use_map[ctx].str_printers;
+    if (idle.size() < 4)
+      idle.push_back(isl_printer_flush(p));
+    else
+      isl_printer_free(p);
+  }
+
+  // The printed form of an object is kept on its wrapper until the wrapper
+  // is given different data, see WRAP_CLASS_CONTENT.
+  template <class T, class IslT>
+  py::str cached_str(T &self, const char *c_name,
+      isl_printer *(*print)(isl_printer *, IslT *))
+  {
+    if (!self.is_valid())
+      throw error(std::string("passed invalid arg to ") + c_name);
+
+    if (!self.m_str_cache)
+    {
+      isl_ctx *ctx = self.get_ctx();
+      isl_printer *p = print(get_str_printer(ctx), self.m_data);
+      char *str = p ? isl_printer_get_str(p) : nullptr;
+      if (!str)
+      {
+        isl_printer_free(p);
+        throw error(std::string("call to ") + c_name + " failed");
+      }
+      put_str_printer(ctx, p);
+
+      PyObject *result = PyUnicode_FromString(str);
+      free(str);
+      if (!result)
+        throw py::error_already_set();
+      self.m_str_cache = result;
+    }
+
+    return py::reinterpret_borrow<py::str>(self.m_str_cache);
+  }
+
+  // Keyed by the Python type, see CACHED_STR and islpy::to_strs.
+  extern std::unordered_map<PyObject *, py::str (*)(py::handle)>
+    str_converters;
+
+  // }}}
+
 #define WRAP_CLASS(name) \
   struct name { WRAP_CLASS_CONTENT(name) }
 
+#define WRAP_PART3_CLASS(name) \
+  WRAP_CLASS(name); \
+  template <> \
+  struct exposure_traits<name> \
+  { \
+    static void ensure_exposed() \
+    { ensure_part3_exposed(); } \
+  }
+
 #define MAKE_CAST_CTOR(name, from_type, cast_func) \
       name(from_type &data) \
       : m_data(nullptr) \
@@ -82,13 +390,21 @@ namespace isl
         if (!m_data) \
           throw error(#cast_func " failed"); \
         \
-        ref_ctx(get_ctx()); \
+        ref_ctx_for_object(get_ctx(), #name, this); \
       }
 
 #define WRAP_CLASS_CONTENT(name) \
     public: \
       isl_##name        *m_data; \
       \
+      /* Set on instances that exist only to be passed to a single call, */ \
+      /* such as results of implicit conversions. Their data may be */ \
+      /* handed to isl for __isl_take arguments without a copy. */ \
+      bool m_is_temporary = false; \
+      \
+      /* str of m_data, see cached_str */ \
+      PyObject *m_str_cache = nullptr; \
+      \
       name(isl_##name *data) \
       : m_data(nullptr) \
       /* passing nullptr is allowed to create a (temporarily invalid) */ \
@@ -104,13 +420,22 @@ namespace isl
       \
       void invalidate() \
       { \
+        Py_CLEAR(m_str_cache); \
         if (m_data) \
         { \
-          unref_ctx(get_ctx()); \
+          unref_ctx_for_object(get_ctx(), #name, this); \
           m_data = nullptr; \
         } \
       } \
       \
+      /* for passing to isl as __isl_take, once no longer needed here */ \
+      isl_##name *take_data() \
+      { \
+        isl_##name *result = m_data; \
+        invalidate(); \
+        return result; \
+      } \
+      \
       bool is_valid() const \
       { \
         return (bool) m_data; \
@@ -123,11 +448,14 @@ namespace isl
       \
       void free_instance() \
       { \
+        Py_CLEAR(m_str_cache); \
         if (m_data) \
         { \
-          unref_ctx(get_ctx()); \
+          /* the object references the context, free it first */ \
+          isl_ctx *ctx = get_ctx(); \
           isl_##name##_free(m_data); \
           m_data = nullptr; \
+          unref_ctx_for_object(ctx, #name, this); \
         } \
       } \
       \
@@ -137,7 +465,7 @@ namespace isl
         if (data) \
         { \
           m_data = data; \
-          ref_ctx(get_ctx()); \
+          ref_ctx_for_object(get_ctx(), #name, this); \
         } \
       } \
 
@@ -175,6 +503,38 @@ namespace isl
       }
   };
 
+  // {{{ lazy exposure
+
+  // Part 3 of the wrapper (polynomials, schedules, flow, AST) is only
+  // registered with Python once one of its classes is first needed, see
+  // expose_part3() in wrap_isl.cpp.
+  extern bool part3_exposed;
+  void expose_part3();
+
+  inline void ensure_part3_exposed()
+  {
+    if (!part3_exposed)
+      expose_part3();
+  }
+
+  template <class T>
+  struct exposure_traits
+  {
+    static void ensure_exposed()
+    { }
+  };
+
+  // Shadows the version from wrap_helpers.hpp for the generated code, so that
+  // a class is exposed before the first instance of it is returned.
+  template <class T>
+  inline py::object handle_from_new_ptr(T *ptr)
+  {
+    exposure_traits<T>::ensure_exposed();
+    return ::handle_from_new_ptr(ptr);
+  }
+
+  // }}}
+
   // matches order in gen_wrap.py
 
   // {{{ part 1
@@ -274,28 +634,28 @@ namespace isl
 
   // {{{ part 3
 
-  WRAP_CLASS(qpolynomial);
-  WRAP_CLASS(pw_qpolynomial);
-  WRAP_CLASS(qpolynomial_fold);
-  WRAP_CLASS(pw_qpolynomial_fold);
-  WRAP_CLASS(union_pw_qpolynomial);
-  WRAP_CLASS(union_pw_qpolynomial_fold);
-  WRAP_CLASS(term);
-
-  WRAP_CLASS(schedule);
-  WRAP_CLASS(schedule_constraints);
-  WRAP_CLASS(schedule_node);
-
-  WRAP_CLASS(access_info);
-  WRAP_CLASS(flow);
-  WRAP_CLASS(restriction);
-  WRAP_CLASS(union_access_info);
-  WRAP_CLASS(union_flow);
-
-  WRAP_CLASS(ast_expr);
-  WRAP_CLASS(ast_node);
-  WRAP_CLASS(ast_print_options);
-  WRAP_CLASS(ast_build);
+  WRAP_PART3_CLASS(qpolynomial);
+  WRAP_PART3_CLASS(pw_qpolynomial);
+  WRAP_PART3_CLASS(qpolynomial_fold);
+  WRAP_PART3_CLASS(pw_qpolynomial_fold);
+  WRAP_PART3_CLASS(union_pw_qpolynomial);
+  WRAP_PART3_CLASS(union_pw_qpolynomial_fold);
+  WRAP_PART3_CLASS(term);
+
+  WRAP_PART3_CLASS(schedule);
+  WRAP_PART3_CLASS(schedule_constraints);
+  WRAP_PART3_CLASS(schedule_node);
+
+  WRAP_PART3_CLASS(access_info);
+  WRAP_PART3_CLASS(flow);
+  WRAP_PART3_CLASS(restriction);
+  WRAP_PART3_CLASS(union_access_info);
+  WRAP_PART3_CLASS(union_flow);
+
+  WRAP_PART3_CLASS(ast_expr);
+  WRAP_PART3_CLASS(ast_node);
+  WRAP_PART3_CLASS(ast_print_options);
+  WRAP_PART3_CLASS(ast_build);
 
   // }}}
 
@@ -309,12 +669,108 @@ namespace isl
   {
     Py_DECREF((PyObject *) user);
   }
+
+  // {{{ self upcasts
+
+  // Adapts a method of Special so that it can be exposed on Basic (e.g. a
+  // method of set on basic_set), with self cast using Special's cast
+  // constructor. See UPCASTS in gen_wrap.py.
+  template <class Special, class Basic, class Result, class SelfArg,
+           class... Args>
+  inline auto make_upcast_method(Result (*special_method)(SelfArg, Args...))
+  {
+    return [special_method](Basic &self, Args... args) -> Result
+    {
+      if (!self.is_valid())
+        throw isl::error("passed invalid self to upcast method");
+
+      Special upcast_self(self);
+      upcast_self.m_is_temporary = true;
+      return special_method(upcast_self, std::forward<Args>(args)...);
+    };
+  }
+
+  // }}}
+
+  // {{{ batch parsing
+
+  // How to read one class from a string and wrap the result, see
+  // islpy::parse_many. Registered (keyed by the Python type) by the part of
+  // the wrapper exposing the class, see REGISTER_PARSER.
+  struct parser
+  {
+    const char *c_name;
+    void *(*read_from_str)(isl_ctx *ctx, const char *str);
+    void (*free)(void *obj);
+    py::object (*wrap)(void *obj);
+  };
+
+  extern std::unordered_map<PyObject *, parser> parsers;
+
+  // Parses the file at path (anything accepted by os.fspath) with
+  // read_from_str on a memory mapping of it, if that is NUL-terminated,
+  // and with read_from_file on a buffered FILE otherwise. See
+  // EXPOSE_READ_FROM_PATH.
+  void *read_from_path(isl_ctx *ctx, py::object path, const char *c_name,
+      void *(*read_from_str)(isl_ctx *ctx, const char *str),
+      void *(*read_from_file)(isl_ctx *ctx, FILE *file));
+
+  // }}}
 }
 
 
 
 
 
+#define REGISTER_PARSER(name) \
+  isl::parsers[py::type::of<isl::name>().ptr()] = isl::parser { \
+    "isl_"#name"_read_from_str", \
+    [](isl_ctx *ctx, const char *str) -> void * \
+    { return isl_##name##_read_from_str(ctx, str); }, \
+    [](void *obj) { isl_##name##_free((isl_##name *) obj); }, \
+    [](void *obj) \
+    { return isl::handle_from_new_ptr(new isl::name((isl_##name *) obj)); } \
+  }
+
+#define EXPOSE_READ_FROM_PATH(name, py_name) \
+  wrap_##name.def_static("read_from_path", \
+      [](isl::ctx &ctx, py::object path) \
+      { \
+        void *result = isl::read_from_path(ctx.m_data, path, \
+            "isl_"#name"_read_from_file", \
+            [](isl_ctx *ctx, const char *str) -> void * \
+            { return isl_##name##_read_from_str(ctx, str); }, \
+            [](isl_ctx *ctx, FILE *file) -> void * \
+            { return isl_##name##_read_from_file(ctx, file); }); \
+        return isl::handle_from_new_ptr( \
+            new isl::name((isl_##name *) result)); \
+      }, \
+      py::arg("ctx"), py::arg("path"), \
+      "read_from_path(ctx, path)\n\n" \
+      "Read an object from the file at *path*, which is not read into " \
+      "memory as a whole (but memory-mapped or streamed). Data appended " \
+      "to the file while it is read may or may not be seen. The file " \
+      "must not be truncated while it is read, which may crash the " \
+      "interpreter.\n\n" \
+      ":param ctx: :class:`Context`\n" \
+      ":param path: :class:`str`, :class:`bytes` or path-like object\n" \
+      ":return: :class:`" #py_name "`\n\n" \
+      ".. versionadded:: 2021.1")
+
+#define CACHED_STR(name) \
+  isl::str_converters[py::type::of<isl::name>().ptr()] = \
+    [](py::handle obj) \
+    { \
+      return isl::cached_str(obj.cast<isl::name &>(), \
+          "isl_printer_print_"#name, isl_printer_print_##name); \
+    }; \
+  wrap_##name.def("__str__", \
+      [](isl::name &self) \
+      { \
+        return isl::cached_str(self, \
+            "isl_printer_print_"#name, isl_printer_print_##name); \
+      })
+
 #define MAKE_WRAP(name, py_name) \
   py::class_<isl::name> wrap_##name(m, #py_name, py::dynamic_attr()); \
   wrap_##name.def("_is_valid", &isl::name::is_valid); \
@@ -1,4 +1,18 @@
 #include "wrap_isl.hpp"
+#include <cstdio>
+#include <cstring>
+#include <memory>
+#include <string>
+#include <unordered_set>
+#include <vector>
+
+#ifdef _WIN32
+#include <io.h>
+#define dup _dup
+#define fdopen _fdopen
+#else
+#include <unistd.h>
+#endif
 
 namespace isl
 {
@@ -18,8 +32,1088 @@ namespace islpy
   {
     return self != other;
   }
+
+  unsigned long ctx_get_operations(isl::ctx &self)
+  {
+#ifdef ISLPY_HAVE_CTX_OPERATIONS
+    return isl::get_ctx_operations(self.m_data);
+#else
+    throw isl::error("operation counts are only available if islpy "
+        "is built with its shipped copy of isl");
+#endif
+  }
+
+  isl::ctx_use_info &ctx_get_use_info(isl::ctx &self)
+  {
+    // The Context instance itself holds a reference, so this exists.
+    return isl::ctx_use_map.find(self.m_data)->second;
+  }
+
+  py::dict ctx_get_live_object_counts(isl::ctx &self)
+  {
+    py::dict result;
+    for (auto const &cls_and_count: ctx_get_use_info(self).live_objects_by_class)
+    {
+      if (cls_and_count.second == 0)
+        continue;
+
+      py::str cls(cls_and_count.first);
+      long count = cls_and_count.second;
+      if (result.contains(cls))
+        count += result[cls].cast<long>();
+      if (count)
+        result[cls] = count;
+      else if (result.contains(cls))
+        PyDict_DelItem(result.ptr(), cls.ptr());
+    }
+    return result;
+  }
+
+  py::list ctx_get_creation_tracebacks(isl::ctx &self)
+  {
+    py::list result;
+    for (auto const &obj_and_tb: ctx_get_use_info(self).creation_tracebacks)
+      result.append(py::make_tuple(
+            py::str(obj_and_tb.second.first),
+            py::reinterpret_borrow<py::object>(obj_and_tb.second.second)));
+    return result;
+  }
+
+  // {{{ space construction from names
+
+  // Sets all dimension names (str) or Ids of one dim_type of *space*, which
+  // is owned by this function until it returns.
+  isl_space *set_space_dim_names(isl_space *space, isl_dim_type dt,
+      py::list const &names)
+  {
+    for (size_t i = 0; space && i < names.size(); ++i)
+    {
+      py::handle name = names[i];
+      if (py::isinstance<py::str>(name))
+        space = isl_space_set_dim_name(space, dt, (unsigned) i,
+            name.cast<std::string>().c_str());
+      else
+      {
+        isl::id *id;
+        try
+        { id = &name.cast<isl::id &>(); }
+        catch (py::cast_error &)
+        {
+          isl_space_free(space);
+          throw py::type_error("dimension names must be str or Id");
+        }
+        if (!id->is_valid())
+        {
+          isl_space_free(space);
+          throw isl::error("passed invalid Id as dimension name");
+        }
+        space = isl_space_set_dim_id(space, dt, (unsigned) i,
+            isl_id_copy(id->m_data));
+      }
+    }
+    return space;
+  }
+
+  // Returns false if the names cannot be part of a cache key.
+  bool append_space_cache_key(std::string &key, py::list const &names)
+  {
+    key += std::to_string(names.size());
+    key += ':';
+    for (py::handle name: names)
+    {
+      if (!py::isinstance<py::str>(name))
+        return false;
+      key += name.cast<std::string>();
+      key += '\0';
+    }
+    return true;
+  }
+
+  // The cache is emptied once it holds this many spaces.
+  const size_t space_cache_max_size = 1024;
+
+  py::object space_create_from_names(isl::ctx &ctx, py::iterable py_params,
+      py::object py_set, py::object py_in, py::object py_out)
+  {
+    bool is_set = !py_set.is_none();
+    py::list params(py_params);
+    py::list set_names, in_names, out_names;
+    if (is_set)
+      set_names = py::list(py_set);
+    else
+    {
+      in_names = py::list(py_in);
+      out_names = py::list(py_out);
+    }
+
+    isl::ctx_use_info &info = ctx_get_use_info(ctx);
+
+    std::string key;
+    bool use_cache = info.space_cache_enabled;
+    if (use_cache)
+    {
+      key = is_set ? "set:" : "map:";
+      use_cache = append_space_cache_key(key, params)
+        && append_space_cache_key(key, set_names)
+        && append_space_cache_key(key, in_names)
+        && append_space_cache_key(key, out_names);
+    }
+
+    if (use_cache)
+    {
+      auto it = info.space_cache.find(key);
+      if (it != info.space_cache.end())
+        return isl::handle_from_new_ptr(
+            new isl::space(isl_space_copy(it->second)));
+    }
+
+    isl::call_profiler profiler("isl_space_create_from_names");
+    isl_space *result;
+    if (is_set)
+    {
+      result = isl_space_set_alloc(ctx.m_data,
+          (unsigned) params.size(), (unsigned) set_names.size());
+      result = set_space_dim_names(result, isl_dim_set, set_names);
+    }
+    else
+    {
+      result = isl_space_alloc(ctx.m_data, (unsigned) params.size(),
+          (unsigned) in_names.size(), (unsigned) out_names.size());
+      result = set_space_dim_names(result, isl_dim_in, in_names);
+      result = set_space_dim_names(result, isl_dim_out, out_names);
+    }
+    result = set_space_dim_names(result, isl_dim_param, params);
+    profiler.done();
+
+    if (!result)
+      throw isl::error("call to isl_space_create_from_names failed");
+
+    if (use_cache)
+    {
+      if (info.space_cache.size() >= space_cache_max_size)
+        info.clear_space_cache();
+      info.space_cache[key] = isl_space_copy(result);
+    }
+
+    return isl::handle_from_new_ptr(new isl::space(result));
+  }
+
+  void ctx_enable_space_cache(isl::ctx &self, bool enable)
+  {
+    isl::ctx_use_info &info = ctx_get_use_info(self);
+    info.space_cache_enabled = enable;
+    if (!enable)
+      info.clear_space_cache();
+  }
+
+  // }}}
+
+  // {{{ dimension name index
+
+  // The cache is emptied once it holds this many entries.
+  const size_t dim_index_cache_max_size = 1024;
+
+  const isl_dim_type indexed_dim_types[3] = {
+    isl_dim_param, isl_dim_in, isl_dim_out};
+
+  // The dim_type members used in the (dim_type, index) tuples, in the order
+  // of indexed_dim_types. (isl_dim_set is the same as isl_dim_out.)
+  const char *indexed_dim_type_names[3] = {"param", "in_", "set"};
+
+  int indexed_dim_type_position(isl_dim_type dt)
+  {
+    switch (dt)
+    {
+      case isl_dim_param: return 0;
+      case isl_dim_in: return 1;
+      case isl_dim_out: return 2;
+      default: return -1;
+    }
+  }
+
+  py::object dim_type_object(int position)
+  {
+    return py::type::of<isl_dim_type>().attr(
+        indexed_dim_type_names[position]);
+  }
+
+  py::tuple get_space_dim_names(isl_space *space, isl_dim_type dt)
+  {
+    isl_size n = isl_space_dim(space, dt);
+    if (n < 0)
+      throw isl::error("call to isl_space_dim failed");
+
+    py::tuple result(n);
+    for (isl_size i = 0; i < n; ++i)
+    {
+      const char *name = isl_space_get_dim_name(space, dt, (unsigned) i);
+      if (name)
+        result[i] = py::str(name);
+      else
+        result[i] = py::none();
+    }
+    return result;
+  }
+
+  // Returns the cached index of *self*, building it in one pass if needed.
+  // Spaces with the same dimension names share the index.
+  isl::ctx_use_info::space_dim_index &space_get_dim_index(isl::space const &self)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid Space");
+
+    isl::ctx_use_info &info = isl::ctx_use_map.find(
+        isl_space_get_ctx(self.m_data))->second;
+
+    // the names, each preceded by its length, or '-' if it has none
+    std::string key;
+    for (isl_dim_type dt: indexed_dim_types)
+    {
+      isl_size n = isl_space_dim(self.m_data, dt);
+      if (n < 0)
+        throw isl::error("call to isl_space_dim failed");
+
+      key += std::to_string(n);
+      key += ';';
+      for (isl_size i = 0; i < n; ++i)
+      {
+        const char *name = isl_space_get_dim_name(
+            self.m_data, dt, (unsigned) i);
+        if (name)
+        {
+          key += std::to_string(strlen(name));
+          key += ':';
+          key += name;
+        }
+        else
+          key += '-';
+      }
+    }
+
+    auto it = info.dim_index_cache.find(key);
+    if (it != info.dim_index_cache.end())
+      return it->second;
+
+    if (info.dim_index_cache.size() >= dim_index_cache_max_size)
+      info.clear_dim_index_cache();
+
+    py::tuple names[3];
+    for (int k = 0; k < 3; ++k)
+      names[k] = get_space_dim_names(self.m_data, indexed_dim_types[k]);
+
+    isl::ctx_use_info::space_dim_index &index = info.dim_index_cache[key];
+    for (int k = 0; k < 3; ++k)
+      index.names[k] = names[k].release().ptr();
+    return index;
+  }
+
+  void add_var_dict_entries(py::dict &result, py::tuple const &names,
+      py::object const &dt_object)
+  {
+    for (size_t i = 0; i < names.size(); ++i)
+    {
+      py::handle name = names[i];
+      if (name.is_none())
+        continue;
+      if (result.contains(name))
+        throw std::runtime_error("non-unique var name '"
+            + name.cast<std::string>() + "' encountered");
+      result[name] = py::make_tuple(dt_object, i);
+    }
+  }
+
+  // Returns a new dict each time, copied from the one cached in the index.
+  py::dict space_get_var_dict(isl::space const &self, py::object dimtype,
+      bool ignore_out)
+  {
+    isl::ctx_use_info::space_dim_index &index = space_get_dim_index(self);
+
+    // positions in indexed_dim_types, in the order in which names are
+    // checked for uniqueness
+    std::vector<int> positions;
+    int slot;
+    if (dimtype.is_none())
+    {
+      positions = {1, 0};
+      if (!ignore_out)
+        positions.push_back(2);
+      slot = ignore_out ? 1 : 0;
+    }
+    else
+    {
+      isl_dim_type dt = dimtype.cast<isl_dim_type>();
+      int position = indexed_dim_type_position(dt);
+      if (position < 0)
+      {
+        // not cached, e.g. isl_dim_div, which a space does not have
+        py::dict result;
+        add_var_dict_entries(result,
+            get_space_dim_names(self.m_data, dt), dimtype);
+        return result;
+      }
+      positions = {position};
+      slot = 2 + position;
+    }
+
+    if (!index.var_dicts[slot])
+    {
+      py::dict var_dict;
+      for (int position: positions)
+        add_var_dict_entries(var_dict,
+            py::reinterpret_borrow<py::tuple>(index.names[position]),
+            dim_type_object(position));
+      index.var_dicts[slot] = var_dict.release().ptr();
+    }
+
+    PyObject *result = PyDict_Copy(index.var_dicts[slot]);
+    if (!result)
+      throw py::error_already_set();
+    return py::reinterpret_steal<py::dict>(result);
+  }
+
+  // Returns None for dim types not covered by the index.
+  py::object space_get_dim_names(isl::space const &self, isl_dim_type dt)
+  {
+    int position = indexed_dim_type_position(dt);
+    if (position < 0)
+      return py::none();
+    return py::list(py::reinterpret_borrow<py::tuple>(
+          space_get_dim_index(self).names[position]));
+  }
+
+  // Whether *space1* and *space2* are equal, including the Ids of their
+  // dimensions.
+  bool is_same_space(isl_space *space1, isl_space *space2)
+  {
+    isl_bool equal = isl_space_is_equal(space1, space2);
+    if (equal < 0)
+      throw isl::error("call to isl_space_is_equal failed");
+    if (!equal)
+      return false;
+
+    for (isl_dim_type dt: indexed_dim_types)
+    {
+      isl_size n = isl_space_dim(space1, dt);
+      if (n < 0)
+        throw isl::error("call to isl_space_dim failed");
+
+      for (isl_size i = 0; i < n; ++i)
+      {
+        isl_bool has_id1 = isl_space_has_dim_id(space1, dt, (unsigned) i);
+        isl_bool has_id2 = isl_space_has_dim_id(space2, dt, (unsigned) i);
+        if (has_id1 < 0 || has_id2 < 0)
+          throw isl::error("call to isl_space_has_dim_id failed");
+        if (has_id1 != has_id2)
+          return false;
+        if (!has_id1)
+          continue;
+
+        // Ids are unique per name and user pointer
+        isl_id *id1 = isl_space_get_dim_id(space1, dt, (unsigned) i);
+        isl_id *id2 = isl_space_get_dim_id(space2, dt, (unsigned) i);
+        isl_id_free(id1);
+        isl_id_free(id2);
+        if (id1 != id2)
+          return false;
+      }
+    }
+    return true;
+  }
+
+  // Returns a space equal to *space* that shares no data with it, so that
+  // keeping it does not make isl copy *space* before modifying it in place.
+  isl_space *duplicate_space(isl_space *space)
+  {
+    // isl has no public isl_space_dup. Adding a parameter makes isl
+    // duplicate the space (and any nested spaces), dropping it restores the
+    // original dimensions.
+    isl_size nparam = isl_space_dim(space, isl_dim_param);
+    if (nparam < 0)
+      throw isl::error("call to isl_space_dim failed");
+
+    isl_space *result = isl_space_add_dims(
+        isl_space_copy(space), isl_dim_param, 1);
+    result = isl_space_drop_dims(result, isl_dim_param, nparam, 1);
+    if (!result)
+      throw isl::error("failed to duplicate space");
+    return result;
+  }
+
+  // Returns a PwAff for each of *keys*, which are parameter or set dimension
+  // names, or 0 for the zero expression. The underlying expressions are
+  // cached in the index of *self*, which must be a set (or parameter) space.
+  py::list space_get_var_pw_affs(isl::space const &self, py::iterable keys)
+  {
+    isl::ctx_use_info::space_dim_index &index = space_get_dim_index(self);
+    if (isl_space_is_map(self.m_data))
+      throw isl::error("expecting (parameter) set space");
+
+    isl_size nparam = isl_space_dim(self.m_data, isl_dim_param);
+    isl_size nset = isl_space_dim(self.m_data, isl_dim_set);
+    if (nparam < 0 || nset < 0)
+      throw isl::error("call to isl_space_dim failed");
+
+    if (index.var_pw_aff_space
+        && !is_same_space(index.var_pw_aff_space, self.m_data))
+      index.clear_var_pw_affs();
+    if (!index.var_pw_aff_space)
+    {
+      index.var_pw_aff_space = duplicate_space(self.m_data);
+      index.var_pw_affs.resize(1 + nparam + nset, nullptr);
+    }
+
+    py::dict var_dict = space_get_var_dict(self, py::none(), false);
+
+    py::list result;
+    for (py::handle key: keys)
+    {
+      // position in var_pw_affs
+      size_t position;
+      isl_dim_type dt = isl_dim_param;
+      unsigned idx = 0;
+
+      if (py::isinstance<py::int_>(key) && key.cast<long>() == 0)
+        position = 0;
+      else
+      {
+        if (!py::isinstance<py::str>(key) || !var_dict.contains(key))
+          throw py::key_error(py::repr(key).cast<std::string>());
+
+        py::tuple dt_and_idx = var_dict[key];
+        dt = dt_and_idx[0].cast<isl_dim_type>();
+        idx = dt_and_idx[1].cast<unsigned>();
+        position = 1 + idx + (dt == isl_dim_param ? 0 : nparam);
+      }
+
+      isl_pw_aff *&cached = index.var_pw_affs[position];
+      if (!cached)
+      {
+        isl::call_profiler profiler("isl_pw_aff_var_on_domain");
+        isl_local_space *ls = isl_local_space_from_space(
+            isl_space_copy(index.var_pw_aff_space));
+        if (position == 0)
+          cached = isl_pw_aff_from_aff(isl_aff_zero_on_domain(ls));
+        else
+          cached = isl_pw_aff_var_on_domain(ls, dt, idx);
+        profiler.done();
+
+        if (!cached)
+          throw isl::error("call to isl_pw_aff_var_on_domain failed");
+      }
+
+      result.append(isl::handle_from_new_ptr(
+            new isl::pw_aff(isl_pw_aff_copy(cached))));
+    }
+    return result;
+  }
+
+  // {{{ deferred affine expressions
+
+  // A Python integer, which may not fit into a long.
+  struct py_integer
+  {
+    long small = 0;
+    std::string big;  // decimal representation, unless the value is small
+
+    py_integer() { }
+
+    explicit py_integer(py::handle obj)
+    {
+      if (!PyLong_Check(obj.ptr()))
+        throw py::type_error("expected an integer, got "
+            + py::repr(obj).cast<std::string>());
+      int overflow;
+      small = PyLong_AsLongAndOverflow(obj.ptr(), &overflow);
+      if (overflow)
+        big = py::str(obj).cast<std::string>();
+    }
+
+    bool is_positive() const
+    {
+      return big.empty() ? small > 0 : big[0] != '-';
+    }
+
+    isl_val *to_val(isl_ctx *ctx) const
+    {
+      if (big.empty())
+        return isl_val_int_from_si(ctx, small);
+      return isl_val_read_from_str(ctx, big.c_str());
+    }
+  };
+
+  // An expression as encoded by DeferredAff._encode, i.e.
+  // (constant, [(name or (numerator, denominator), coefficient), ...]),
+  // with the names resolved. Checking the whole expression before any isl
+  // object is created means that nothing leaks if it is invalid.
+  struct deferred_aff
+  {
+    struct var_term
+    {
+      isl_dim_type dt;
+      unsigned idx;
+      py_integer coeff;
+    };
+
+    struct floor_term
+    {
+      std::unique_ptr<deferred_aff> numerator;
+      py_integer denominator;
+      py_integer coeff;
+    };
+
+    py_integer constant;
+    std::vector<var_term> var_terms;
+    std::vector<floor_term> floor_terms;
+  };
+
+  std::unique_ptr<deferred_aff> parse_deferred_aff(py::handle encoding,
+      py::dict const &var_dict)
+  {
+    py::tuple const_and_terms = py::cast<py::tuple>(encoding);
+    std::unique_ptr<deferred_aff> result(new deferred_aff);
+    result->constant = py_integer(const_and_terms[0]);
+
+    for (py::handle py_term: const_and_terms[1])
+    {
+      py::tuple term = py::cast<py::tuple>(py_term);
+      py::handle key = term[0];
+
+      if (py::isinstance<py::str>(key))
+      {
+        if (!var_dict.contains(key))
+          throw py::key_error(py::repr(key).cast<std::string>());
+        py::tuple dt_and_idx = var_dict[key];
+
+        // expressions are on the set space, so set variables are inputs
+        result->var_terms.push_back({
+            dt_and_idx[0].cast<isl_dim_type>() == isl_dim_param
+            ? isl_dim_param : isl_dim_in,
+            dt_and_idx[1].cast<unsigned>(),
+            py_integer(term[1])});
+      }
+      else
+      {
+        py::tuple div = py::cast<py::tuple>(key);
+        deferred_aff::floor_term floor_term;
+        floor_term.numerator = parse_deferred_aff(div[0], var_dict);
+        floor_term.denominator = py_integer(div[1]);
+        if (!floor_term.denominator.is_positive())
+          throw py::value_error("denominator must be positive");
+        floor_term.coeff = py_integer(term[1]);
+        result->floor_terms.push_back(std::move(floor_term));
+      }
+    }
+
+    return result;
+  }
+
+  // Errors propagate as nullptr, as in isl.
+  isl_aff *build_deferred_aff(isl_local_space *ls, deferred_aff const &expr)
+  {
+    isl_ctx *ctx = isl_local_space_get_ctx(ls);
+    isl_aff *result = isl_aff_val_on_domain(isl_local_space_copy(ls),
+        expr.constant.to_val(ctx));
+
+    for (auto const &term: expr.var_terms)
+      result = isl_aff_add_coefficient_val(result, term.dt, term.idx,
+          term.coeff.to_val(ctx));
+
+    for (auto const &term: expr.floor_terms)
+    {
+      isl_aff *div = build_deferred_aff(ls, *term.numerator);
+      div = isl_aff_floor(isl_aff_scale_down_val(div,
+            term.denominator.to_val(ctx)));
+      result = isl_aff_add(result,
+          isl_aff_scale_val(div, term.coeff.to_val(ctx)));
+    }
+
+    return result;
+  }
+
+  py::dict deferred_var_dict(isl::space const &self)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid Space");
+    if (isl_space_is_map(self.m_data))
+      throw isl::error("expecting (parameter) set space");
+    return space_get_var_dict(self, py::none(), false);
+  }
+
+  py::object space_build_deferred_aff(isl::space const &self,
+      py::object encoding)
+  {
+    std::unique_ptr<deferred_aff> expr = parse_deferred_aff(
+        encoding, deferred_var_dict(self));
+
+    isl::call_profiler profiler("isl_space_build_deferred_aff");
+    isl_local_space *ls = isl_local_space_from_space(
+        isl_space_copy(self.m_data));
+    isl_aff *result = build_deferred_aff(ls, *expr);
+    isl_local_space_free(ls);
+    profiler.done();
+
+    if (!result)
+      throw isl::error("call to isl_space_build_deferred_aff failed");
+    return isl::handle_from_new_ptr(new isl::aff(result));
+  }
+
+  py::object space_build_deferred_basic_set(isl::space const &self,
+      py::iterable equalities, py::iterable inequalities)
+  {
+    py::dict var_dict = deferred_var_dict(self);
+    std::vector<std::unique_ptr<deferred_aff> > eqs, ineqs;
+    for (py::handle encoding: equalities)
+      eqs.push_back(parse_deferred_aff(encoding, var_dict));
+    for (py::handle encoding: inequalities)
+      ineqs.push_back(parse_deferred_aff(encoding, var_dict));
+
+    isl::call_profiler profiler("isl_space_build_deferred_basic_set");
+    isl_local_space *ls = isl_local_space_from_space(
+        isl_space_copy(self.m_data));
+    isl_basic_set *result = isl_basic_set_universe(
+        isl_space_copy(self.m_data));
+
+    for (auto const &eq: eqs)
+      result = isl_basic_set_intersect(result,
+          isl_aff_zero_basic_set(build_deferred_aff(ls, *eq)));
+    for (auto const &ineq: ineqs)
+      result = isl_basic_set_intersect(result,
+          isl_aff_ge_basic_set(build_deferred_aff(ls, *ineq),
+            isl_aff_zero_on_domain(isl_local_space_copy(ls))));
+
+    isl_local_space_free(ls);
+    profiler.done();
+
+    if (!result)
+      throw isl::error("call to isl_space_build_deferred_basic_set failed");
+    return isl::handle_from_new_ptr(new isl::basic_set(result));
+  }
+
+  // }}}
+
+  // Ids are not cached, since they hold references to the context.
+  py::dict space_get_id_dict(isl::space const &self, py::object dimtype)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid Space");
+
+    std::vector<std::pair<isl_dim_type, py::object> > types;
+    if (dimtype.is_none())
+      for (int position: {1, 0, 2})
+        types.emplace_back(indexed_dim_types[position],
+            dim_type_object(position));
+    else
+      types.emplace_back(dimtype.cast<isl_dim_type>(), dimtype);
+
+    py::dict result;
+    std::unordered_set<isl_id *> seen;
+    for (auto const &dt_and_object: types)
+    {
+      isl_dim_type dt = dt_and_object.first;
+      isl_size n = isl_space_dim(self.m_data, dt);
+      if (n < 0)
+        throw isl::error("call to isl_space_dim failed");
+
+      for (isl_size i = 0; i < n; ++i)
+      {
+        isl_bool has_id = isl_space_has_dim_id(self.m_data, dt, (unsigned) i);
+        if (has_id < 0)
+          throw isl::error("call to isl_space_has_dim_id failed");
+        if (!has_id)
+          continue;
+
+        isl_id *id = isl_space_get_dim_id(self.m_data, dt, (unsigned) i);
+        if (!seen.insert(id).second)
+        {
+          std::string name(isl_id_get_name(id) ? isl_id_get_name(id) : "");
+          isl_id_free(id);
+          throw std::runtime_error(
+              "non-unique var id '" + name + "' encountered");
+        }
+        result[isl::handle_from_new_ptr(new isl::id(id))] =
+          py::make_tuple(dt_and_object.second, i);
+      }
+    }
+    return result;
+  }
+
+  // }}}
+
+  // {{{ printing to files
+
+  // The FILE of a printer created by printer_to_file, along with the Python
+  // file object it writes to, if any. Attached to the printer as a note
+  // (see file_bridge_key), so that it is closed when the printer is freed.
+  struct file_bridge
+  {
+    FILE *file = nullptr;
+
+    // strong references, null when writing to a file descriptor
+    PyObject *target = nullptr;
+    PyObject *decoder = nullptr;
+
+    // the first failure to write to target, raised by printer_flush
+    bool failed = false;
+    PyObject *error_type = nullptr;
+    PyObject *error_value = nullptr;
+    PyObject *error_traceback = nullptr;
+
+    ~file_bridge()
+    {
+      Py_XDECREF(target);
+      Py_XDECREF(decoder);
+      Py_XDECREF(error_type);
+      Py_XDECREF(error_value);
+      Py_XDECREF(error_traceback);
+    }
+
+    // Called by stdio whenever its buffer is full or flushed, always with
+    // the GIL held, as isl is only called with the GIL held.
+    long write(const char *buf, size_t size)
+    {
+      if (failed)
+        return -1;
+
+      PyObject *chunk = PyBytes_FromStringAndSize(buf, (Py_ssize_t) size);
+      if (chunk && decoder)
+      {
+        PyObject *bytes = chunk;
+        chunk = PyObject_CallMethod(decoder, "decode", "O", bytes);
+        Py_DECREF(bytes);
+      }
+
+      PyObject *result = nullptr;
+      if (chunk)
+      {
+        result = PyObject_CallMethod(target, "write", "O", chunk);
+        Py_DECREF(chunk);
+      }
+
+      if (!result)
+      {
+        failed = true;
+        PyErr_Fetch(&error_type, &error_value, &error_traceback);
+        return -1;
+      }
+
+      Py_DECREF(result);
+      return (long) size;
+    }
+  };
+
+  char file_bridge_key_tag;
+
+  isl_id *file_bridge_key(isl_ctx *ctx)
+  {
+    return isl_id_alloc(ctx, "islpy_file_bridge", &file_bridge_key_tag);
+  }
+
+  void free_file_bridge(void *user)
+  {
+    file_bridge *bridge = (file_bridge *) user;
+    if (bridge->file)
+      fclose(bridge->file);
+    if (bridge->error_type)
+    {
+      PyErr_Restore(bridge->error_type, bridge->error_value,
+          bridge->error_traceback);
+      bridge->error_type = bridge->error_value = bridge->error_traceback
+        = nullptr;
+      PyErr_WriteUnraisable(bridge->target);
+    }
+    delete bridge;
+  }
+
+#if defined(__GLIBC__)
+  ssize_t file_bridge_write(void *cookie, const char *buf, size_t size)
+  {
+    return ((file_bridge *) cookie)->write(buf, size);
+  }
+#elif defined(__APPLE__) || defined(__FreeBSD__) || defined(__NetBSD__) \
+  || defined(__OpenBSD__)
+  int file_bridge_write(void *cookie, const char *buf, int size)
+  {
+    return (int) ((file_bridge *) cookie)->write(buf, size);
+  }
+#endif
+
+  py::object printer_to_file(isl::ctx &ctx, py::object target)
+  {
+    std::unique_ptr<file_bridge> bridge(new file_bridge);
+
+    if (PyLong_Check(target.ptr()))
+    {
+      int fd = dup(target.cast<int>());
+      if (fd < 0 || !(bridge->file = fdopen(fd, "w")))
+      {
+        PyErr_SetFromErrno(PyExc_OSError);
+        throw py::error_already_set();
+      }
+    }
+    else
+    {
+      if (py::isinstance(target,
+            py::module::import("io").attr("TextIOBase")))
+        bridge->decoder = py::module::import("codecs")
+          .attr("getincrementaldecoder")("utf-8")().release().ptr();
+      bridge->target = target.inc_ref().ptr();
+
+#if defined(__GLIBC__)
+      cookie_io_functions_t functions = {
+        nullptr, file_bridge_write, nullptr, nullptr };
+      bridge->file = fopencookie(bridge.get(), "w", functions);
+#elif defined(__APPLE__) || defined(__FreeBSD__) || defined(__NetBSD__) \
+  || defined(__OpenBSD__)
+      bridge->file = funopen(bridge.get(),
+          nullptr, file_bridge_write, nullptr, nullptr);
+#else
+      throw isl::error("printing to Python file objects is not supported "
+          "on this platform, pass a file descriptor instead");
+#endif
+      if (!bridge->file)
+        throw isl::error("failed to create FILE for Python file object");
+    }
+
+    setvbuf(bridge->file, nullptr, _IOFBF, 1 << 16);
+
+    isl::call_profiler profiler("isl_printer_to_file");
+    isl_printer *p = isl_printer_to_file(ctx.m_data, bridge->file);
+    profiler.done();
+    if (!p)
+    {
+      fclose(bridge->file);
+      throw isl::error("call to isl_printer_to_file failed");
+    }
+
+    isl_id *note = isl_id_alloc(ctx.m_data, "islpy_file", bridge.get());
+    note = isl_id_set_free_user(note, free_file_bridge);
+    if (!note)
+    {
+      isl_printer_free(p);
+      fclose(bridge->file);
+      throw isl::error("failed to attach file to printer");
+    }
+    // now owned by note
+    bridge.release();
+
+    p = isl_printer_set_note(p, file_bridge_key(ctx.m_data), note);
+    if (!p)
+      throw isl::error("failed to attach file to printer");
+
+    return isl::handle_from_new_ptr(new isl::printer(p));
+  }
+
+  // Replaces the generated Printer.flush, to report failures to write to
+  // the file (object) of printers created by printer_to_file.
+  py::object printer_flush(py::object py_self)
+  {
+    isl::printer_flush(py_self);
+
+    isl::printer &self = py_self.cast<isl::printer &>();
+    isl_id *key = file_bridge_key(isl_printer_get_ctx(self.m_data));
+    if (isl_printer_has_note(self.m_data, key) != isl_bool_true)
+    {
+      isl_id_free(key);
+      return py_self;
+    }
+
+    isl_id *note = isl_printer_get_note(self.m_data, key);
+    file_bridge *bridge = (file_bridge *) isl_id_get_user(note);
+    isl_id_free(note);
+
+    if (bridge->error_type)
+    {
+      PyErr_Restore(bridge->error_type, bridge->error_value,
+          bridge->error_traceback);
+      bridge->error_type = bridge->error_value = bridge->error_traceback
+        = nullptr;
+      throw py::error_already_set();
+    }
+    if (!bridge->target && ferror(bridge->file))
+    {
+      clearerr(bridge->file);
+      throw isl::error("failed to write to file descriptor");
+    }
+
+    if (bridge->target && !bridge->failed
+        && py::hasattr(py::handle(bridge->target), "flush"))
+      py::handle(bridge->target).attr("flush")();
+
+    return py_self;
+  }
+
+  // }}}
+
+  // {{{ list protocol
+
+  // Each of these makes a single pass over the list in C++, instead of
+  // one round trip through the bindings per element.
+
+  inline Py_ssize_t normalize_list_index(Py_ssize_t index, isl_size n)
+  {
+    if (index < 0)
+      index += n;
+    if (index < 0 || index >= n)
+      throw py::index_error("list index out of range");
+    return index;
+  }
+
+#define MAKE_LIST_PROTOCOL(el) \
+  py::object el##_list_from_py(isl::ctx &ctx, py::iterable iterable) \
+  { \
+    py::list items(iterable); \
+    \
+    isl::call_profiler profiler("isl_" #el "_list_from_py"); \
+    isl_##el##_list *result = isl_##el##_list_alloc( \
+        ctx.m_data, (int) items.size()); \
+    if (!result) \
+      throw isl::error("call to isl_" #el "_list_alloc failed"); \
+    \
+    try \
+    { \
+      for (py::handle item: items) \
+      { \
+        isl::el *wrapped; \
+        try \
+        { wrapped = &item.cast<isl::el &>(); } \
+        catch (py::cast_error &) \
+        { \
+          throw py::type_error( \
+              "isl_" #el "_list_from_py: unexpected element type"); \
+        } \
+        if (!wrapped->is_valid()) \
+          throw isl::error( \
+              "passed invalid element to isl_" #el "_list_from_py"); \
+        if (isl_##el##_get_ctx(wrapped->m_data) != ctx.m_data) \
+          throw isl::error( \
+              "isl_" #el "_list_from_py: element belongs to a different " \
+              "context"); \
+        \
+        isl_##el *copy = isl_##el##_copy(wrapped->m_data); \
+        if (!copy) \
+          throw isl::error("call to isl_" #el "_copy failed"); \
+        result = isl_##el##_list_add(result, copy); \
+        if (!result) \
+          throw isl::error("call to isl_" #el "_list_add failed"); \
+      } \
+    } \
+    catch (...) \
+    { \
+      isl_##el##_list_free(result); \
+      throw; \
+    } \
+    profiler.done(); \
+    \
+    return isl::handle_from_new_ptr(new isl::el##_list(result)); \
+  } \
+  \
+  isl_size el##_list_checked_size(isl::el##_list const &self) \
+  { \
+    if (!self.is_valid()) \
+      throw isl::error("passed invalid arg to isl_" #el "_list_size"); \
+    isl_size n = isl_##el##_list_size(self.m_data); \
+    if (n < 0) \
+      throw isl::error("call to isl_" #el "_list_size failed"); \
+    return n; \
+  } \
+  \
+  py::object el##_list_wrap_item(isl::el##_list const &self, int index) \
+  { \
+    isl_##el *item = isl_##el##_list_get_at(self.m_data, index); \
+    if (!item) \
+      throw isl::error("call to isl_" #el "_list_get_at failed"); \
+    return isl::handle_from_new_ptr(new isl::el(item)); \
+  } \
+  \
+  py::list el##_list_to_py(isl::el##_list const &self) \
+  { \
+    isl_size n = el##_list_checked_size(self); \
+    \
+    isl::call_profiler profiler("isl_" #el "_list_to_py"); \
+    py::list result(n); \
+    for (isl_size i = 0; i < n; ++i) \
+      PyList_SET_ITEM(result.ptr(), i, \
+          el##_list_wrap_item(self, i).release().ptr()); \
+    profiler.done(); \
+    \
+    return result; \
+  } \
+  \
+  py::object el##_list_getitem(isl::el##_list const &self, Py_ssize_t index) \
+  { \
+    isl_size n = el##_list_checked_size(self); \
+    return el##_list_wrap_item(self, (int) normalize_list_index(index, n)); \
+  } \
+  \
+  py::object el##_list_getitem_slice( \
+      isl::el##_list const &self, py::slice slc) \
+  { \
+    isl_size n = el##_list_checked_size(self); \
+    \
+    size_t start, stop, step, slicelength; \
+    if (!slc.compute(n, &start, &stop, &step, &slicelength)) \
+      throw py::error_already_set(); \
+    \
+    isl::call_profiler profiler("isl_" #el "_list_getitem"); \
+    isl_##el##_list *result = isl_##el##_list_alloc( \
+        isl_##el##_list_get_ctx(self.m_data), (int) slicelength); \
+    if (!result) \
+      throw isl::error("call to isl_" #el "_list_alloc failed"); \
+    \
+    for (size_t i = 0; i < slicelength; ++i, start += step) \
+    { \
+      result = isl_##el##_list_add(result, \
+          isl_##el##_list_get_at(self.m_data, (int) start)); \
+      if (!result) \
+        throw isl::error("call to isl_" #el "_list_add failed"); \
+    } \
+    profiler.done(); \
+    \
+    return isl::handle_from_new_ptr(new isl::el##_list(result)); \
+  }
+
+  MAKE_LIST_PROTOCOL(id)
+  MAKE_LIST_PROTOCOL(val)
+  MAKE_LIST_PROTOCOL(basic_set)
+  MAKE_LIST_PROTOCOL(basic_map)
+  MAKE_LIST_PROTOCOL(set)
+  MAKE_LIST_PROTOCOL(map)
+  MAKE_LIST_PROTOCOL(union_set)
+  MAKE_LIST_PROTOCOL(constraint)
+  MAKE_LIST_PROTOCOL(aff)
+  MAKE_LIST_PROTOCOL(pw_aff)
+  MAKE_LIST_PROTOCOL(pw_multi_aff)
+  MAKE_LIST_PROTOCOL(ast_expr)
+  MAKE_LIST_PROTOCOL(ast_node)
+  MAKE_LIST_PROTOCOL(pw_qpolynomial)
+  MAKE_LIST_PROTOCOL(pw_qpolynomial_fold)
+  MAKE_LIST_PROTOCOL(union_pw_aff)
+  MAKE_LIST_PROTOCOL(union_pw_multi_aff)
+  MAKE_LIST_PROTOCOL(union_map)
+
+  // }}}
 }
 
+#define EXPOSE_LIST_PROTOCOL(el, py_el) \
+  wrap_##el##_list.def_static("from_py", islpy::el##_list_from_py, \
+      py::arg("ctx"), py::arg("iterable"), \
+      "from_py(ctx, iterable)\n\n" \
+      ":param ctx: :class:`Context`\n" \
+      ":param iterable: an iterable of :class:`" #py_el "`\n" \
+      ":return: :class:`" #py_el "List`\n\n" \
+      ".. versionadded:: 2021.1"); \
+  wrap_##el##_list.def("to_py", islpy::el##_list_to_py, \
+      "to_py(self)\n\n" \
+      ":return: a :class:`list` of :class:`" #py_el "`\n\n" \
+      ".. versionadded:: 2021.1"); \
+  wrap_##el##_list.def("__iter__", \
+      [](isl::el##_list const &self) \
+      { return py::iter(islpy::el##_list_to_py(self)); }); \
+  wrap_##el##_list.def("__getitem__", islpy::el##_list_getitem, \
+      py::arg("index")); \
+  wrap_##el##_list.def("__getitem__", islpy::el##_list_getitem_slice, \
+      py::arg("index"));
+
 void islpy_expose_part1(py::module &m)
 {
   py::class_<isl::ctx, std::shared_ptr<isl::ctx> >
@@ -47,6 +1141,57 @@ void islpy_expose_part1(py::module &m)
   wrap_ctx.def("_reset_instance", &isl::ctx::reset_instance);
   wrap_ctx.def("_wraps_same_instance_as", &isl::ctx::wraps_same_instance_as);
 
+  wrap_ctx.def("get_operations", islpy::ctx_get_operations,
+      "get_operations(self)\n\n"
+      "Return the number of operations isl has performed within this "
+      "context since it was created or since the last call to "
+      ":meth:`reset_operations`.\n\n"
+      ":return: int\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_ctx.def("get_max_operations",
+      [](isl::ctx &self) { return isl_ctx_get_max_operations(self.m_data); },
+      "get_max_operations(self)\n\n"
+      ":return: int\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_ctx.def("set_max_operations",
+      [](isl::ctx &self, unsigned long max_operations)
+      { isl_ctx_set_max_operations(self.m_data, max_operations); },
+      py::arg("max_operations"),
+      "set_max_operations(self, max_operations)\n\n"
+      "Limit the number of operations isl may perform. Zero means no "
+      "limit.\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_ctx.def("reset_operations",
+      [](isl::ctx &self) { isl_ctx_reset_operations(self.m_data); },
+      "reset_operations(self)\n\n"
+      ".. versionadded:: 2021.1");
+
+  wrap_ctx.def("live_object_count",
+      [](isl::ctx &self) { return islpy::ctx_get_use_info(self).live_objects; },
+      "live_object_count(self)\n\n"
+      "Return the number of live wrapper objects (other than "
+      ":class:`Context` instances) referring to this context.\n\n"
+      ":return: int\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_ctx.def("peak_live_object_count",
+      [](isl::ctx &self)
+      { return islpy::ctx_get_use_info(self).peak_live_objects; },
+      "peak_live_object_count(self)\n\n"
+      "Return the largest value :meth:`live_object_count` has had.\n\n"
+      ":return: int\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_ctx.def("enable_space_cache", islpy::ctx_enable_space_cache,
+      py::arg("enable")=true,
+      "enable_space_cache(self, enable=True)\n\n"
+      "If enabled, :meth:`Space.create_from_names` (and therefore "
+      ":func:`make_zero_and_vars`) returns the same underlying space "
+      "for repeated calls with the same names within this context. "
+      "The cache holds up to 1024 spaces and is emptied when full. "
+      "Disabling the cache empties it.\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_ctx.def("_get_live_object_counts", islpy::ctx_get_live_object_counts);
+  wrap_ctx.def("_get_creation_tracebacks", islpy::ctx_get_creation_tracebacks);
+
   // {{{ lists
 
   MAKE_WRAP(id_list, IdList);
@@ -122,4 +1267,122 @@ void islpy_expose_part1(py::module &m)
   wrap_local_space.def(py::init<isl::space &>());
 
 #include "gen-expose-part1.inc"
+
+  wrap_space.def_static("_create_from_names", islpy::space_create_from_names,
+      py::arg("ctx"), py::arg("params"), py::arg("set"), py::arg("in_"),
+      py::arg("out"));
+  wrap_space.def("_get_var_dict", islpy::space_get_var_dict,
+      py::arg("dimtype"), py::arg("ignore_out"));
+  wrap_space.def("_get_id_dict", islpy::space_get_id_dict,
+      py::arg("dimtype"));
+  wrap_space.def("_get_dim_names", islpy::space_get_dim_names,
+      py::arg("dimtype"));
+  wrap_space.def("_get_var_pw_affs", islpy::space_get_var_pw_affs,
+      py::arg("keys"));
+  wrap_space.def("_build_deferred_aff", islpy::space_build_deferred_aff,
+      py::arg("encoding"));
+  wrap_space.def("_build_deferred_basic_set",
+      islpy::space_build_deferred_basic_set,
+      py::arg("equalities"), py::arg("inequalities"));
+
+  wrap_printer.def_static("to_file", islpy::printer_to_file,
+      py::arg("ctx"), py::arg("file"),
+      "to_file(ctx, file)\n\n"
+      "Return a printer writing to *file*, which may be a Python file "
+      "object (text or binary, anything with a :meth:`write` method) or "
+      "a file descriptor. Output is buffered and reaches *file* once "
+      "the buffer fills up, upon :meth:`flush`, and when the printer is "
+      "freed. Failures to write to *file* are raised by :meth:`flush`.\n\n"
+      "A file descriptor is duplicated, *file* may be closed once the "
+      "printer is gone. On platforms other than Linux, macOS and the BSDs, "
+      "only file descriptors are supported.\n\n"
+      ":param ctx: :class:`Context`\n"
+      ":return: :class:`Printer`\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_printer.attr("flush") = py::cpp_function(islpy::printer_flush,
+      py::name("flush"), py::is_method(wrap_printer),
+      "flush(self)\n\n"
+      "For printers created by :meth:`to_file`, this also flushes the "
+      "Python file object and raises any error writing to it.\n\n"
+      ":param self: :class:`Printer`\n"
+      ":return: :class:`Printer` (self)");
+
+  // {{{ list protocol
+
+  EXPOSE_LIST_PROTOCOL(id, Id);
+  EXPOSE_LIST_PROTOCOL(val, Val);
+  EXPOSE_LIST_PROTOCOL(basic_set, BasicSet);
+  EXPOSE_LIST_PROTOCOL(basic_map, BasicMap);
+  EXPOSE_LIST_PROTOCOL(set, Set);
+  EXPOSE_LIST_PROTOCOL(map, Map);
+  EXPOSE_LIST_PROTOCOL(union_set, UnionSet);
+  EXPOSE_LIST_PROTOCOL(constraint, Constraint);
+  EXPOSE_LIST_PROTOCOL(aff, Aff);
+  EXPOSE_LIST_PROTOCOL(pw_aff, PwAff);
+  EXPOSE_LIST_PROTOCOL(pw_multi_aff, PwMultiAff);
+  EXPOSE_LIST_PROTOCOL(ast_expr, AstExpr);
+  EXPOSE_LIST_PROTOCOL(ast_node, AstNode);
+  EXPOSE_LIST_PROTOCOL(pw_qpolynomial, PwQPolynomial);
+  EXPOSE_LIST_PROTOCOL(pw_qpolynomial_fold, PwQPolynomialFold);
+  EXPOSE_LIST_PROTOCOL(union_pw_aff, UnionPwAff);
+  EXPOSE_LIST_PROTOCOL(union_pw_multi_aff, UnionPwMultiAff);
+  EXPOSE_LIST_PROTOCOL(union_map, UnionMap);
+
+  // }}}
+
+  // {{{ parsers for parse_many
+
+  REGISTER_PARSER(val);
+  REGISTER_PARSER(multi_val);
+  REGISTER_PARSER(aff);
+  REGISTER_PARSER(pw_aff);
+  REGISTER_PARSER(union_pw_aff);
+  REGISTER_PARSER(multi_aff);
+  REGISTER_PARSER(multi_pw_aff);
+  REGISTER_PARSER(pw_multi_aff);
+  REGISTER_PARSER(union_pw_multi_aff);
+  REGISTER_PARSER(multi_union_pw_aff);
+  REGISTER_PARSER(id);
+  REGISTER_PARSER(multi_id);
+
+  // }}}
+
+  // {{{ cached str
+
+  CACHED_STR(id_list);
+  CACHED_STR(val_list);
+  CACHED_STR(basic_set_list);
+  CACHED_STR(basic_map_list);
+  CACHED_STR(set_list);
+  CACHED_STR(map_list);
+  CACHED_STR(union_set_list);
+  CACHED_STR(constraint_list);
+  CACHED_STR(aff_list);
+  CACHED_STR(pw_aff_list);
+  CACHED_STR(pw_multi_aff_list);
+  CACHED_STR(ast_expr_list);
+  CACHED_STR(ast_node_list);
+  CACHED_STR(pw_qpolynomial_list);
+  CACHED_STR(pw_qpolynomial_fold_list);
+  CACHED_STR(union_pw_aff_list);
+  CACHED_STR(union_pw_multi_aff_list);
+  CACHED_STR(union_map_list);
+  CACHED_STR(val);
+  CACHED_STR(multi_val);
+  CACHED_STR(vec);
+  CACHED_STR(aff);
+  CACHED_STR(pw_aff);
+  CACHED_STR(union_pw_aff);
+  CACHED_STR(multi_id);
+  CACHED_STR(multi_aff);
+  CACHED_STR(multi_pw_aff);
+  CACHED_STR(pw_multi_aff);
+  CACHED_STR(union_pw_multi_aff);
+  CACHED_STR(multi_union_pw_aff);
+  CACHED_STR(id);
+  CACHED_STR(constraint);
+  CACHED_STR(space);
+  CACHED_STR(local_space);
+
+  // }}}
 }
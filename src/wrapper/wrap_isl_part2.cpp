@@ -1,10 +1,449 @@
 #include "wrap_isl.hpp"
+#include <string>
+#include <unordered_set>
+#include <vector>
 
 namespace isl
 {
 #include "gen-wrap-part2.inc"
 }
 
+namespace islpy
+{
+  // {{{ operations on dimensions selected by name
+
+  // Each of these resolves the names and applies the operation in a single
+  // C++ call, to each maximal run of selected dimensions, last run first so
+  // that the indices of the remaining runs stay valid.
+
+  struct dim_selection
+  {
+    std::unordered_set<std::string> names;
+    bool keep;
+    std::vector<isl_dim_type> types;
+
+    dim_selection(py::iterable py_names, bool keep_, py::object py_types)
+      : keep(keep_)
+    {
+      for (py::handle name: py_names)
+        names.insert(name.cast<std::string>());
+
+      if (py_types.is_none())
+        types = { isl_dim_param, isl_dim_in, isl_dim_out };
+      else
+        for (py::handle dt: py::iterable(py_types))
+          types.push_back(dt.cast<isl_dim_type>());
+    }
+
+    bool is_selected(const char *name) const
+    {
+      bool is_named = name && names.count(name);
+      return is_named != keep;
+    }
+  };
+
+  template <class IslT, class Dim, class GetDimName, class Op, class Free>
+  IslT *apply_to_selected_dims(IslT *obj, dim_selection const &sel,
+      Dim dim, GetDimName get_dim_name, Op op, Free free)
+  {
+    for (isl_dim_type dt: sel.types)
+    {
+      isl_size n = dim(obj, dt);
+      if (n < 0)
+      {
+        free(obj);
+        return nullptr;
+      }
+
+      int i = n;
+      while (i > 0)
+      {
+        if (!sel.is_selected(get_dim_name(obj, dt, i-1)))
+        {
+          --i;
+          continue;
+        }
+
+        int end = i;
+        while (i > 0 && sel.is_selected(get_dim_name(obj, dt, i-1)))
+          --i;
+
+        obj = op(obj, dt, i, end-i);
+        if (!obj)
+          return nullptr;
+      }
+    }
+
+    return obj;
+  }
+
+#define MAKE_NAMED_DIM_OP(cls, op) \
+  py::object cls##_##op##_names(isl::cls const &self, py::iterable names, \
+      bool keep, py::object types) \
+  { \
+    if (!self.is_valid()) \
+      throw isl::error("passed invalid arg to isl_" #cls "_" #op "_names"); \
+    dim_selection sel(names, keep, types); \
+    \
+    isl::call_profiler profiler("isl_" #cls "_" #op "_names"); \
+    isl_##cls *result = isl_##cls##_copy(self.m_data); \
+    if (result) \
+      result = apply_to_selected_dims(result, sel, \
+          isl_##cls##_dim, isl_##cls##_get_dim_name, isl_##cls##_##op, \
+          isl_##cls##_free); \
+    profiler.done(); \
+    \
+    if (!result) \
+      throw isl::error("call to isl_" #cls "_" #op "_names failed"); \
+    return isl::handle_from_new_ptr(new isl::cls(result)); \
+  }
+
+  MAKE_NAMED_DIM_OP(basic_set, project_out)
+  MAKE_NAMED_DIM_OP(basic_set, eliminate)
+  MAKE_NAMED_DIM_OP(basic_map, project_out)
+  MAKE_NAMED_DIM_OP(basic_map, eliminate)
+  MAKE_NAMED_DIM_OP(set, project_out)
+  MAKE_NAMED_DIM_OP(set, eliminate)
+  MAKE_NAMED_DIM_OP(map, project_out)
+  MAKE_NAMED_DIM_OP(map, eliminate)
+
+  // }}}
+
+  // {{{ bulk constraint addition
+
+  // Constraints are gathered as rows of [constant, parameters, input
+  // dimensions, output (or set) dimensions], which become a single basic
+  // set or map that is intersected with the target once. Constraints that
+  // involve local (div) dimensions or have a different space are each
+  // turned into a basic set or map of their own.
+
+  // Accepts Python and NumPy integers.
+  isl_val *val_from_integer(isl_ctx *ctx, py::handle obj)
+  {
+    py::object index = py::reinterpret_steal<py::object>(
+        PyNumber_Index(obj.ptr()));
+    if (!index)
+      throw py::error_already_set();
+
+    int overflow;
+    long value = PyLong_AsLongAndOverflow(index.ptr(), &overflow);
+    if (value == -1 && PyErr_Occurred())
+      throw py::error_already_set();
+    if (!overflow)
+      return isl_val_int_from_si(ctx, value);
+    return isl_val_read_from_str(ctx,
+        py::str(index).cast<std::string>().c_str());
+  }
+
+  template <class BatchT>
+  struct batch_traits;
+
+  template <>
+  struct batch_traits<isl_basic_set>
+  {
+    static isl_basic_set *from_constraint(isl_constraint *c)
+    { return isl_basic_set_from_constraint(c); }
+    static isl_basic_set *from_matrices(isl_space *space,
+        isl_mat *eq, isl_mat *ineq)
+    {
+      return isl_basic_set_from_constraint_matrices(space, eq, ineq,
+          isl_dim_cst, isl_dim_param, isl_dim_set, isl_dim_div);
+    }
+    static isl_basic_set *intersect(isl_basic_set *a, isl_basic_set *b)
+    { return isl_basic_set_intersect(a, b); }
+    static void free(isl_basic_set *obj)
+    { isl_basic_set_free(obj); }
+  };
+
+  template <>
+  struct batch_traits<isl_basic_map>
+  {
+    static isl_basic_map *from_constraint(isl_constraint *c)
+    { return isl_basic_map_from_constraint(c); }
+    static isl_basic_map *from_matrices(isl_space *space,
+        isl_mat *eq, isl_mat *ineq)
+    {
+      return isl_basic_map_from_constraint_matrices(space, eq, ineq,
+          isl_dim_cst, isl_dim_param, isl_dim_in, isl_dim_out, isl_dim_div);
+    }
+    static isl_basic_map *intersect(isl_basic_map *a, isl_basic_map *b)
+    { return isl_basic_map_intersect(a, b); }
+    static void free(isl_basic_map *obj)
+    { isl_basic_map_free(obj); }
+  };
+
+  template <class BatchT>
+  class constraint_collector
+  {
+    typedef batch_traits<BatchT> traits;
+
+    isl_space *m_space;
+    isl_ctx *m_ctx;
+    unsigned m_n_col;
+
+    // rows of owned values
+    std::vector<std::vector<isl_val *> > m_rows[2];
+    std::vector<BatchT *> m_separate;
+
+    void add_row(bool is_eq, std::vector<isl_val *> &row)
+    {
+      m_rows[is_eq].push_back(std::vector<isl_val *>());
+      m_rows[is_eq].back().swap(row);
+    }
+
+    static void free_row(std::vector<isl_val *> &row)
+    {
+      for (isl_val *v: row)
+        isl_val_free(v);
+      row.clear();
+    }
+
+  public:
+    constraint_collector(isl_space *space)
+      : m_space(space), m_ctx(isl_space_get_ctx(space))
+    {
+      isl_size n_dim = isl_space_dim(space, isl_dim_all);
+      if (n_dim < 0)
+      {
+        isl_space_free(space);
+        throw isl::error("call to isl_space_dim failed");
+      }
+      m_n_col = 1 + n_dim;
+    }
+
+    ~constraint_collector()
+    {
+      isl_space_free(m_space);
+      for (auto &rows: m_rows)
+        for (auto &row: rows)
+          free_row(row);
+      for (BatchT *obj: m_separate)
+        traits::free(obj);
+    }
+
+    // *c* is not taken
+    void add_constraint(isl_constraint *c)
+    {
+      isl_space *c_space = isl_constraint_get_space(c);
+      isl_bool same_space = isl_space_is_equal(c_space, m_space);
+      isl_space_free(c_space);
+      isl_size n_div = isl_constraint_dim(c, isl_dim_div);
+      if (same_space < 0 || n_div < 0)
+        throw isl::error("failed to inspect constraint");
+
+      isl_bool involves_divs = isl_bool_false;
+      if (n_div)
+        involves_divs = isl_constraint_involves_dims(c, isl_dim_div, 0, n_div);
+      if (involves_divs < 0)
+        throw isl::error("failed to inspect constraint");
+
+      if (!same_space || involves_divs)
+      {
+        BatchT *obj = traits::from_constraint(isl_constraint_copy(c));
+        if (!obj)
+          throw isl::error("failed to convert constraint");
+        m_separate.push_back(obj);
+        return;
+      }
+
+      std::vector<isl_val *> row;
+      row.push_back(isl_constraint_get_constant_val(c));
+      for (isl_dim_type dt: {isl_dim_param, isl_dim_in, isl_dim_out})
+      {
+        isl_size n = isl_constraint_dim(c, dt);
+        for (isl_size i = 0; i < n; ++i)
+          row.push_back(isl_constraint_get_coefficient_val(c, dt, i));
+      }
+
+      for (isl_val *v: row)
+        if (!v)
+        {
+          free_row(row);
+          throw isl::error("failed to read constraint coefficients");
+        }
+
+      add_row(isl_constraint_is_equality(c), row);
+    }
+
+    void add_constraints(py::handle py_constraints)
+    {
+      try
+      {
+        isl::constraint_list &list
+          = py::cast<isl::constraint_list &>(py_constraints);
+        if (!list.is_valid())
+          throw isl::error("passed invalid ConstraintList");
+
+        isl_size n = isl_constraint_list_size(list.m_data);
+        for (isl_size i = 0; i < n; ++i)
+        {
+          isl_constraint *c = isl_constraint_list_get_at(list.m_data, i);
+          try
+          {
+            add_constraint(c);
+          }
+          catch (...)
+          {
+            isl_constraint_free(c);
+            throw;
+          }
+          isl_constraint_free(c);
+        }
+        return;
+      }
+      catch (py::cast_error &)
+      { }
+
+      for (py::handle py_c: py::iterable(
+            py::reinterpret_borrow<py::object>(py_constraints)))
+      {
+        isl::constraint &c = py::cast<isl::constraint &>(py_c);
+        if (!c.is_valid())
+          throw isl::error("passed invalid Constraint");
+        add_constraint(c.m_data);
+      }
+    }
+
+    void add_rows(bool is_eq, py::handle py_rows)
+    {
+      for (py::handle py_row: py::iterable(
+            py::reinterpret_borrow<py::object>(py_rows)))
+      {
+        std::vector<isl_val *> row;
+        try
+        {
+          for (py::handle entry: py::iterable(
+                py::reinterpret_borrow<py::object>(py_row)))
+          {
+            if (row.size() == m_n_col)
+              throw py::value_error("constraint row has too many entries");
+            isl_val *v = val_from_integer(m_ctx, entry);
+            if (!v)
+              throw isl::error("failed to convert coefficient");
+            row.push_back(v);
+          }
+          if (row.size() != m_n_col)
+            throw py::value_error("constraint row has too few entries");
+        }
+        catch (...)
+        {
+          free_row(row);
+          throw;
+        }
+        add_row(is_eq, row);
+      }
+    }
+
+    // Returns nullptr (and throws nothing) on isl errors.
+    BatchT *finish()
+    {
+      isl_mat *mats[2];
+      for (int is_eq = 0; is_eq < 2; ++is_eq)
+      {
+        auto &rows = m_rows[is_eq];
+        isl_mat *mat = isl_mat_alloc(m_ctx, (unsigned) rows.size(), m_n_col);
+        for (size_t i = 0; i < rows.size(); ++i)
+        {
+          for (unsigned j = 0; j < m_n_col; ++j)
+            mat = isl_mat_set_element_val(mat, (int) i, (int) j, rows[i][j]);
+          rows[i].clear();
+        }
+        rows.clear();
+        mats[is_eq] = mat;
+      }
+
+      BatchT *result = traits::from_matrices(
+          isl_space_copy(m_space), mats[1], mats[0]);
+      for (BatchT *obj: m_separate)
+        result = traits::intersect(result, obj);
+      m_separate.clear();
+      return result;
+    }
+  };
+
+#define MAKE_ADD_CONSTRAINTS(cls, batch_cls, intersect_batch) \
+  py::object cls##_add_constraints(isl::cls const &self, \
+      py::object constraints, py::object equalities, py::object inequalities) \
+  { \
+    if (!self.is_valid()) \
+      throw isl::error("passed invalid arg to isl_" #cls "_add_constraints"); \
+    \
+    constraint_collector<isl_##batch_cls> collector( \
+        isl_##cls##_get_space(self.m_data)); \
+    if (!constraints.is_none()) \
+      collector.add_constraints(constraints); \
+    if (!equalities.is_none()) \
+      collector.add_rows(true, equalities); \
+    if (!inequalities.is_none()) \
+      collector.add_rows(false, inequalities); \
+    \
+    isl::call_profiler profiler("isl_" #cls "_add_constraints"); \
+    isl_##cls *result = intersect_batch( \
+        isl_##cls##_copy(self.m_data), collector.finish()); \
+    profiler.done(); \
+    \
+    if (!result) \
+      throw isl::error("call to isl_" #cls "_add_constraints failed"); \
+    return isl::handle_from_new_ptr(new isl::cls(result)); \
+  }
+
+  isl_set *set_intersect_basic_set(isl_set *set, isl_basic_set *bset)
+  {
+    return isl_set_intersect(set, isl_set_from_basic_set(bset));
+  }
+
+  isl_map *map_intersect_basic_map(isl_map *map, isl_basic_map *bmap)
+  {
+    return isl_map_intersect(map, isl_map_from_basic_map(bmap));
+  }
+
+  MAKE_ADD_CONSTRAINTS(basic_set, basic_set, isl_basic_set_intersect)
+  MAKE_ADD_CONSTRAINTS(basic_map, basic_map, isl_basic_map_intersect)
+  MAKE_ADD_CONSTRAINTS(set, basic_set, set_intersect_basic_set)
+  MAKE_ADD_CONSTRAINTS(map, basic_map, map_intersect_basic_map)
+
+  // }}}
+}
+
+#define EXPOSE_NAMED_DIM_OP(cls, op, py_cls) \
+  wrap_##cls.def(#op "_names", islpy::cls##_##op##_names, \
+      py::arg("names"), py::arg("keep")=false, py::arg("types")=py::none(), \
+      #op "_names(self, names, keep=False, types=None)\n\n" \
+      "Apply :meth:`" #op "` to all dimensions named in *names*, or, if " \
+      "*keep* is *True*, to all dimensions not named in *names*, " \
+      "including unnamed ones. Only dimensions whose :class:`dim_type` is " \
+      "in *types* are considered, by default all parameter, input and " \
+      "output (or set) dimensions.\n\n" \
+      ":param self: :class:`" #py_cls "`\n" \
+      ":param names: an iterable of :class:`str`\n" \
+      ":param keep: :class:`bool`\n" \
+      ":param types: an iterable of :class:`dim_type`, or *None*\n" \
+      ":return: :class:`" #py_cls "`\n\n" \
+      ".. versionadded:: 2021.1");
+
+#define EXPOSE_ADD_CONSTRAINTS(cls, py_cls) \
+  wrap_##cls.def("add_constraints", islpy::cls##_add_constraints, \
+      py::arg("constraints")=py::none(), py::arg("equalities")=py::none(), \
+      py::arg("inequalities")=py::none(), \
+      "add_constraints(self, constraints=None, equalities=None, " \
+      "inequalities=None)\n\n" \
+      "Add all of *constraints*, and the constraints given by the rows of " \
+      "*equalities* (each equal to zero) and *inequalities* (each " \
+      "non-negative), simplifying only once. Each row, e.g. of a " \
+      "two-dimensional NumPy integer array, holds the constant term, " \
+      "followed by the coefficients of the parameters, then of the input " \
+      "and output (or set) dimensions.\n\n" \
+      ":param self: :class:`" #py_cls "`\n" \
+      ":param constraints: a :class:`ConstraintList` or an iterable of " \
+      ":class:`Constraint`, or *None*\n" \
+      ":param equalities: an iterable of rows of integers, or *None*\n" \
+      ":param inequalities: an iterable of rows of integers, or *None*\n" \
+      ":return: :class:`" #py_cls "`\n\n" \
+      ".. versionadded:: 2011.3\n\n" \
+      ".. versionchanged:: 2021.1\n\n" \
+      "    Added *equalities* and *inequalities*. All constraints are " \
+      "added in a single call.");
+
 void islpy_expose_part2(py::module &m)
 {
   MAKE_WRAP(basic_set, BasicSet);
@@ -33,4 +472,40 @@ void islpy_expose_part2(py::module &m)
   MAKE_WRAP(stride_info, StrideInfo);
 
 #include "gen-expose-part2.inc"
+
+  EXPOSE_NAMED_DIM_OP(basic_set, project_out, BasicSet);
+  EXPOSE_NAMED_DIM_OP(basic_set, eliminate, BasicSet);
+  EXPOSE_NAMED_DIM_OP(basic_map, project_out, BasicMap);
+  EXPOSE_NAMED_DIM_OP(basic_map, eliminate, BasicMap);
+  EXPOSE_NAMED_DIM_OP(set, project_out, Set);
+  EXPOSE_NAMED_DIM_OP(set, eliminate, Set);
+  EXPOSE_NAMED_DIM_OP(map, project_out, Map);
+  EXPOSE_NAMED_DIM_OP(map, eliminate, Map);
+
+  EXPOSE_ADD_CONSTRAINTS(basic_set, BasicSet);
+  EXPOSE_ADD_CONSTRAINTS(basic_map, BasicMap);
+  EXPOSE_ADD_CONSTRAINTS(set, Set);
+  EXPOSE_ADD_CONSTRAINTS(map, Map);
+
+  REGISTER_PARSER(basic_set);
+  REGISTER_PARSER(basic_map);
+  REGISTER_PARSER(set);
+  REGISTER_PARSER(map);
+  REGISTER_PARSER(union_set);
+  REGISTER_PARSER(union_map);
+
+  CACHED_STR(basic_set);
+  CACHED_STR(basic_map);
+  CACHED_STR(set);
+  CACHED_STR(map);
+  CACHED_STR(union_set);
+  CACHED_STR(union_map);
+  CACHED_STR(point);
+
+  EXPOSE_READ_FROM_PATH(basic_set, BasicSet);
+  EXPOSE_READ_FROM_PATH(basic_map, BasicMap);
+  EXPOSE_READ_FROM_PATH(set, Set);
+  EXPOSE_READ_FROM_PATH(map, Map);
+  EXPOSE_READ_FROM_PATH(union_set, UnionSet);
+  EXPOSE_READ_FROM_PATH(union_map, UnionMap);
 }
@@ -1,10 +1,293 @@
 #include "wrap_isl.hpp"
+#include <climits>
+#include <memory>
+#include <unordered_map>
 
 namespace isl
 {
 #include "gen-wrap-part3.inc"
 }
 
+namespace islpy
+{
+  // {{{ constant addition
+
+  // Accepts a Val or a Python integer, like the generated wrappers.
+  isl_val *val_from_object(isl_ctx *ctx, py::handle py_v)
+  {
+    isl_val *result;
+    try
+    {
+      isl::val &v = py::cast<isl::val &>(py_v);
+      if (!v.is_valid())
+        throw isl::error("passed invalid Val");
+      result = isl_val_copy(v.m_data);
+    }
+    catch (py::cast_error &)
+    {
+      try
+      {
+        result = isl_val_int_from_si(ctx, py::cast<long>(py_v));
+      }
+      catch (py::cast_error &)
+      {
+        throw isl::error("unrecognized argument for v");
+      }
+    }
+
+    if (!result)
+      throw isl::error("failed to create arg v");
+    return result;
+  }
+
+  py::object qpolynomial_add_constant_val(isl::qpolynomial const &self,
+      py::object py_v)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid arg to add_constant_val for self");
+    isl_val *v = val_from_object(isl_qpolynomial_get_ctx(self.m_data), py_v);
+
+    isl::call_profiler profiler("isl_qpolynomial_add_constant_val");
+    isl_qpolynomial *qp = isl_qpolynomial_copy(self.m_data);
+    isl_qpolynomial *cst = isl_qpolynomial_val_on_domain(
+        isl_qpolynomial_get_domain_space(qp), v);
+    isl_qpolynomial *result = isl_qpolynomial_add(qp, cst);
+    profiler.done();
+
+    if (!result)
+      throw isl::error("call to isl_qpolynomial_add_constant_val failed");
+    return isl::handle_from_new_ptr(new isl::qpolynomial(result));
+  }
+
+  py::object pw_qpolynomial_add_constant_val(isl::pw_qpolynomial const &self,
+      py::object py_v)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid arg to add_constant_val for self");
+    isl_val *v = val_from_object(isl_pw_qpolynomial_get_ctx(self.m_data), py_v);
+
+    isl::call_profiler profiler("isl_pw_qpolynomial_add_constant_val");
+    isl_pw_qpolynomial *pwqp = isl_pw_qpolynomial_copy(self.m_data);
+    isl_size n_piece = isl_pw_qpolynomial_n_piece(pwqp);
+    isl_pw_qpolynomial *cst = isl_pw_qpolynomial_from_qpolynomial(
+        isl_qpolynomial_val_on_domain(
+          isl_pw_qpolynomial_get_domain_space(pwqp), v));
+
+    // Addition of piecewise quasipolynomials is defined on the union of
+    // the domains, so restrict the constant to the pieces of *self*,
+    // unless there are none.
+    if (n_piece > 0)
+      cst = isl_pw_qpolynomial_intersect_domain(cst,
+          isl_pw_qpolynomial_domain(isl_pw_qpolynomial_copy(pwqp)));
+
+    isl_pw_qpolynomial *result = isl_pw_qpolynomial_add(pwqp, cst);
+    profiler.done();
+
+    if (n_piece < 0)
+      result = isl_pw_qpolynomial_free(result);
+    if (!result)
+      throw isl::error("call to isl_pw_qpolynomial_add_constant_val failed");
+    return isl::handle_from_new_ptr(new isl::pw_qpolynomial(result));
+  }
+
+  // }}}
+
+  // {{{ conversion of ASTs to Python objects
+
+  typedef std::unique_ptr<isl_ast_expr, decltype(&isl_ast_expr_free)>
+    ast_expr_ptr;
+  typedef std::unique_ptr<isl_ast_node, decltype(&isl_ast_node_free)>
+    ast_node_ptr;
+
+  // Builds the (namedtuple) types passed from Python, see
+  // islpy.AstForNode and its siblings.
+  class ast_converter
+  {
+    private:
+      py::object m_for_type, m_if_type, m_block_type, m_mark_type,
+        m_user_type, m_op_type, m_id_type;
+      std::unordered_map<int, py::object> m_op_types;
+
+      void check(bool ok, const char *c_name)
+      {
+        if (!ok)
+          throw isl::error(std::string("call to ") + c_name + " failed");
+      }
+
+      py::object convert_id(isl_id *id)
+      {
+        check(id, "isl_ast_expr_id_get_id");
+        const char *name = isl_id_get_name(id);
+        py::object result = name ? py::object(py::str(name)) : py::none();
+        isl_id_free(id);
+        return result;
+      }
+
+      py::object convert_val(isl_val *v)
+      {
+        check(v, "isl_ast_expr_int_get_val");
+        std::unique_ptr<isl_val, decltype(&isl_val_free)> holder(
+            v, isl_val_free);
+
+        if (isl_val_cmp_si(v, LONG_MAX) <= 0
+            && isl_val_cmp_si(v, LONG_MIN) >= 0)
+          return py::reinterpret_steal<py::object>(
+              PyLong_FromLong(isl_val_get_num_si(v)));
+
+        char *str = isl_val_to_str(v);
+        check(str, "isl_val_to_str");
+        PyObject *result = PyLong_FromString(str, nullptr, 10);
+        free(str);
+        if (!result)
+          throw py::error_already_set();
+        return py::reinterpret_steal<py::object>(result);
+      }
+
+      py::object get_op_type(isl_ast_expr_op_type op_type)
+      {
+        auto it = m_op_types.find(op_type);
+        if (it != m_op_types.end())
+          return it->second;
+
+        py::object result = py::cast(op_type);
+        m_op_types[op_type] = result;
+        return result;
+      }
+
+    public:
+      ast_converter(py::tuple types)
+      {
+        if (types.size() != 7)
+          throw py::value_error("expected seven node types");
+        m_for_type = types[0];
+        m_if_type = types[1];
+        m_block_type = types[2];
+        m_mark_type = types[3];
+        m_user_type = types[4];
+        m_op_type = types[5];
+        m_id_type = types[6];
+      }
+
+      py::object convert_expr(isl_ast_expr *expr)
+      {
+        check(expr, "isl_ast_expr_copy");
+        ast_expr_ptr holder(expr, isl_ast_expr_free);
+
+        switch (isl_ast_expr_get_type(expr))
+        {
+          case isl_ast_expr_op:
+            {
+              isl_size n = isl_ast_expr_op_get_n_arg(expr);
+              check(n >= 0, "isl_ast_expr_op_get_n_arg");
+
+              py::tuple args(n);
+              for (isl_size i = 0; i < n; ++i)
+                args[i] = convert_expr(isl_ast_expr_op_get_arg(expr, i));
+
+              return m_op_type(
+                  get_op_type(isl_ast_expr_op_get_type(expr)), args);
+            }
+          case isl_ast_expr_id:
+            return m_id_type(convert_id(isl_ast_expr_id_get_id(expr)));
+          case isl_ast_expr_int:
+            return convert_val(isl_ast_expr_int_get_val(expr));
+          default:
+            throw isl::error("unexpected type of ast_expr");
+        }
+      }
+
+      py::object convert_node(isl_ast_node *node)
+      {
+        check(node, "isl_ast_node_copy");
+        ast_node_ptr holder(node, isl_ast_node_free);
+
+        switch (isl_ast_node_get_type(node))
+        {
+          case isl_ast_node_for:
+            {
+              // one at a time, so that nothing leaks if one fails
+              py::object iterator = convert_expr(
+                  isl_ast_node_for_get_iterator(node));
+              py::object init = convert_expr(isl_ast_node_for_get_init(node));
+              py::object cond = convert_expr(isl_ast_node_for_get_cond(node));
+              py::object inc = convert_expr(isl_ast_node_for_get_inc(node));
+              py::object body = convert_node(isl_ast_node_for_get_body(node));
+
+              return m_for_type(iterator, init, cond, inc, body);
+            }
+          case isl_ast_node_if:
+            {
+              py::object cond = convert_expr(isl_ast_node_if_get_cond(node));
+              py::object then_node = convert_node(
+                  isl_ast_node_if_get_then_node(node));
+
+              isl_bool has_else = isl_ast_node_if_has_else_node(node);
+              check(has_else >= 0, "isl_ast_node_if_has_else_node");
+              py::object else_node = has_else
+                ? convert_node(isl_ast_node_if_get_else_node(node))
+                : py::none();
+
+              return m_if_type(cond, then_node, else_node);
+            }
+          case isl_ast_node_block:
+            {
+              isl_ast_node_list *children =
+                isl_ast_node_block_get_children(node);
+              isl_size n = isl_ast_node_list_size(children);
+              if (n < 0)
+                isl_ast_node_list_free(children);
+              check(n >= 0, "isl_ast_node_block_get_children");
+
+              py::tuple py_children(n);
+              try
+              {
+                for (isl_size i = 0; i < n; ++i)
+                  py_children[i] = convert_node(
+                      isl_ast_node_list_get_at(children, i));
+              }
+              catch (...)
+              {
+                isl_ast_node_list_free(children);
+                throw;
+              }
+              isl_ast_node_list_free(children);
+
+              return m_block_type(py_children);
+            }
+          case isl_ast_node_mark:
+            {
+              py::object id = convert_id(isl_ast_node_mark_get_id(node));
+              py::object marked = convert_node(
+                  isl_ast_node_mark_get_node(node));
+
+              return m_mark_type(id, marked);
+            }
+          case isl_ast_node_user:
+            return m_user_type(
+                convert_expr(isl_ast_node_user_get_expr(node)));
+          default:
+            throw isl::error("unexpected type of ast_node");
+        }
+      }
+  };
+
+  py::object ast_expr_to_python(isl::ast_expr const &self, py::tuple types)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid arg to to_python for self");
+    return ast_converter(types).convert_expr(isl_ast_expr_copy(self.m_data));
+  }
+
+  py::object ast_node_to_python(isl::ast_node const &self, py::tuple types)
+  {
+    if (!self.is_valid())
+      throw isl::error("passed invalid arg to to_python for self");
+    return ast_converter(types).convert_node(isl_ast_node_copy(self.m_data));
+  }
+
+  // }}}
+}
+
 void islpy_expose_part3(py::module &m)
 {
   MAKE_WRAP(qpolynomial, QPolynomial);
@@ -32,4 +315,49 @@ void islpy_expose_part3(py::module &m)
   MAKE_WRAP(ast_print_options, AstPrintOptions);
 
 #include "gen-expose-part3.inc"
+
+  wrap_qpolynomial.def("add_constant_val", islpy::qpolynomial_add_constant_val,
+      py::arg("v"),
+      "add_constant_val(self, v)\n\n"
+      ":param self: :class:`QPolynomial`\n"
+      ":param v: :class:`Val`\n"
+      ":return: :class:`QPolynomial`\n\n"
+      ".. versionadded:: 2021.1");
+  wrap_pw_qpolynomial.def("add_constant_val",
+      islpy::pw_qpolynomial_add_constant_val, py::arg("v"),
+      "add_constant_val(self, v)\n\n"
+      "The constant is added on the domain of *self*, or everywhere if "
+      "*self* has no pieces.\n\n"
+      ":param self: :class:`PwQPolynomial`\n"
+      ":param v: :class:`Val`\n"
+      ":return: :class:`PwQPolynomial`\n\n"
+      ".. versionadded:: 2021.1");
+
+  wrap_ast_expr.def("_to_python", islpy::ast_expr_to_python,
+      py::arg("types"));
+  wrap_ast_node.def("_to_python", islpy::ast_node_to_python,
+      py::arg("types"));
+
+  REGISTER_PARSER(pw_qpolynomial);
+  REGISTER_PARSER(union_pw_qpolynomial);
+  REGISTER_PARSER(schedule);
+  REGISTER_PARSER(schedule_constraints);
+
+  CACHED_STR(qpolynomial);
+  CACHED_STR(pw_qpolynomial);
+  CACHED_STR(qpolynomial_fold);
+  CACHED_STR(pw_qpolynomial_fold);
+  CACHED_STR(union_pw_qpolynomial_fold);
+  CACHED_STR(union_pw_qpolynomial);
+  CACHED_STR(schedule);
+  CACHED_STR(schedule_constraints);
+  CACHED_STR(schedule_node);
+  CACHED_STR(union_access_info);
+  CACHED_STR(union_flow);
+  CACHED_STR(ast_expr);
+  CACHED_STR(ast_node);
+
+  EXPOSE_READ_FROM_PATH(pw_qpolynomial, PwQPolynomial);
+  EXPOSE_READ_FROM_PATH(schedule, Schedule);
+  EXPOSE_READ_FROM_PATH(schedule_constraints, ScheduleConstraints);
 }
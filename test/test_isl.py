@@ -73,6 +73,25 @@ def test_pwqpoly():
     pwqp.foreach_piece(piece_handler)
 
 
+def test_scalar_arithmetic():
+    pwaff = isl.PwAff("[n] -> { [i] -> [(i)] : i >= 0; [i] -> [(n - i)] : i < 0 }")
+    assert (pwaff + 1).is_equal(isl.PwAff(
+        "[n] -> { [i] -> [(i + 1)] : i >= 0; [i] -> [(n + 1 - i)] : i < 0 }"))
+    assert (2 - pwaff * 3).is_equal(isl.PwAff(
+        "[n] -> { [i] -> [(2 - 3i)] : i >= 0; [i] -> [(2 - 3n + 3i)] : i < 0 }"))
+
+    pwqp = isl.PwQPolynomial("[n] -> { [i] -> i * i : 0 <= i < n }")
+    assert str(pwqp + 1) == str(isl.PwQPolynomial(
+        "[n] -> { [i] -> (1 + i^2) : 0 <= i < n }"))
+
+    # zero without pieces
+    assert str(isl.PwQPolynomial("[n] -> { [i] -> 0 }") + 2) == str(
+            isl.PwQPolynomial("[n] -> { [i] -> 2 }"))
+
+    qp = isl.QPolynomial.from_aff(isl.Aff("{ [i] -> [(i)] }"))
+    assert str(qp - isl.Val("1/2")) == "{ [i] -> (-1/2 + i) }"
+
+
 def no_test_id_user():
     ctx = isl.Context()
     foo = isl.Id("foo", context=ctx)  # noqa
@@ -98,6 +117,36 @@ def test_upcast():
     assert a.is_equal(b)
 
 
+def test_self_upcast():
+    bset = isl.BasicSet("{[i]: 0 <= i < 10}")
+    set = isl.Set("{[i]: 5 <= i < 15}")
+
+    assert isinstance(bset.union(bset), isl.Set)
+    assert bset.union(set) == isl.Set("{[i]: 0 <= i < 15}")
+    assert bset.subtract(set) == isl.Set("{[i]: 0 <= i < 5}")
+    assert isinstance(bset.gist(bset), isl.BasicSet)
+
+    aff = isl.Aff("{[i] -> [(i)]}")
+    assert isinstance(aff.add(aff), isl.Aff)
+    assert isinstance(aff.add(isl.PwAff("{[i] -> [(i)]}")), isl.PwAff)
+
+
+def test_implicit_upcast_args():
+    ctx = isl.Context()
+    bset = isl.BasicSet.read_from_str(ctx, "{[i]: 0 <= i < 10}")
+    set = isl.Set.read_from_str(ctx, "{[i]: 5 <= i < 15}")
+    uset = isl.UnionSet.read_from_str(ctx, "{A[i]: 0 <= i < 10}")
+
+    # converted arguments are handed to isl without a copy, the originals
+    # must not be affected
+    assert set.union(bset) == isl.Set("{[i]: 0 <= i < 15}", context=ctx)
+    assert uset.union(bset).union(set).n_set() == 2
+    assert bset == isl.BasicSet("{[i]: 0 <= i < 10}", context=ctx)
+
+    assert ctx.live_object_counts_by_class() == {
+            "BasicSet": 1, "Set": 1, "UnionSet": 1}
+
+
 def test_pickling():
     instances = [
             isl.Aff("[n] -> { [(-1 - floor((-n)/4))] }"),
@@ -326,6 +375,476 @@ def test_align_spaces():
     assert a2_aligned == isl.Aff("[t1, t0, t2] -> { [(0)] }")
 
 
+def test_align_spaces_plan():
+    s = isl.Set("[n, m] -> { S[i, j] : 0 <= i < n and 0 <= j < i + m }")
+    template = isl.Set("[m, k] -> { T[j, l, i] : }")
+
+    for _ in range(2):
+        # the second time around, the cached plan is used
+        result = isl.align_spaces(s, template, obj_bigger_ok=True)
+        assert result == isl.Set(
+                "[m, k, n] -> { [j, l, i] : 0 <= i < n and 0 <= j < i + m }")
+
+    with pytest.raises(isl.Error):
+        isl.align_spaces(s, template)
+
+    # moving dimensions between domain and range, j is left over in the
+    # domain until the range is aligned
+    m = isl.BasicMap("{ [i, j] -> [k] : i < j < k }")
+    m_template = isl.BasicMap("{ [k, i] -> [j] : }")
+    result = isl.align_spaces(m, m_template, obj_bigger_ok=True)
+    assert result == isl.BasicMap("{ [k, i] -> [j] : i < j < k }")
+
+    with pytest.raises(isl.Error):
+        isl.align_spaces(m, m_template)
+
+    isl.clear_alignment_cache()
+
+
+def test_align_spaces_plan_parity(monkeypatch):
+    cases = [
+            (isl.Set("[n] -> { S[i, j] : 0 <= i < n and 0 <= j < i }"),
+                isl.Set("[m, n] -> { T[j, i] : }")),
+            (isl.Set("[n] -> { S[i, j] : 0 <= i < n and 0 <= j < i }"),
+                isl.Set("[n] -> { T[i, j] : }")),
+            (isl.Set("{ S[i, j] : 0 <= i < j }"),
+                isl.Set("[g, c] -> { T[a, b] : }")),
+            (isl.Set("[n] -> { S[i, 0] : 0 <= i < n }"),
+                isl.Set("[n] -> { [k, i] : }").get_space()),
+            (isl.Map("{ A[i, j] -> B[k] : i < j < k }"),
+                isl.Map("{ C[k, i] -> D[j] : }")),
+            (isl.Map("{ A[i] -> B[k] : i < k }"),
+                isl.Map("{ A[i] -> B[k] : }")),
+            (isl.Map("{ A[c] -> B[] : 0 <= c <= 2 }"),
+                isl.Map("[c, g] -> { A[e] -> B[] }")),
+            (isl.Aff("[n] -> { A[i, j] -> [(i + 2j + n)] }"),
+                isl.Aff("[m, n] -> { B[j, k, i] -> [(0)] }")),
+            (isl.PwAff("[n] -> { A[i, j] -> [(i + 2j + n)] }"),
+                isl.Aff("[n] -> { A[i, j] -> [(0)] }")),
+            ]
+
+    def align(obj, template, obj_bigger_ok):
+        try:
+            result = isl.align_spaces(obj, template, obj_bigger_ok=obj_bigger_ok)
+        except isl.Error:
+            return None
+        return str(result)
+
+    for obj, template in cases:
+        for obj_bigger_ok in [False, True]:
+            isl.clear_alignment_cache()
+            with_plan = [align(obj, template, obj_bigger_ok) for _ in range(2)]
+
+            with monkeypatch.context() as m:
+                m.setattr(isl, "_get_alignment_plan", lambda *args: None)
+                without_plan = align(obj, template, obj_bigger_ok)
+
+            assert with_plan == [without_plan] * 2
+
+    isl.clear_alignment_cache()
+
+
+def test_align_many():
+    domains = [
+            isl.Set("[n] -> { S0[i, j] : 0 <= i < n and 0 <= j < i }"),
+            isl.BasicSet("[m] -> { S1[j, k] : 0 <= j < m and k = j }"),
+            isl.Set("{ S2[n, i] : 0 <= i < n }"),
+            ]
+
+    aligned, space = isl.align_many(domains)
+    assert space.get_var_dict() == {
+            "n": (isl.dim_type.param, 0), "m": (isl.dim_type.param, 1),
+            "i": (isl.dim_type.set, 0), "j": (isl.dim_type.set, 1),
+            "k": (isl.dim_type.set, 2)}
+    assert [type(dom) for dom in aligned] == [isl.Set, isl.BasicSet, isl.Set]
+    assert [dom.get_tuple_name() for dom in aligned] == ["S0", "S1", "S2"]
+    assert aligned[2] == isl.Set("[n, m] -> { S2[i, j, k] : 0 <= i < n }")
+
+    aligned, space = isl.align_many([
+            isl.Aff("[n] -> { [i] -> [(i + n)] }"),
+            isl.PwAff("[m] -> { [j] -> [(j)] }")])
+    assert aligned[1] == isl.PwAff("[n, m] -> { [i, j] -> [(j)] }")
+
+    with pytest.raises(TypeError):
+        isl.align_many(domains + [isl.Map("{ [i] -> [j] }")])
+
+    # the same alignment in different contexts
+    for ctx in [isl.Context(), isl.Context()]:
+        aligned, space = isl.align_many([
+                isl.Set("[a] -> { [i] }", context=ctx),
+                isl.Set("[b] -> { [j] }", context=ctx)])
+        assert space.get_ctx() == ctx
+        assert aligned[1] == isl.Set("[a, b] -> { [i, j] }", context=ctx)
+
+
+def test_project_out_names():
+    s = isl.Set("[n, m] -> { [i, j, k] : 0 <= i < n and 0 <= j < i and k = j + m }")
+
+    assert s.project_out_names(["j"]) == isl.Set(
+            "[n, m] -> { [i, k] : 0 <= i < n and m <= k < i + m }")
+    assert s.project_out_names(["i", "n"], keep=True) == isl.Set(
+            "[n] -> { [i] : 0 < i < n }")
+    assert s.project_out_names(["i", "k"], keep=True,
+            types=[isl.dim_type.set]) == s.project_out_names(["j"])
+    assert s.project_out_except(["i", "k"], [isl.dim_type.set]) \
+            == s.project_out_names(["j"])
+
+    eliminated = s.eliminate_except(["i"], [isl.dim_type.set])
+    assert eliminated.get_var_names(isl.dim_type.set) == ["i", "j", "k"]
+    assert eliminated == isl.Set("[n, m] -> { [i, j, k] : 0 < i < n }")
+
+    bmap = isl.BasicMap("{ [a, b] -> [c, d] : a < b < c < d }")
+    assert bmap.project_out_names(["b", "c"]) == isl.BasicMap(
+            "{ [a] -> [d] : d >= a + 3 }")
+
+
+def test_create_space_from_names():
+    ctx = isl.Context()
+    m = isl.Id("m", context=ctx)
+
+    space = isl.Space.create_from_names(
+            ctx, in_=["i"], out=["j", "k"], params=["n", m])
+    assert str(space) == "[n, m] -> { [i] -> [j, k] }"
+    assert space.get_dim_id(isl.dim_type.param, 1).name == "m"
+
+    with pytest.raises(TypeError):
+        isl.Space.create_from_names(ctx, set=[1])
+
+    ctx.enable_space_cache()
+    vars1 = isl.make_zero_and_vars(["i", "j"], ["n"], ctx=ctx)
+    vars2 = isl.make_zero_and_vars(["i", "j"], ["n"], ctx=ctx)
+    assert vars1["i"].space == vars2["i"].space
+
+    # the cache is bounded, it is emptied once full
+    for i in range(1100):
+        isl.Space.create_from_names(ctx, set=["i%d" % i])
+    assert str(isl.Space.create_from_names(ctx, set=["i0"])) == "{ [i0] }"
+
+    # cached spaces are not counted as live objects
+    del space, m, vars1, vars2
+    assert ctx.live_object_count() == 0
+    ctx.enable_space_cache(False)
+
+
+def test_var_dict_cache():
+    s = isl.Set("[n] -> { [i, j] : 0 <= i < n }")
+    s2 = s.intersect(isl.Set("[n] -> { [i, j] : j >= 0 }"))
+
+    var_dict = s.get_var_dict()
+    assert var_dict == {
+            "n": (isl.dim_type.param, 0),
+            "i": (isl.dim_type.set, 0),
+            "j": (isl.dim_type.set, 1)}
+
+    # the result is a copy and may be modified freely
+    var_dict["k"] = (isl.dim_type.set, 2)
+    assert "k" not in s2.get_var_dict()
+
+    assert s2.get_var_names(isl.dim_type.set) == ["i", "j"]
+    assert s.get_var_dict(isl.dim_type.param) == {"n": (isl.dim_type.param, 0)}
+    assert [id.name for id in s.get_id_dict()] == ["n", "i", "j"]
+
+    space = isl.Space.create_from_names(s.get_ctx(), in_=["a"], out=["a"])
+    with pytest.raises(RuntimeError):
+        space.get_var_dict()
+    assert space.get_var_dict(ignore_out=True) == {"a": (isl.dim_type.in_, 0)}
+
+    # spaces with the same names share the index, but not their variables
+    for tuple_name in ["S", "T", "S"]:
+        space = isl.Set("[n] -> { %s[i, j] }" % tuple_name).space
+        i = isl.affs_from_space(space)["i"]
+        assert i.get_domain_space() == space
+        assert i.get_domain_space().get_tuple_name(isl.dim_type.set) == tuple_name
+        assert space.get_var_dict() == {
+                "n": (isl.dim_type.param, 0),
+                "i": (isl.dim_type.set, 0),
+                "j": (isl.dim_type.set, 1)}
+
+
+def test_lazy_affs_from_space():
+    v = isl.make_zero_and_vars("i,j", "n")
+    assert list(v) == [0, "i", "j", "n"]
+
+    i, n = v["i", "n"]
+    assert i.le_set(n) == isl.Set("[n] -> { [i, j] : i <= n }")
+    assert v[0].is_cst()
+
+    v["m"] = n + 1
+    assert "m" in v and len(v) == 5
+    with pytest.raises(KeyError):
+        v["k"]
+
+    with pytest.raises(isl.Error):
+        isl.affs_from_space(isl.Map("{ [i] -> [j] }").space)
+
+
+def test_deferred_aff():
+    v = isl.make_zero_and_vars("i,j", "n", deferred=True)
+    pw = isl.make_zero_and_vars("i,j", "n")
+
+    expr = v["i"] + 2*v["j"] - v["n"] + 3
+    assert str(expr) == "i + 2*j - n + 3"
+    assert expr.to_pw_aff().is_equal(pw["i"] + 2*pw["j"] - pw["n"] + 3)
+    assert (v["i"] % 3).to_pw_aff().is_equal(pw["i"] % 3)
+
+    bset = (v[0].le_set(v["i"]) & v["i"].lt_set(v["n"])
+            & v["j"].eq_set((v["i"] + 1) // 2))
+    assert isinstance(bset, isl.DeferredBasicSet)
+    assert bset.to_set() == isl.Set(
+            "[n] -> { [i, j] : 0 <= i < n and j = floor((i + 1)/2) }")
+
+    # mixing with isl objects builds the deferred part first
+    assert isinstance(v["i"] + pw["j"], isl.PwAff)
+    assert isinstance(pw["j"] - v["i"], isl.PwAff)
+    assert isinstance(bset & isl.Set("[n] -> { [i, j] : n = 5 }"), isl.Set)
+
+    with pytest.raises(TypeError):
+        v["i"] * v["j"]
+    with pytest.raises(KeyError):
+        isl.DeferredAff(expr.space, {"k": 1}).to_aff()
+
+
+def test_add_constraints():
+    bset = isl.BasicSet("[n] -> { [i, j] : 0 <= i, j < n and exists a: i = 2a }")
+    universe = isl.BasicSet.universe(bset.space)
+
+    expected = universe
+    for constraint in bset.get_constraints():
+        expected = expected.add_constraint(constraint)
+
+    assert universe.add_constraints(bset.get_constraints()) == expected
+    assert (isl.Set.universe(bset.space).add_constraints(bset.get_constraints())
+            == isl.Set.from_basic_set(expected))
+
+    # rows hold the constant, then the coefficients of n, i and j
+    s = isl.Set("[n] -> { [i, j] }").add_constraints(
+            equalities=[[0, 0, 1, -1]],
+            inequalities=[[0, 0, 1, 0], [-1, 1, -1, 0]])
+    assert s == isl.Set("[n] -> { [i, j] : i = j and 0 <= i < n }")
+
+    with pytest.raises(ValueError):
+        s.add_constraints(inequalities=[[1, 2]])
+
+    np = pytest.importorskip("numpy")
+    m = isl.Map("{ [i] -> [j] }").add_constraints(
+            inequalities=np.array([[0, 1, -1], [5, 0, 1]], dtype=np.int32))
+    assert m == isl.Map("{ [i] -> [j] : -5 <= j <= i }")
+
+
+def test_parse_many():
+    ctx = isl.Context()
+    ctx.set_on_error(isl.on_error.CONTINUE)
+
+    strings = ["[n] -> { [i] : 0 <= i < n + %d }" % k for k in range(10)]
+    sets = isl.parse_many(isl.Set, strings, ctx)
+    assert sets == [isl.Set(s, context=ctx) for s in strings]
+
+    assert isl.parse_many(isl.Map, [
+        "{ [i] -> [i + 1] }", b"{ [i] -> [i + 1] }",
+        memoryview(b"{ [i] -> [i + 1] }"), memoryview(b"{ [i] -> [i + 1] }\0"),
+        ], ctx) == 4*[isl.Map("{ [i] -> [i + 1] }", context=ctx)]
+
+    result = isl.parse_many(isl.Set, ["{ [i] }", "{ [i] : oops }"], ctx,
+            return_errors=True)
+    assert result[0] == isl.Set("{ [i] }", context=ctx)
+    assert isinstance(result[1], isl.Error)
+
+    with pytest.raises(isl.Error):
+        isl.parse_many(isl.Set, ["{ [i] }", "{ [i] : oops }"], ctx)
+
+    for nthreads in [2, 3, 20]:
+        result = isl.parse_many(isl.Set, strings[:5] + ["{"] + strings[5:], ctx,
+                return_errors=True, nthreads=nthreads)
+        assert isinstance(result[5], isl.Error)
+        del result[5]
+        assert [str(s) for s in result] == [str(s) for s in sets]
+        assert result[0].get_ctx() != ctx
+
+
+def test_cached_str():
+    s = isl.Set("[n] -> { [i] : 0 <= i < n }")
+    assert str(s) == "[n] -> { [i] : 0 <= i < n }"
+    assert str(s) is str(s)
+    assert repr(s) == 'Set("[n] -> { [i] : 0 <= i < n }")'
+
+    objs = [s, isl.Val("3/4"), isl.Aff("{ [i] -> [(2i)] }"), s.get_space(),
+            isl.Schedule('{ domain: "{ S[i] : 0 <= i < 10 }" }'), 17]
+    assert isl.to_strs(objs) == [str(obj) for obj in objs]
+
+    import pickle
+    assert pickle.loads(pickle.dumps(s)) == s
+
+
+def test_printer_to_file(tmp_path):
+    import io
+    import os
+
+    s = isl.Set("[n] -> { [i] : 0 <= i < n }")
+    ctx = s.get_ctx()
+
+    for f in [io.StringIO(), io.BytesIO()]:
+        isl.Printer.to_file(ctx, f).print_set(s).end_line().flush()
+        assert f.getvalue() in [str(s) + "\n", (str(s) + "\n").encode()]
+
+    fd = os.open(tmp_path / "set.txt", os.O_WRONLY | os.O_CREAT)
+    prn = isl.Printer.to_file(ctx, fd)
+    os.close(fd)
+    prn.print_set(s)
+    del prn
+    assert (tmp_path / "set.txt").read_text() == str(s)
+
+    class FailingFile:
+        def write(self, data):
+            raise OSError("disk full")
+
+    prn = isl.Printer.to_file(ctx, FailingFile()).print_set(s)
+    with pytest.raises(OSError):
+        prn.flush()
+
+
+def test_read_from_path(tmp_path):
+    ctx = isl.DEFAULT_CONTEXT
+
+    s = "[n] -> { [i] : 0 <= i < n }"
+    (tmp_path / "set.txt").write_text(s)
+    assert isl.Set.read_from_path(ctx, tmp_path / "set.txt") == isl.Set(s)
+
+    # cannot be mapped with a terminating NUL, read through a FILE
+    (tmp_path / "page.txt").write_text(s.ljust(4096))
+    assert isl.Set.read_from_path(ctx, str(tmp_path / "page.txt")) == isl.Set(s)
+
+    umap = "{ %s }" % "; ".join(
+            "S%d[i] -> T%d[i + 1]" % (k, k) for k in range(100))
+    (tmp_path / "umap.txt").write_text(umap)
+    assert (isl.UnionMap.read_from_path(ctx, tmp_path / "umap.txt")
+            == isl.UnionMap(umap))
+
+    sched = '{ domain: "{ S[i] : 0 <= i < 10 }" }'
+    (tmp_path / "sched.txt").write_text(sched)
+    assert (str(isl.Schedule.read_from_path(ctx, tmp_path / "sched.txt"))
+            == str(isl.Schedule(sched)))
+
+    with pytest.raises(OSError):
+        isl.Set.read_from_path(ctx, tmp_path / "missing.txt")
+
+
+def test_schedule_cache(tmp_path):
+    ctx = isl.Context()
+    sc = isl.ScheduleConstraints.on_domain(
+            isl.UnionSet("[n] -> { S[i, j] : 0 <= i, j < n }", context=ctx))
+    sc = sc.set_validity(isl.UnionMap(
+            "[n] -> { S[i, j] -> S[i + 1, j]; S[i, j] -> S[i, j + 1] }",
+            context=ctx))
+
+    cache = isl.ScheduleCache(tmp_path)
+    assert cache.get(sc) is None
+
+    schedule = cache.compute_schedule(sc)
+    assert str(schedule) == str(sc.compute_schedule())
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # another instance, e.g. in another process
+    other_cache = isl.ScheduleCache(tmp_path)
+    assert str(other_cache.compute_schedule(sc)) == str(schedule)
+    assert (other_cache.hits, other_cache.misses) == (1, 0)
+
+    max_band_depth = ctx.get_schedule_maximize_band_depth()
+    ctx.set_schedule_maximize_band_depth(not max_band_depth)
+    assert cache.get(sc) is None
+    ctx.set_schedule_maximize_band_depth(max_band_depth)
+    assert cache.get(sc) is not None
+
+    cache.clear()
+    assert other_cache.get(sc) is None
+
+
+def test_incremental_flow():
+    schedule = isl.UnionMap(
+            "[n] -> { S[i] -> [i, 0]; T[i] -> [i, 1]; U[i] -> [i, 2] }")
+
+    def compute_flow(sink, must_source):
+        info = isl.UnionAccessInfo.from_sink(sink)
+        info = info.set_must_source(must_source).set_schedule_map(schedule)
+        return info.compute_flow()
+
+    def assert_same_flow(flow, ref_flow):
+        for name in ["get_must_dependence", "get_may_dependence",
+                "get_full_must_dependence", "get_full_may_dependence",
+                "get_must_no_source", "get_may_no_source"]:
+            assert getattr(flow, name)() == getattr(ref_flow, name)()
+
+    sink = isl.UnionMap("[n] -> { T[i] -> A[i - 1]; U[i] -> B[i]; U[i] -> A[i] }")
+    must_source = isl.UnionMap(
+            "[n] -> { S[i] -> A[i] : 0 <= i < n; T[i] -> B[i] : 0 <= i < n }")
+
+    inc_flow = isl.IncrementalFlow(schedule)
+    assert_same_flow(inc_flow.compute_flow(sink, must_source),
+            compute_flow(sink, must_source))
+    assert (inc_flow.ncomputed, inc_flow.nreused) == (3, 0)
+
+    # changed sink: only that access is analyzed again
+    sink = isl.UnionMap("[n] -> { T[i] -> A[i - 2]; U[i] -> B[i]; U[i] -> A[i] }")
+    assert_same_flow(inc_flow.compute_flow(sink, must_source),
+            compute_flow(sink, must_source))
+    assert (inc_flow.ncomputed, inc_flow.nreused) == (1, 2)
+
+    # changed source: all sinks of that array are analyzed again
+    must_source = isl.UnionMap(
+            "[n] -> { S[i] -> A[i] : 0 <= i < n; T[i] -> B[i] : 0 <= i < n - 1 }")
+    assert_same_flow(inc_flow.compute_flow(sink, must_source),
+            compute_flow(sink, must_source))
+    assert (inc_flow.ncomputed, inc_flow.nreused) == (1, 2)
+
+    inc_flow.set_schedule(isl.UnionMap(
+            "[n] -> { S[i] -> [i, 2]; T[i] -> [i, 1]; U[i] -> [i, 0] }"))
+    inc_flow.compute_flow(sink, must_source)
+    assert (inc_flow.ncomputed, inc_flow.nreused) == (3, 0)
+
+    # a wrapped array, with differently named dimensions in sink and source
+    sink = isl.UnionMap("[n] -> { U[i] -> A[B[i] -> C[j]] : j = i }")
+    must_source = isl.UnionMap(
+            "[n] -> { S[k] -> A[B[x] -> C[y]] : x = k and y = k and 0 <= k < n }")
+    flow = isl.IncrementalFlow(schedule).compute_flow(sink, must_source)
+    assert_same_flow(flow, compute_flow(sink, must_source))
+    assert not flow.get_must_dependence().is_empty()
+
+
+def test_ast_to_python():
+    sched = isl.Schedule('{ domain: "[n] -> { S[i] : 0 <= i < n }", '
+            'child: { mark: "kernel", '
+            'child: { schedule: "[n] -> [{ S[i] -> [(i)] }]" } } }')
+    build = isl.AstBuild.from_context(isl.Set("[n] -> { : }"))
+    node = build.node_from_schedule(sched)
+    assert node.get_type() == isl.ast_node_type.mark
+
+    c0 = isl.AstIdExpr("c0")
+    assert node.to_python() == isl.AstMarkNode("kernel", isl.AstForNode(
+        c0, 0,
+        isl.AstOpExpr(isl.ast_expr_op_type.lt, (c0, isl.AstIdExpr("n"))),
+        1,
+        isl.AstUserNode(isl.AstOpExpr(isl.ast_expr_op_type.call,
+            (isl.AstIdExpr("S"), c0)))))
+
+    expr = build.expr_from_pw_aff(isl.PwAff("[n] -> { [(n + %d)] }" % 2**70))
+    assert expr.to_python() == isl.AstOpExpr(isl.ast_expr_op_type.add,
+            (isl.AstIdExpr("n"), 2**70))
+
+
+def test_align_spaces_plan_contexts():
+    # plans are only shared by spaces of the same context
+    for ctx in [isl.Context(), isl.Context()]:
+        for _ in range(2):
+            result = isl.align_spaces(
+                    isl.Set("[a, b] -> { [i, j] : i < a and j < b }", context=ctx),
+                    isl.Set("[b, a, c] -> { [j, i, k] }", context=ctx),
+                    obj_bigger_ok=True)
+            assert result.get_ctx() == ctx
+            assert result == isl.Set(
+                    "[b, a, c] -> { [j, i, k] : i < a and j < b }", context=ctx)
+
+    isl.clear_alignment_cache()
+
+
 def test_pass_numpy_int():
     np = pytest.importorskip("numpy")
 
@@ -442,6 +961,134 @@ def test_sched_constraints_set_validity():
     assert str(validity) == str(validity2)
 
 
+def test_foreach_collectors():
+    s = isl.Set("{[i,j]: 0<=i,j<3 and (i<1 or j < 1)}")
+
+    points = []
+    s.foreach_point(points.append)
+    assert [str(p) for p in s._collect_point()] == [str(p) for p in points]
+
+    assert len(s.get_basic_sets()) == 2
+    assert s.get_basic_sets()[0].get_constraints()
+
+    pieces = isl.PwAff("[n] -> {[(n)]: n > 0; [(0)]: n <= 0}").get_pieces()
+    assert [type(x) for x in pieces[0]] == [isl.Set, isl.Aff]
+
+
+def test_profile():
+    ctx = isl.Context()
+
+    with isl.profile(ctx) as prof:
+        s = isl.Set("[n] -> {[i,j]: 0<=i,j<n and i+j<=2n}", context=ctx)
+        s.coalesce().lexmin()
+
+    assert ctx.get_operations() > 0
+
+    lines = {lineno for (filename, lineno, _), _ in prof.entries.items()
+            if filename == __file__}
+    assert len(lines) == 2
+
+    ncalls, ops, _ = max(prof.entries.values(), key=lambda e: e[0])
+    assert ncalls == 2
+    assert ops > 0
+
+    from io import StringIO
+    out = StringIO()
+    prof.sort_stats("time").print_stats(file=out)
+    assert "test_profile" in out.getvalue()
+
+
+def test_live_object_count():
+    ctx = isl.Context()
+    assert ctx.live_object_count() == 0
+
+    s = isl.Set.read_from_str(ctx, "{[i]: 0<=i<10}")
+    t = s.coalesce().add_constraint(
+            isl.Constraint.ineq_from_names(s.space, {1: 5, "i": -1}))
+    assert ctx.live_object_counts_by_class() == {"Set": 2}
+    del t
+    assert ctx.live_object_count() == 1
+    assert ctx.peak_live_object_count() >= 3
+
+    isl.track_object_creation()
+    try:
+        leak = s.get_basic_sets()
+    finally:
+        isl.track_object_creation(False)
+
+    (cls_name, tb), = ctx.live_object_tracebacks()
+    assert cls_name == "BasicSet"
+    assert "test_live_object_count" in [frame.name for frame in tb]
+
+    del leak
+    assert ctx.live_object_tracebacks() == []
+
+
+def test_list_protocol():
+    ctx = isl.DEFAULT_CONTEXT
+    names = ["x%d" % i for i in range(5)]
+
+    id_list = isl.IdList.from_py(
+            ctx, (isl.Id(name, context=ctx) for name in names))
+    assert len(id_list) == 5
+    assert [id.name for id in id_list.to_py()] == names
+    assert [id.name for id in id_list] == names
+    assert id_list[-1].name == names[-1]
+
+    sliced = id_list[1::2]
+    assert isinstance(sliced, isl.IdList)
+    assert [id.name for id in sliced] == names[1::2]
+    assert len(id_list[5:]) == 0
+
+    with pytest.raises(IndexError):
+        id_list[5]
+    with pytest.raises(TypeError):
+        isl.IdList.from_py(ctx, [1])
+    with pytest.raises(isl.Error):
+        isl.IdList.from_py(ctx, [isl.Id("z", context=isl.Context())])
+
+    # elements are converted like arguments
+    bset = isl.BasicSet("{[i]: 0 <= i < 10}")
+    set_list = isl.SetList.from_py(ctx, [bset, bset.complement()])
+    assert [type(s) for s in set_list] == [isl.Set, isl.Set]
+
+
+@pytest.mark.skipif("sys.version_info < (3, 7)")
+def test_lazy_part3():
+    # needs a fresh interpreter, other tests may have exposed part 3 already
+    import subprocess
+    import sys
+
+    code = """if 1:
+        import islpy as isl
+        import islpy._isl as _isl
+        assert "Schedule" not in vars(_isl)
+        assert "Schedule" in dir(isl)
+        assert "Schedule" in isl.__all__
+        assert not hasattr(_isl, "NoSuchClass")
+        assert "Schedule" not in vars(_isl)
+
+        pwqp = isl.PwQPolynomial("[n] -> { n^2 + 1 : n >= 0 }")
+        assert "Schedule" in vars(_isl)
+        assert isinstance(pwqp, isl.EXPR_CLASSES)
+        assert (pwqp + 1).eval_with_dict({"n": 3}) == 11
+        assert (pwqp**2).eval_with_dict({"n": 1}) == 4
+        assert repr(pwqp) == 'PwQPolynomial("%s")' % pwqp
+        assert isl.Schedule is _isl.Schedule
+        """
+
+    subprocess.check_call([sys.executable, "-c", code])
+
+    code = """if 1:
+        from islpy import EXPR_CLASSES
+        from islpy import *  # noqa
+        assert Schedule.__name__ == "Schedule"
+        assert PwQPolynomial in EXPR_CLASSES
+        """
+
+    subprocess.check_call([sys.executable, "-c", code])
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1: